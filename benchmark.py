@@ -0,0 +1,351 @@
+"""
+Benchmarks of the modelling pipeline. Run with
+    python benchmark.py
+or, for the time and peak memory of every stage on synthetic systems of
+10 to 10000 nodes as JSON,
+    python benchmark.py scaling [sizes...]
+"""
+import gc
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from ruamel.yaml import YAML
+import yamlParser
+import yamlPrinter
+try:
+    import compiled
+except ImportError:  # Without NumPy
+    compiled = None
+import ros2system
+import systemvalidator
+import snapshot
+import synthetic
+try:
+    import transformer_backeman
+except ImportError as error:  # Without backeman
+    transformer_backeman = None
+    backeman_missing = str(error)
+
+
+def suffixed(value, suffix: str):
+    if isinstance(value, dict):
+        return {key: suffixed(item, suffix) for key, item in value.items()}
+    if isinstance(value, list):
+        return [suffixed(item, suffix) for item in value]
+    if isinstance(value, str) and value in yamlParser.NULLS:
+        return None
+    if isinstance(value, str):
+        return value + suffix
+    return value
+
+
+def scaled_example(copies: int, path: str = "example.yaml") -> dict:
+    """
+    The spec of path with the nodes of its first executor repeated,
+    every name and reference inside copy i suffixed with _i.
+    """
+    with open(path) as file:
+        spec = YAML(typ='safe').load(file)
+    executor = spec["System"]["hosts"][0]["executors"][0]
+    executor["nodes"] = [suffixed(node, f"_{i}") for i in range(copies)
+                         for node in executor["nodes"]]
+    return spec
+
+
+def without(mapping: dict, key: str) -> dict:
+    return {k: v for k, v in mapping.items() if k != key}
+
+
+def write_json_lines(spec: dict, file) -> None:
+    system = spec["System"]
+    file.write(json.dumps({"System": without(system, "hosts")}) + "\n")
+    for host in system.get("hosts", []):
+        file.write(json.dumps(without(host, "executors")) + "\n")
+        for executor in host.get("executors", []):
+            file.write(json.dumps(without(executor, "nodes")) + "\n")
+            for node in executor.get("nodes", []):
+                file.write(json.dumps(node) + "\n")
+
+
+def write_formats(spec: dict, directory: str) -> dict[str, str]:
+    """Writes spec as YAML, JSON and JSON lines, returning their paths."""
+    paths = {
+        "yaml": os.path.join(directory, "spec.yaml"),
+        "json": os.path.join(directory, "spec.json"),
+        "jsonl": os.path.join(directory, "spec.jsonl"),
+    }
+    with open(paths["yaml"], "w") as file:
+        yaml = YAML(typ='safe')
+        yaml.default_flow_style = False
+        yaml.representer.sort_base_mapping_type_on_output = False
+        yaml.dump(spec, file)
+    with open(paths["json"], "w") as file:
+        json.dump(spec, file)
+    with open(paths["jsonl"], "w") as file:
+        write_json_lines(spec, file)
+    return paths
+
+
+def best_time(function, repeat: int) -> tuple[float, object]:
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, result
+
+
+def backends(copies: int = 200, repeat: int = 3) -> dict[str, float]:
+    """
+    Times loading example.yaml scaled up by copies with every available
+    YAML backend, and as JSON and JSON lines.
+    Fails if the formats do not load into identical systems.
+    """
+    results = {}
+    systems = {}
+    with tempfile.TemporaryDirectory() as directory:
+        paths = write_formats(scaled_example(copies), directory)
+        for backend in yamlParser.yaml_backends():
+            results[backend], systems[backend] = best_time(
+                lambda: yamlParser.load(paths["yaml"], backend, cache=False),
+                repeat)
+        for fmt in ["json", "jsonl"]:
+            results[fmt], systems[fmt] = best_time(
+                lambda: yamlParser.load(paths[fmt], cache=False), repeat)
+    reference = next(iter(systems.values()))
+    for name, system in systems.items():
+        if system != reference:
+            raise AssertionError(f"Loading with {name} gives another system")
+    return results
+
+
+def snapshots(copies: int = 200, repeat: int = 3) -> dict[str, float]:
+    """
+    Times loading example.yaml scaled up by copies by parsing it,
+    from its cached snapshot, and from the snapshot alone.
+    Fails if the snapshot gives another system.
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        paths = write_formats(scaled_example(copies), directory)
+        os.environ[snapshot.CACHE_VARIABLE] = directory
+        results["parse"], parsed = best_time(
+            lambda: yamlParser.load(paths["yaml"], cache=False), repeat)
+        yamlParser.load(paths["yaml"])  # fills the cache
+        results["cached"], cached = best_time(
+            lambda: yamlParser.load(paths["yaml"]), repeat)
+        path = os.path.join(directory, "spec.snap")
+        snapshot.save(parsed, path)
+        results["snapshot"], _ = best_time(lambda: snapshot.load(path),
+                                           repeat)
+        results["snapshot bytes"] = os.path.getsize(path)
+        results["yaml bytes"] = os.path.getsize(paths["yaml"])
+        del os.environ[snapshot.CACHE_VARIABLE]
+    if cached != parsed:
+        raise AssertionError("Loading from the snapshot gives another system")
+    return results
+
+
+def count_elements(system) -> int:
+    count = 0
+    for host in system.hosts:
+        count += 1
+        for executor in host.executors:
+            count += 1
+            for node in executor.nodes:
+                count += 1 + sum(len(getattr(node, key))
+                                 for key in yamlPrinter.NODE_LISTS)
+    return count
+
+
+def emitting(copies: int = 3000) -> tuple[int, float, int]:
+    """
+    Writes example.yaml scaled up by copies with yamlPrinter,
+    returning the number of elements, the time taken and the peak of
+    memory allocated while writing, which should not grow with copies.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        paths = write_formats(scaled_example(copies), directory)
+        system = yamlParser.load(paths["json"], cache=False)
+        with open(os.devnull, "w") as file:
+            tracemalloc.start()
+            start = time.perf_counter()
+            yamlPrinter.dump(system, file)
+            elapsed = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+    return count_elements(system), elapsed, peak
+
+
+def unoptimized(value, copies: dict = None, classes: dict = None):
+    """
+    A copy of value as the model was before it was slotted and interned:
+    elements keep their fields in a __dict__, every empty list of
+    elements is a list of its own, and every name an element holds is a
+    string of its own. Objects shared in value, e.g. elements in the
+    registry and QoS profiles, stay shared.
+    """
+    copies = {} if copies is None else copies
+    classes = {} if classes is None else classes
+    copy = lambda item: unoptimized(item, copies, classes)
+    if value is ros2system.EMPTY:
+        return []
+    if (type(value) in (str, int, float, bool) or value is None or
+            isinstance(value, ros2system.QualityOfService)):
+        return value
+    if id(value) in copies:
+        return copies[id(value)]
+    if isinstance(value, list):
+        copies[id(value)] = result = []
+        result += map(copy, value)
+    elif isinstance(value, tuple):
+        result = tuple(map(copy, value))
+    elif isinstance(value, (set, frozenset)):
+        result = type(value)(map(copy, value))
+    elif isinstance(value, dict):
+        copies[id(value)] = result = {}
+        result.update((key, copy(item)) for key, item in value.items())
+    else:
+        cls = type(value)
+        if cls not in classes:
+            classes[cls] = type(cls.__name__, (), {})
+        copies[id(value)] = result = classes[cls]()
+        names = [name for klass in reversed(cls.__mro__)
+                 for name in getattr(klass, "__slots__", ())]
+        state = {name: getattr(value, name) for name in names
+                 if hasattr(value, name)}
+        state.update(getattr(value, "__dict__", {}))
+        for name, item in state.items():
+            if type(item) is str:  # A new string, not the interned one
+                item = (item + ".")[:-1]
+            setattr(result, name, copy(item))
+    return result
+
+
+def allocated_by(function) -> tuple[int, object]:
+    """The bytes still allocated after function returns, and its result."""
+    gc.collect()
+    tracemalloc.start()
+    result = function()
+    gc.collect()
+    allocated, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return allocated, result
+
+
+def memory(copies: int = 1000) -> tuple[int, float, float]:
+    """
+    Loads example.yaml scaled up by copies, returning the number of
+    elements and the bytes allocated for the system per element,
+    its registry included, once as loaded and once as an unoptimized
+    copy of it, to compare against.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        paths = write_formats(scaled_example(copies), directory)
+        allocated, system = allocated_by(
+            lambda: yamlParser.load(paths["json"], cache=False))
+    baseline, _ = allocated_by(lambda: unoptimized(system))
+    elements = count_elements(system)
+    return elements, allocated / elements, baseline / elements
+
+
+def compiled_checks(copies: int = 3000) -> dict[str, float]:
+    """
+    Times validate_system against compiling example.yaml scaled up by
+    copies and running the vectorized checks on the compiled system.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        paths = write_formats(scaled_example(copies), directory)
+        system = yamlParser.load(paths["json"], cache=False)
+    results = {"elements": count_elements(system)}
+    results["validate"], _ = best_time(
+        lambda: systemvalidator.validate_system(system), 1)
+    results["compile"], compiled_system = best_time(system.compile, 1)
+    results["checks"], _ = best_time(
+        lambda: compiled.validate_compiled(compiled_system), 3)
+    return results
+
+
+def measure(function) -> tuple[dict, object]:
+    """
+    The seconds function takes and, in a second run, the peak of the
+    memory it allocates, along with its result.
+    """
+    gc.collect()
+    start = time.perf_counter()
+    function()
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    tracemalloc.start()
+    result = function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"seconds": elapsed, "peak_bytes": peak}, result
+
+
+def scaling(sizes: tuple = (10, 100, 1000, 10000)) -> dict:
+    """
+    Times every stage of the pipeline on synthetic systems of sizes nodes,
+    with one host and executor so that they can be transformed.
+    Stages whose modules cannot be imported are listed as skipped.
+    """
+    results = {"sizes": {}, "skipped": {}}
+    if transformer_backeman is None:
+        for stage in ["check_for_cycles", "transform_system"]:
+            results["skipped"][stage] = backeman_missing
+    for size in sizes:
+        stages = {}
+        stages["generate"], system = measure(
+            lambda: synthetic.generate(size))
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "system.yaml")
+            stages["print"], _ = measure(lambda: yamlPrinter.save(system,
+                                                                  path))
+            stages["load"], _ = measure(
+                lambda: yamlParser.load(path, cache=False))
+        stages["validate_system"], (_, objects, interfaces) = measure(
+            lambda: systemvalidator.validate_system(system))
+        if transformer_backeman is not None:
+            stages["check_for_cycles"], _ = measure(
+                lambda: transformer_backeman.check_for_cycles(
+                    system, objects, interfaces))
+            stages["transform_system"], _ = measure(
+                lambda: transformer_backeman.transform_system(system))
+        results["sizes"][size] = {"elements": count_elements(system),
+                                  "stages": stages}
+    return results
+
+
+if __name__ == "__main__" and sys.argv[1:2] == ["scaling"]:
+    # python benchmark.py scaling [sizes...] writes the results as JSON
+    sizes = tuple(int(size) for size in sys.argv[2:]) or (10, 100, 1000,
+                                                          10000)
+    json.dump(scaling(sizes), sys.stdout, indent=2)
+    print()
+elif __name__ == "__main__":
+    copies = 200
+    print(f"Loading example.yaml with its nodes repeated {copies} times")
+    for name, seconds in backends(copies).items():
+        print(f"    {name:10} {seconds * 1000:10.1f} ms")
+    print("Loading it with and without snapshots")
+    results = snapshots(copies)
+    for name in ["parse", "cached", "snapshot"]:
+        print(f"    {name:10} {results[name] * 1000:10.1f} ms")
+    print(f"    a snapshot of {results['snapshot bytes']} bytes for "
+          f"{results['yaml bytes']} bytes of YAML")
+    elements, seconds, peak = emitting()
+    print(f"Writing {elements} elements as YAML took {seconds * 1000:.1f} ms"
+          f" with at most {peak / 1024:.1f} KiB allocated at once")
+    if compiled is not None:
+        results = compiled_checks()
+        print(f"Checking {results['elements']} elements")
+        for name in ["validate", "compile", "checks"]:
+            print(f"    {name:10} {results[name] * 1000:10.1f} ms")
+    elements, per_element, baseline = memory()
+    print(f"A system of {elements} elements takes {per_element:.0f} bytes "
+          f"per element, {baseline:.0f} unslotted and uninterned")
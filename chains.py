@@ -0,0 +1,110 @@
+from dataclasses import dataclass
+import ros2system as ros
+
+"""
+Enumerates the cause-effect chains of a ros2 system model, i.e. the paths
+data takes from a timer-driven data generator to a sink.
+
+Data flows from a callback to the callbacks of the subscriptions to the
+topics it publishes to, and to the callbacks of the same node reading a
+variable it writes. A chain starts at the callback of a timer and ends at
+a callback it cannot flow on from. A chain does not visit a callback
+twice, so it also ends where data would flow back into it.
+
+There may be exponentially many chains, so they are yielded one at a
+time by a depth-first search that only holds the current path, e.g.
+
+    for chain in chains.enumerate_chains(system):
+        transformer_backeman.monitor(bksystem, chain.generator, chain.sink)
+"""
+
+
+@dataclass(frozen=True, slots=True)
+class Chain:
+    nodes: tuple[str, ...]  # The node of each step
+    callbacks: tuple[str, ...]  # The callback of each step
+    wcet: int  # Of all callbacks together
+
+    @property
+    def generator(self) -> str:
+        return self.nodes[0]
+
+    @property
+    def sink(self) -> str:
+        return self.nodes[-1]
+
+
+def successors(system: ros.System) -> dict[str, list[tuple[str, str]]]:
+    """
+    For the name of each callback the (node, callback) steps data flows
+    to from it.
+    """
+    registry = system.registry
+    subscribers = {}
+    nodes = [node for host in system.hosts for executor in host.executors
+             for node in executor.nodes]
+    for node in nodes:
+        for subscription in node.subscriptions:
+            subscribers.setdefault(subscription.topic, []).append(
+                (node.name, ros.name_of(subscription.callback)))
+    flows = {}
+    for node in nodes:
+        readers = {}
+        for callback in node.callbacks:
+            for variable in callback.read_variables:
+                readers.setdefault(ros.name_of(variable), []).append(
+                    (node.name, callback.name))
+        for callback in node.callbacks:
+            steps = flows.setdefault(callback.name, [])
+            for name in callback.publishers:
+                publisher = registry.lookup("publisher", ros.name_of(name))
+                if publisher is not None:
+                    steps += subscribers.get(publisher.topic, [])
+            for variable in callback.write_variables:
+                steps += readers.get(ros.name_of(variable), [])
+    return flows
+
+
+def generators(system: ros.System) -> list[tuple[str, str]]:
+    """The (node, callback) of every timer, where chains start."""
+    return [(node.name, ros.name_of(timer.callback))
+            for host in system.hosts for executor in host.executors
+            for node in executor.nodes for timer in node.timers]
+
+
+def enumerate_chains(system: ros.System):
+    """Yields every chain of system, see Chain."""
+    registry = system.registry
+    flows = successors(system)
+
+    def wcet(callback: str) -> int:
+        element = registry.lookup("callback", callback)
+        return 0 if element is None else element.wcet
+
+    for start in generators(system):
+        path = [start]
+        on_path = {start[1]}
+        total = wcet(start[1])
+        # The steps still to try after each step of the path
+        pending = [iter(flows.get(start[1], []))]
+        extended = [False]
+        while pending:
+            step = next(pending[-1], None)
+            if step is not None:
+                if step[1] in on_path:
+                    continue
+                extended[-1] = True
+                path.append(step)
+                on_path.add(step[1])
+                total += wcet(step[1])
+                pending.append(iter(flows.get(step[1], [])))
+                extended.append(False)
+                continue
+            if not extended[-1]:
+                yield Chain(tuple(node for node, _ in path),
+                            tuple(callback for _, callback in path), total)
+            pending.pop()
+            extended.pop()
+            node, callback = path.pop()
+            on_path.discard(callback)
+            total -= wcet(callback)
@@ -0,0 +1,246 @@
+from dataclasses import dataclass
+import numpy as np
+from diagnostics import Diagnostic, error
+import ros2system as ros
+
+"""
+A compiled system is a frozen, columnar copy of a ros2 system model,
+made by System.compile(), for checks and analyses that look at every
+element of a kind at once.
+
+Every host, executor, node, callback, publisher, timer and topic gets an
+integer id, its index in the name table of its kind, and subscriptions
+and requests are numbered in order as well. Properties and owners are
+NumPy arrays indexed by id, where -1 stands for a name that does not
+resolve. Edges are stored as CSR adjacencies.
+As in the registry, the first of clashing names wins.
+
+Changes to the system after compiling are not seen, compile it again.
+"""
+
+NAMED_KINDS = ["host", "executor", "node", "callback", "publisher",
+               "timer", "topic"]
+
+
+def frozen(values) -> np.ndarray:
+    """A read-only int64 array of values, which must all be integers."""
+    array = np.array(values)
+    if len(array) == 0:
+        array = np.zeros(0, dtype=np.int64)
+    elif array.dtype.kind not in "iu" or array.ndim != 1:
+        other = next((value for value in values if type(value) is not int),
+                     None)
+        if other is None:
+            raise OverflowError("Integers do not fit in 64 bits")
+        raise TypeError(f"Expected integers, got {other!r}")
+    array = array.astype(np.int64, copy=False)
+    array.flags.writeable = False
+    return array
+
+
+@dataclass(frozen=True)
+class Adjacency:
+    """Rows of ids in compressed sparse row form."""
+    indptr: np.ndarray
+    indices: np.ndarray
+
+    @classmethod
+    def from_edges(cls, rows: list[int], columns: list[int],
+                   count: int) -> "Adjacency":
+        """Builds the adjacency of count rows, leaving out unresolved ids."""
+        rows = np.array(rows, dtype=np.int64)
+        columns = np.array(columns, dtype=np.int64)
+        resolved = (rows >= 0) & (columns >= 0)
+        rows = rows[resolved]
+        columns = columns[resolved]
+        order = np.argsort(rows, kind="stable")
+        indptr = np.zeros(count + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=count), out=indptr[1:])
+        return cls(frozen(indptr), frozen(columns[order]))
+
+    def row(self, id: int) -> np.ndarray:
+        return self.indices[self.indptr[id]:self.indptr[id + 1]]
+
+    def degrees(self) -> np.ndarray:
+        return np.diff(self.indptr)
+
+
+@dataclass(frozen=True)
+class CompiledSystem:
+    names: dict[str, tuple[str, ...]]  # kind -> names by id
+    ids: dict[str, dict[str, int]]  # kind -> name -> id
+
+    executor_host: np.ndarray
+    node_executor: np.ndarray
+    callback_node: np.ndarray
+    callback_wcet: np.ndarray
+    publisher_node: np.ndarray
+    publisher_topic: np.ndarray
+    timer_node: np.ndarray
+    timer_period: np.ndarray
+    timer_offset: np.ndarray
+    timer_callback: np.ndarray
+    subscription_node: np.ndarray
+    subscription_topic: np.ndarray
+    subscription_callback: np.ndarray
+    request_callback: np.ndarray
+    request_timeout: np.ndarray
+
+    topic_publishers: Adjacency  # topic -> publishers to it
+    topic_subscribers: Adjacency  # topic -> callbacks subscribed to it
+    callback_publishers: Adjacency  # callback -> publishers it uses
+
+    def id(self, kind: str, name: str) -> int:
+        return self.ids[kind].get(name, -1)
+
+    def name(self, kind: str, id: int) -> str:
+        return self.names[kind][id]
+
+    def count(self, kind: str) -> int:
+        return len(self.names[kind])
+
+
+class Compiler:
+    """Collects the columns while walking the system once."""
+
+    def __init__(self):
+        self.names = {kind: [] for kind in NAMED_KINDS}
+        self.ids = {kind: {} for kind in NAMED_KINDS}
+        self.columns = {}
+
+    def add(self, kind: str, name: str) -> int:
+        id = len(self.names[kind])
+        self.names[kind].append(name)
+        self.ids[kind].setdefault(name, id)
+        return id
+
+    def topic(self, name: str) -> int:
+        id = self.ids["topic"].get(name)
+        if id is None:
+            id = self.add("topic", name)
+        return id
+
+    def append(self, column: str, value) -> None:
+        self.columns.setdefault(column, []).append(value)
+
+    def resolve(self, kind: str, name: str) -> int:
+        return self.ids[kind].get(ros.name_of(name), -1)
+
+    def system(self, system: ros.System) -> CompiledSystem:
+        nodes = []
+        for host in system.hosts:
+            host_id = self.add("host", host.name)
+            for executor in host.executors:
+                executor_id = self.add("executor", executor.name)
+                self.append("executor_host", host_id)
+                for node in executor.nodes:
+                    nodes.append((self.add("node", node.name), node))
+                    self.append("node_executor", executor_id)
+        # Callbacks and publishers are numbered before anything refers
+        # to them by name
+        for node_id, node in nodes:
+            for callback in node.callbacks:
+                self.add("callback", callback.name)
+                self.append("callback_node", node_id)
+                self.append("callback_wcet", callback.wcet)
+            for publisher in node.publishers:
+                self.add("publisher", publisher.name)
+                self.append("publisher_node", node_id)
+                self.append("publisher_topic", self.topic(publisher.topic))
+        for node_id, node in nodes:
+            self.references(node_id, node)
+        return self.freeze()
+
+    def references(self, node_id: int, node: ros.Node) -> None:
+        for callback in node.callbacks:
+            callback_id = self.resolve("callback", callback.name)
+            for publisher in callback.publishers:
+                self.append("uses_callback", callback_id)
+                self.append("uses_publisher",
+                            self.resolve("publisher", publisher))
+            for request in callback.requests:
+                self.append("request_callback", callback_id)
+                self.append("request_timeout", request.timeout)
+        for timer in node.timers:
+            self.add("timer", timer.name)
+            self.append("timer_node", node_id)
+            self.append("timer_period", timer.period)
+            self.append("timer_offset", timer.offset)
+            self.append("timer_callback",
+                        self.resolve("callback", timer.callback))
+        for subscription in node.subscriptions:
+            self.append("subscription_node", node_id)
+            self.append("subscription_topic", self.topic(subscription.topic))
+            self.append("subscription_callback",
+                        self.resolve("callback", subscription.callback))
+
+    def freeze(self) -> CompiledSystem:
+        column = lambda name: frozen(self.columns.get(name, []))
+        topics = len(self.names["topic"])
+        return CompiledSystem(
+            names={kind: tuple(names) for kind, names in self.names.items()},
+            ids=self.ids,
+            executor_host=column("executor_host"),
+            node_executor=column("node_executor"),
+            callback_node=column("callback_node"),
+            callback_wcet=column("callback_wcet"),
+            publisher_node=column("publisher_node"),
+            publisher_topic=column("publisher_topic"),
+            timer_node=column("timer_node"),
+            timer_period=column("timer_period"),
+            timer_offset=column("timer_offset"),
+            timer_callback=column("timer_callback"),
+            subscription_node=column("subscription_node"),
+            subscription_topic=column("subscription_topic"),
+            subscription_callback=column("subscription_callback"),
+            request_callback=column("request_callback"),
+            request_timeout=column("request_timeout"),
+            topic_publishers=Adjacency.from_edges(
+                self.columns.get("publisher_topic", []),
+                range(len(self.names["publisher"])), topics),
+            topic_subscribers=Adjacency.from_edges(
+                self.columns.get("subscription_topic", []),
+                self.columns.get("subscription_callback", []), topics),
+            callback_publishers=Adjacency.from_edges(
+                self.columns.get("uses_callback", []),
+                self.columns.get("uses_publisher", []),
+                len(self.names["callback"])))
+
+
+def compile_system(system: ros.System) -> CompiledSystem:
+    """
+    Compiles system, see System.compile.
+    Raises TypeError if a wcet, period, offset or timeout is not an integer.
+    """
+    try:
+        return Compiler().system(system)
+    except (TypeError, OverflowError) as error:
+        raise TypeError(f"Cannot compile system: {error}")
+
+
+def validate_compiled(compiled: CompiledSystem) -> list[Diagnostic]:
+    """
+    The checks of the validator that concern every element of a kind
+    alike, run on whole columns at once:
+    - Callbacks have valid wcets
+    - Timers have valid periods
+    - Requests have valid timeouts
+    - Every topic subscribed to is published to
+    """
+    feedback = []
+    for id in np.flatnonzero(compiled.callback_wcet < 0):
+        feedback += [error("negative-wcet", "callback",
+                           compiled.name("callback", id))]
+    for id in np.flatnonzero(compiled.timer_period < 0):
+        feedback += [error("negative-period", "timer",
+                           compiled.name("timer", id))]
+    negative = compiled.request_callback[compiled.request_timeout < 0]
+    for id in negative[negative >= 0]:
+        feedback += [error("negative-timeout", "callback",
+                           compiled.name("callback", id))]
+    subscribed = np.zeros(compiled.count("topic"), dtype=bool)
+    subscribed[compiled.subscription_topic] = True
+    if np.any(subscribed & (compiled.topic_publishers.degrees() == 0)):
+        feedback += [error("mismatched", "interface", "topics subscribed to",
+                           "topics published to")]
+    return feedback
@@ -3,6 +3,8 @@ from pprint import pprint
 import backeman.system as bk
 import systemvalidator as sv
 import transformer_backeman as tb
+import responsetime as rt
+import verifycache
 
 
 def validation_ss():
@@ -25,7 +27,7 @@ e = h.add_executor(implementation="SingleThreadedExecutor")
 
 
 system = ros.System("test", dds_implementation="Generic")
-system.default_qos["length"] = 20
+system.default_qos = system.default_qos.replace(length=20)
 
 host = system.add_host(operating_system="Generic")
 executor = host.add_executor(implementation="SingleThreadedExecutor", ros_distribution="Eloquent")
@@ -124,15 +126,19 @@ act.add_subscription(topic="filter3", callback=cb8)
 feedback, objects, interfaces = sv.validate_system(system)
 for ln in feedback:
     print(ln)
+if not feedback:
+    print("System is well formed")
 
-errors, warnings, bksystem = tb.transform_system(system)
+errors, warnings, bksystem = tb.transform_system(
+    system, validation=(feedback, objects, interfaces))
 for ln in errors:
     print(ln)
 for ln in warnings:
     print(ln)
 bksystem: bk.System
 tb.monitor(bksystem, "sensor1", "actuator1")
+print(rt.reaction_time_bound(system, "sensor1", "actuator1"))
 print(bksystem.gen_declaration())
 print(bksystem.gen_system())
-mrt, _, _ = bksystem.max_reaction_time()
+mrt, _, _ = verifycache.max_reaction_time(bksystem)
 print(mrt)
@@ -0,0 +1,143 @@
+from collections import Counter
+from dataclasses import dataclass
+
+"""
+Findings of the validators as records rather than text.
+A Diagnostic carries a code, a severity, the kind and name of the
+element it is about and the arguments of its message, which is only
+formatted when the diagnostic is turned into a string, so validating
+a badly broken system does not spend its time writing messages no one
+reads, and tools can filter and count findings by code.
+
+An empty list of diagnostics means the system is well formed.
+"""
+
+ERROR = "error"
+WARNING = "warning"
+NOTE = "note"
+
+# Message of every code, formatted with the kind and name of the element
+# and the arguments of the diagnostic
+MESSAGES = {
+    # systemvalidator
+    "invalid-value": "{kind} '{name}' not among {0}",
+    "missing-name": "{kind} owned by {0} is missing name. "
+                    "Skipping validation of branch.",
+    "not-unique": "{kind} '{name}' has multiple owners, "
+                  "or name is not unique among {kind}s. "
+                  "Skipping validation of branch.",
+    "unregistered": "Even though {0} expected so, {kind} '{name}' "
+                    "is not registered to any parent.",
+    "wrong-parent": "Even though {0} expected so, {kind} '{name}' "
+                    "is not contained within the parent '{1}'",
+    "mismatched": "Mismatched: Some {name} are not among {0}",
+    "invalid-qos": "{name} has invalid qos {0} policy",
+    "incompatible-qos": "Publisher '{name}' offers qos incompatible with "
+                        "the subscription of '{0}' to topic '{1}' in {2}",
+    "missing-interface-name": "{kind} inside '{name}' is missing name.",
+    "negative-timeout": "A request of callback '{name}' has a negative "
+                        "timeout.",
+    "negative-wcet": "Callback '{name}' has a negative wcet",
+    "negative-period": "Timer '{name}' must not have a negative period",
+    "no-callback": "Node '{name}' must have at least one callback",
+    "no-trigger": "Node '{name}' must have at least one trigger",
+    "unused-publisher": "Publisher '{name}' inside node '{0}' is unused",
+    "no-node": "Executor '{name}' must have at least one node",
+    "no-executor": "Host '{name}' must have at least one executor",
+    "no-system-name": "System must have a name",
+    "no-host": "System must have at least one host",
+    # transformer_backeman
+    "not-well-formed": "System is not well formed, cannot start "
+                       "transformation. Validation feedback:",
+    "too-many": "System has {0} {kind}s, but target metamodel supports "
+                "at most {1}",
+    "unsupported-interface": "System has {name}, which are not supported "
+                             "by target metamodel",
+    "multiple-publishing-nodes": "Topic '{name}' has more than one "
+                                 "publishing node: {0}",
+    "unsupported-executor": "Host uses an unsupported executor {0}",
+    "unsupported-distribution": "Host uses an unsupported ros distribution "
+                                "{0}",
+    "cycle": "Cycles are not supported. There is a cycle among nodes: {0}",
+    "publisher-buffer-size": "'{name}' has buffersize {0}",
+    "subscription-buffer-size": "A subscription of '{name}' has "
+                                "buffersize {0}",
+    "buffer-assumption": "Note that the Backeman model assumes buffers are "
+                         "large enough to avoid overflow. In the concrete "
+                         "Uppaal model, a buffersize of 20 is used.",
+    "multiple-publishers": "Node '{name}' publishes to more than one topic",
+    "no-publisher": "Node '{name}' does not have a publisher",
+    "main-task-writes": "Main task '{name}' writes to internal variables",
+    "subtask-reads": "Subtask '{name}' reads variables",
+    "multiple-reads": "Callback '{name}' reads from more than one variable",
+    "multiple-writes": "Callback '{name}' writes to more than one variable",
+    "calls": "Callback '{name}' calls more than one callback",
+    "multiple-main-tasks": "Node '{name}' has more than one main task",
+    "no-main-task": "Node '{name}' does not have a main task",
+    "main-task-reads-nothing": "Main task '{name}' has subtasks, "
+                               "but does not read from any of them",
+    "unsupported-node": "Node '{name}' is neither a data generator, "
+                        "timer or subscriber\n"
+                        "Full contents of node:\n"
+                        "    Timers:        {0}\n"
+                        "    Subscriptions: {1}\n"
+                        "    Callbacks:     {2}\n"
+                        "    Variables:     {3}",
+}
+
+
+@dataclass(slots=True)
+class Diagnostic:
+    code: str
+    severity: str
+    kind: str  # Of the element, e.g. "callback"
+    name: str  # Of the element
+    args: tuple = ()
+
+    def message(self) -> str:
+        return MESSAGES[self.code].format(*self.args, kind=self.kind,
+                                          name=self.name)
+
+    def __str__(self) -> str:
+        return self.message()
+
+
+def error(code: str, kind: str, name: str, *args) -> Diagnostic:
+    return Diagnostic(code, ERROR, kind, name, args)
+
+
+def warning(code: str, kind: str, name: str, *args) -> Diagnostic:
+    return Diagnostic(code, WARNING, kind, name, args)
+
+
+def note(code: str, kind: str, name: str, *args) -> Diagnostic:
+    return Diagnostic(code, NOTE, kind, name, args)
+
+
+def until_errors(source, max_errors: int):
+    """
+    Passes the diagnostics of source on until max_errors errors have
+    been, then closes source, e.g. a validator, so it stops where it is.
+    Raises ValueError if max_errors is less than 1, as nothing would be
+    passed on and a failing source would look well formed.
+    """
+    if max_errors < 1:
+        raise ValueError(f"Cannot stop at {max_errors} errors, "
+                         "need at least 1")
+    errors = 0
+    for diagnostic in source:
+        yield diagnostic
+        if diagnostic.severity == ERROR:
+            errors += 1
+            if errors >= max_errors:
+                break
+    if hasattr(source, "close"):
+        source.close()
+
+
+def messages(diagnostics: list[Diagnostic]) -> list[str]:
+    return [diagnostic.message() for diagnostic in diagnostics]
+
+
+def count_by_code(diagnostics: list[Diagnostic]) -> Counter:
+    return Counter(diagnostic.code for diagnostic in diagnostics)
@@ -0,0 +1,155 @@
+import hashlib
+from collections.abc import Mapping
+import ros2system as ros
+
+"""
+Structural fingerprints of ros2 system models: a hash of every element
+that is the same for two elements exactly when they are equivalent,
+stable across runs, so it can key cached results of validation,
+transformation and analysis.
+
+Fingerprints are computed bottom-up, a node from those of its elements,
+an executor from those of its nodes and so on. Lists whose order means
+nothing are hashed as multisets, while the order of nodes in an executor
+and of the timers, subscriptions, services and external inputs of a node
+counts, as executors serve them in the order they were registered.
+The requests of a callback keep their order as well.
+
+The fingerprints of the system, hosts, executors and nodes are cached in
+the registry until an add_* method or System.mark_dirty touches them or
+anything they contain. Edits made otherwise are only seen after
+System.reindex().
+"""
+
+DIGEST_SIZE = 16
+
+
+def encode(value) -> bytes:
+    """A canonical encoding of a scalar, digest, mapping or list."""
+    if value is None:
+        return b"N"
+    if isinstance(value, bool):
+        return b"T" if value else b"F"
+    if isinstance(value, int):
+        return b"I" + str(value).encode() + b";"
+    if isinstance(value, float):
+        return b"D" + repr(value).encode() + b";"
+    if isinstance(value, str):
+        data = value.encode()
+        return b"S" + str(len(data)).encode() + b":" + data
+    if isinstance(value, bytes):
+        return b"H" + value
+    if isinstance(value, Mapping):
+        return encode([[key, value[key]] for key in sorted(value, key=str)])
+    if isinstance(value, (list, tuple)):
+        return (b"L" + str(len(value)).encode() + b":" +
+                b"".join(encode(element) for element in value))
+    raise TypeError(f"Cannot fingerprint {type(value).__name__} {value!r}")
+
+
+def hashed(kind: str, *values) -> bytes:
+    return hashlib.blake2b(encode([kind, *values]),
+                           digest_size=DIGEST_SIZE).digest()
+
+
+def names(elements: list) -> list[str]:
+    """The names of elements referred to by name or object, in any order."""
+    return sorted(ros.name_of(element) for element in elements)
+
+
+def unordered(digests) -> list[bytes]:
+    return sorted(digests)
+
+
+def leaf(element) -> bytes:
+    """The fingerprint of an element that is not a container."""
+    if isinstance(element, ros.Callback):
+        return hashed("callback", element.name, element.wcet,
+                      names(element.read_variables),
+                      names(element.write_variables),
+                      names(element.calls),
+                      names(element.publishers),
+                      names(element.external_outputs),
+                      [[ros.name_of(request.client), request.timeout]
+                       for request in element.requests])
+    if isinstance(element, ros.Publisher):
+        return hashed("publisher", element.name, element.topic,
+                      element.qos_offered)
+    if isinstance(element, ros.Subscription):
+        return hashed("subscription", element.topic,
+                      ros.name_of(element.callback), element.qos_requested)
+    if isinstance(element, ros.Timer):
+        return hashed("timer", element.name, element.period, element.offset,
+                      ros.name_of(element.callback))
+    if isinstance(element, ros.Service):
+        return hashed("service", element.name, ros.name_of(element.callback),
+                      element.qos_requested)
+    if isinstance(element, ros.Client):
+        return hashed("client", element.name, element.service,
+                      element.qos_profile)
+    if isinstance(element, ros.ExternalInput):
+        return hashed("external_input", element.name,
+                      ros.name_of(element.callback))
+    for kind, typ in [("variable", ros.Variable),
+                      ("external_output", ros.ExternalOutput),
+                      ("action", ros.Action)]:
+        if isinstance(element, typ):
+            return hashed(kind, element.name)
+    raise TypeError(f"Cannot fingerprint {type(element).__name__}")
+
+
+# The lists of a node whose order the executor depends on
+ORDERED_NODE_LISTS = ["timers", "subscriptions", "services",
+                      "external_inputs"]
+
+
+def compute(element, registry) -> bytes:
+    if isinstance(element, ros.Node):
+        lists = []
+        for attribute in ros.NODE_LISTS:
+            digests = [leaf(child) for child in getattr(element, attribute)]
+            if attribute not in ORDERED_NODE_LISTS:
+                digests = unordered(digests)
+            lists.append([attribute, digests])
+        return hashed("node", element.name, element.default_qos, lists)
+    if isinstance(element, ros.Executor):
+        return hashed("executor", element.name, element.ros_distribution,
+                      element.implementation, element.default_qos,
+                      [cached(node, registry) for node in element.nodes])
+    if isinstance(element, ros.Host):
+        return hashed("host", element.name, element.operating_system,
+                      element.architecture, element.default_qos,
+                      unordered(cached(executor, registry)
+                                for executor in element.executors))
+    if isinstance(element, ros.System):
+        return hashed("system", element.name, element.dds_implementation,
+                      element.default_qos,
+                      unordered(cached(host, registry)
+                                for host in element.hosts))
+    return leaf(element)
+
+
+def cached(element, registry) -> bytes:
+    if registry is None:
+        return compute(element, None)
+    entry = registry.fingerprints.get(id(element))
+    if entry is not None and entry[0] is element:
+        return entry[1]
+    digest = compute(element, registry)
+    registry.fingerprints[id(element)] = (element, digest)
+    return digest
+
+
+def digest(element) -> bytes:
+    """The fingerprint of any element of a system, as bytes."""
+    return cached(element, getattr(element, "registry", None))
+
+
+def fingerprint(element) -> str:
+    """The fingerprint of any element of a system, as hex."""
+    return digest(element).hex()
+
+
+def equivalent(first, second) -> bool:
+    """Whether two elements, e.g. systems or nodes, are equivalent."""
+    return type(first) is type(second) and digest(first) == digest(second)
@@ -0,0 +1,49 @@
+import ros2system as ros
+
+"""
+Builders of small systems for the tests.
+"""
+
+
+def make_system(executors: int = 1, name: str = "chain"
+                ) -> tuple[ros.System, list[ros.Executor]]:
+    """A system with one host of the given number of executors."""
+    system = ros.System(name, dds_implementation="Generic")
+    host = system.add_host(operating_system="Generic")
+    return system, [host.add_executor(ros_distribution="Humble")
+                    for _ in range(executors)]
+
+
+def add_chain(executors: list[ros.Executor], wcet: int,
+              period: int = 100) -> None:
+    """sensor -> filter -> actuator, the node i on executors[i]."""
+    topic = None
+    for executor, name in zip(executors, ["sensor", "filter", "actuator"]):
+        node = executor.add_node(name)
+        publisher = node.add_publisher(topic=name)
+        callback = node.add_callback(wcet=wcet, publishers=[publisher])
+        if topic is None:
+            node.add_timer(period=period, callback=callback)
+        else:
+            node.add_subscription(topic=topic, callback=callback)
+        topic = name
+
+
+def add_timer_node(executor: ros.Executor, name: str, wcet: int,
+                   period: int, offset: int = 0) -> ros.Node:
+    """A node publishing to the topic of its name on a timer."""
+    node = executor.add_node(name)
+    publisher = node.add_publisher(topic=name)
+    node.add_timer(period=period, offset=offset, callback=node.add_callback(
+        wcet=wcet, publishers=[publisher]))
+    return node
+
+
+def add_subscriber_node(executor: ros.Executor, name: str, topic: str,
+                        wcet: int) -> ros.Node:
+    """A node publishing to the topic of its name for each message."""
+    node = executor.add_node(name)
+    publisher = node.add_publisher(topic=name)
+    node.add_subscription(topic=topic, callback=node.add_callback(
+        wcet=wcet, publishers=[publisher]))
+    return node
@@ -0,0 +1,340 @@
+from dataclasses import dataclass, field
+from math import ceil
+import ros2system as ros
+
+"""
+An analytic upper bound on the reaction time from a data generator to an
+actuator, computed directly on a ros2 system model. It takes milliseconds
+where model checking the backeman model takes minutes or more, so it can
+rule out, or settle, a deadline before the model checker is run.
+Times are in the time unit of the model, milliseconds in the examples.
+
+Every timer, subscription, service and external input is a handle of the
+executor of its node, executing the wcet of its callback.
+The SingleThreadedExecutor before Jazzy works in rounds: it waits for
+ready handles, then executes each ready handle once, timers before
+subscriptions before services, in the order they were registered,
+before waiting again. Handles that become ready during a round wait for
+the next one.
+
+Two bounds are combined, the lower of which holds:
+- Busy window: from the moment a message of a chain arrives at an
+  executor, the executor is busy until the chain leaves it, so the chain
+  is through once the executor has done all work that can arrive in
+  the meantime. This holds whatever the order of execution.
+- Rounds: a handle with at most one message pending completes at most
+  one round after its message arrives, i.e. after every other handle
+  once, then the handles before it once more, then itself.
+  This is used for handles triggered once per period of a single timer
+  that complete within that period.
+
+A callback reading a variable samples it, so data written to a variable
+waits for the next release of the reader, at most the shortest period of
+the timers triggering it, and then for the reader to complete.
+
+Handles that no timer triggers, i.e. services, external inputs and
+subscriptions to topics no one publishes to, are assumed to arrive at
+most once per the shortest timer period of the system, unless a
+sporadic period is given.
+Communication between executors is taken to be instantaneous and client
+responses are not modelled, like in the backeman model.
+"""
+
+# Order in which the executor serves ready handles of each kind
+HANDLE_ORDER = ["timer", "subscription", "external_input", "service"]
+
+# A busy window longer than this many of the longest period is taken to
+# never end
+HORIZON_PERIODS = 1000
+
+
+@dataclass(eq=False)
+class Handle:
+    kind: str
+    trigger: object
+    node: ros.Node
+    executor: ros.Executor
+    callback: ros.Callback
+    wcet: int
+    period: int = None  # Of timers
+    # Timers triggering the handle, with the number of paths from each
+    sources: dict["Handle", int] = field(default_factory=dict)
+    topic_successors: list["Handle"] = field(default_factory=list)
+    variable_successors: list["Handle"] = field(default_factory=list)
+    predecessors: list["Handle"] = field(default_factory=list)
+    bound: int = 0  # From the release of its source to completion
+    # Latest arrival of a message after the release of its source, at the
+    # handle that brought it onto this executor
+    jitter: int = 0
+
+
+def make_handles(system: ros.System) -> dict[int, list[Handle]]:
+    """The handles of each executor in the order they are served."""
+    registry = system.registry
+    handles = {}
+    for host in system.hosts:
+        for executor in host.executors:
+            ordered = {kind: [] for kind in HANDLE_ORDER}
+            for node in executor.nodes:
+                for kind, triggers in [("timer", node.timers),
+                                       ("subscription", node.subscriptions),
+                                       ("external_input",
+                                        node.external_inputs),
+                                       ("service", node.services)]:
+                    for trigger in triggers:
+                        callback = registry.lookup(
+                            "callback", ros.name_of(trigger.callback))
+                        wcet = 0 if callback is None else callback.wcet
+                        period = getattr(trigger, "period", None)
+                        if kind == "timer" and not period > 0:
+                            raise ValueError(f"Timer '{trigger.name}' "
+                                             "has no positive period")
+                        ordered[kind].append(Handle(kind, trigger, node,
+                                                    executor, callback,
+                                                    wcet, period))
+            handles[id(executor)] = [handle for kind in HANDLE_ORDER
+                                     for handle in ordered[kind]]
+    return handles
+
+
+def connect(system: ros.System, handles: list[Handle]) -> list[Handle]:
+    """
+    Adds the edges between handles, i.e. from the handle running a
+    callback to the subscriptions to the topics it publishes to and to the
+    handles of the callbacks reading the variables it writes.
+    Returns the handles in topological order of their topic edges,
+    with the timers triggering each handle.
+    """
+    registry = system.registry
+    subscriptions = {id(handle.trigger): handle for handle in handles
+                     if handle.kind == "subscription"}
+    readers = {}
+    for handle in handles:
+        if handle.callback is not None:
+            for variable in handle.callback.read_variables:
+                readers.setdefault(ros.name_of(variable), []).append(handle)
+    for handle in handles:
+        if handle.callback is None:
+            continue
+        for name in handle.callback.publishers:
+            publisher = registry.lookup("publisher", ros.name_of(name))
+            if publisher is None:
+                continue
+            for subscription in registry.subscriptions_of(publisher.topic):
+                successor = subscriptions.get(id(subscription))
+                if successor is not None:
+                    handle.topic_successors.append(successor)
+                    successor.predecessors.append(handle)
+        for variable in handle.callback.write_variables:
+            handle.variable_successors += readers.get(
+                ros.name_of(variable), [])
+
+    order = topological(handles, lambda handle: handle.topic_successors)
+    for handle in order:
+        if handle.kind == "timer":
+            handle.sources[handle] = 1
+        for successor in handle.topic_successors:
+            for source, paths in handle.sources.items():
+                successor.sources[source] = (
+                    successor.sources.get(source, 0) + paths)
+    return order
+
+
+def topological(handles: list[Handle], successors) -> list[Handle]:
+    incoming = {id(handle): 0 for handle in handles}
+    for handle in handles:
+        for successor in successors(handle):
+            incoming[id(successor)] += 1
+    ready = [handle for handle in handles if incoming[id(handle)] == 0]
+    order = []
+    while ready:
+        handle = ready.pop()
+        order.append(handle)
+        for successor in successors(handle):
+            incoming[id(successor)] -= 1
+            if incoming[id(successor)] == 0:
+                ready.append(successor)
+    if len(order) != len(handles):
+        raise ValueError("Cannot bound reaction times of a system with "
+                         "cycles among its callbacks")
+    return order
+
+
+def arrivals(handle: Handle, window: int, sporadic: int) -> int:
+    """
+    How many messages of handle may be served in a busy window, i.e. were
+    released by a source in it or at most the jitter of handle before.
+    A message released earlier reached the executor before the window
+    started, when the executor was idle, so it was already served, and
+    so was everything it triggered on the executor.
+    """
+    if not handle.sources:
+        return ceil((window + handle.jitter) / sporadic)
+    return sum(paths * ceil((window + handle.jitter) / source.period)
+               for source, paths in handle.sources.items())
+
+
+def busy_window(executor_handles: list[Handle], sporadic: int,
+                horizon: int) -> int:
+    """
+    The longest time the executor may stay busy, or None if that is
+    longer than the horizon.
+    """
+    window = sum(handle.wcet for handle in executor_handles)
+    while True:
+        work = sum(handle.wcet * arrivals(handle, window, sporadic)
+                   for handle in executor_handles)
+        if work <= window:
+            return window
+        if work > horizon:
+            return None
+        window = work
+
+
+def round_bound(handle: Handle, executor_handles: list[Handle]) -> int:
+    """
+    From the arrival of a message to completion, when no other message
+    of handle is pending: the rest of the current round, then the
+    handles served before it in the next round, then itself.
+    """
+    total = sum(other.wcet for other in executor_handles)
+    before = 0
+    for other in executor_handles:
+        if other is handle:
+            break
+        before += other.wcet
+    return total + before
+
+
+def bound_handles(executors: dict[int, list[Handle]],
+                  order: list[Handle], sporadic: int) -> bool:
+    """
+    Sets the bound of every handle, from the release of its source to its
+    completion. Returns False if some executor may be busy forever.
+    """
+    periods = [source.period for handle in order for source in handle.sources]
+    horizon = HORIZON_PERIODS * max(periods + [sporadic])
+    executor_of = {id(handle): key for key, handles in executors.items()
+                   for handle in handles}
+    rounds = {id(handle): round_bound(handle, handles)
+              for handles in executors.values() for handle in handles}
+    changed = True
+    while changed:
+        changed = False
+        windows = {}
+        for key, handles in executors.items():
+            windows[key] = busy_window(handles, sporadic, horizon)
+            if windows[key] is None:
+                return False
+        starts = {}  # When the message starting the busy window arrived
+        for handle in order:
+            key = executor_of[id(handle)]
+            start = 0
+            arrival = 0
+            jitter = 0
+            for predecessor in handle.predecessors:
+                arrival = max(arrival, predecessor.bound)
+                if executor_of[id(predecessor)] == key:
+                    start = max(start, starts[id(predecessor)])
+                    jitter = max(jitter, predecessor.jitter)
+                else:
+                    start = max(start, predecessor.bound)
+                    jitter = max(jitter, predecessor.bound)
+            starts[id(handle)] = start
+            if jitter != handle.jitter:
+                handle.jitter = jitter
+                changed = True
+            bound = start + windows[key]
+            single = list(handle.sources.values()) == [1]
+            if single:
+                by_rounds = arrival + rounds[id(handle)]
+                source = next(iter(handle.sources))
+                if by_rounds <= source.period:
+                    bound = min(bound, by_rounds)
+            if bound > horizon:
+                return False
+            if bound != handle.bound:
+                handle.bound = bound
+                changed = True
+    return True
+
+
+def sampling_delay(reader: Handle, sporadic: int) -> int:
+    """The longest time until the next release triggering reader."""
+    if not reader.sources:
+        return sporadic
+    return min(source.period for source in reader.sources)
+
+
+def reaction_time_bound(system: ros.System, generator: str, actuator: str,
+                        sporadic_period: int = None) -> int:
+    """
+    An upper bound on the time from a release of a timer of the generator
+    node until a callback of the actuator node has completed on the data
+    of that release, along any path of topics and variables.
+    Returns None if an executor may be overloaded, in which case no
+    bound exists. Raises ValueError if the generator has no timer,
+    the actuator is not reached from it, or callbacks form a cycle.
+    """
+    executors = make_handles(system)
+    handles = [handle for handles in executors.values()
+               for handle in handles]
+    order = connect(system, handles)
+    periods = [handle.period for handle in handles if handle.kind == "timer"]
+    sporadic = sporadic_period
+    if sporadic is None:
+        sporadic = min(periods, default=None)
+    starts = [handle for handle in handles
+              if handle.kind == "timer" and handle.node.name == generator]
+    if starts == []:
+        raise ValueError(f"Generator '{generator}' has no timer")
+    if sporadic is None or not sporadic > 0:
+        raise ValueError("Need a positive sporadic period")
+    if not bound_handles(executors, order, sporadic):
+        return None
+
+    # Longest path from the generator, where data following a topic stays
+    # in the chain of one release and data passed through a variable waits
+    # for a release triggering the reader. releases holds when the release
+    # that the data is currently travelling with happened at the latest.
+    successors = lambda handle: (handle.topic_successors +
+                                 handle.variable_successors)
+    reached = reachable(starts, successors)
+    releases = {id(handle): 0 for handle in starts}
+    for handle in topological(reached, successors):
+        release = releases[id(handle)]
+        for successor in handle.topic_successors:
+            releases[id(successor)] = max(releases.get(id(successor), 0),
+                                          release)
+        for successor in handle.variable_successors:
+            sampled = (release + handle.bound +
+                       sampling_delay(successor, sporadic))
+            releases[id(successor)] = max(releases.get(id(successor), 0),
+                                          sampled)
+    ends = [releases[id(handle)] + handle.bound for handle in reached
+            if handle.node.name == actuator]
+    if ends == []:
+        raise ValueError(f"Actuator '{actuator}' is not reached "
+                         f"from '{generator}'")
+    return max(ends)
+
+
+def reachable(starts: list[Handle], successors) -> list[Handle]:
+    seen = {id(handle): handle for handle in starts}
+    stack = list(starts)
+    while stack:
+        for successor in successors(stack.pop()):
+            if id(successor) not in seen:
+                seen[id(successor)] = successor
+                stack.append(successor)
+    return list(seen.values())
+
+
+def proves_deadline(system: ros.System, generator: str, actuator: str,
+                    deadline: int) -> bool:
+    """
+    Whether the analytic bound alone shows that the reaction time is
+    within deadline. If not, the model checker has to decide.
+    """
+    bound = reaction_time_bound(system, generator, actuator)
+    return bound is not None and bound <= deadline
@@ -1,13 +1,85 @@
-from dataclasses import dataclass
+import sys
+import weakref
+from collections.abc import Mapping
+from dataclasses import dataclass, field, fields
 
 #TODO: Make enums (in validator) available to the user of this class
 
 TimeUnit = int
-QualityOfService = dict
 Topic = str
 
+
+class QualityOfService(Mapping):
+    """
+    A QoS profile, mapping policies such as "depth" to their values.
+    Profiles are immutable and interned, so all equal profiles are one
+    object, however many endpoints use it.
+    Values must be hashable, except lists, which are turned into tuples.
+    Make a changed profile with replace, e.g. qos.replace(depth=20).
+    """
+    __slots__ = ("_policies", "_hash", "__weakref__")
+
+    # Every profile still in use, by its policies
+    interned: weakref.WeakValueDictionary = weakref.WeakValueDictionary()
+
+    def __new__(cls, policies: Mapping = (), **changes):
+        if type(policies) is cls and not changes:
+            return policies
+        policies = {policy: policy_value(policy, value) for policy, value
+                    in dict(policies, **changes).items()}
+        key = frozenset(policies.items())
+        profile = cls.interned.get(key)
+        if profile is None:
+            profile = super().__new__(cls)
+            object.__setattr__(profile, "_policies", policies)
+            object.__setattr__(profile, "_hash", hash(key))
+            profile = cls.interned.setdefault(key, profile)
+        return profile
+
+    def __setattr__(self, name, value):
+        raise AttributeError("QualityOfService is immutable, use replace")
+
+    def __getitem__(self, policy: str):
+        return self._policies[policy]
+
+    def __iter__(self):
+        return iter(self._policies)
+
+    def __len__(self) -> int:
+        return len(self._policies)
+
+    def __hash__(self) -> int:
+        return self._hash
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, QualityOfService):
+            return self is other
+        return super().__eq__(other)
+
+    def __repr__(self) -> str:
+        return f"QualityOfService({self._policies!r})"
+
+    def __reduce__(self):
+        return QualityOfService, (self._policies,)
+
+    def replace(self, **changes) -> "QualityOfService":
+        return QualityOfService(self, **changes)
+
+
+def policy_value(policy: str, value):
+    """value of a QoS policy as it is kept, lists as tuples."""
+    if isinstance(value, (list, tuple)):
+        return tuple(policy_value(policy, item) for item in value)
+    try:
+        hash(value)
+    except TypeError:
+        raise ValueError(f"QoS policy '{policy}' has a value that is "
+                         f"neither hashable nor a list: {value!r}") from None
+    return value
+
+
 DEFAULT_EXECUTOR = "SingleThreadedExecutor"
-DEFAULT_QOS: QualityOfService = {
+DEFAULT_QOS = QualityOfService({
     "history": "system_default",
     "depth": 10,
     "reliability": "system_default",
@@ -16,23 +88,76 @@ DEFAULT_QOS: QualityOfService = {
     "lifespan": 0,
     "liveliness": "system_default",
     "liveliness_lease_duration": 0
-}
+})
 DEFAULT_DISTRIBUTION = "Rolling" #TODO: Make this overridable inside system?
 UNSPECIFIED = "Generic" #When not specified in model
 
-
-
-@dataclass
+# Shared by every empty list of elements until something is added to it,
+# as most callbacks and nodes leave most of their lists empty
+EMPTY = ()
+
+# The lists of elements in a node
+NODE_LISTS = [
+    "publishers",
+    "callbacks",
+    "subscriptions",
+    "variables",
+    "timers",
+    "services",
+    "actions",
+    "external_inputs",
+    "external_outputs",
+    "clients"
+]
+
+# Kinds of named elements, matching the object registry of the validator
+ELEMENT_KINDS = [
+    "host",
+    "executor",
+    "node",
+    "callback",
+    "publisher",
+    "timer",
+    "service",
+    "client",
+    "variable",
+    "external_input",
+    "external_output",
+    "action"
+]
+
+
+
+class Indexed:
+    """
+    An element referring to the registry of its system.
+    The registry is left out when the element is pickled or copied
+    on its own, as it would drag the whole system along.
+    """
+    __slots__ = ()
+
+    def __getstate__(self):
+        state = {field.name: getattr(self, field.name)
+                 for field in fields(self)}
+        state["registry"] = None
+        return state
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+
+
+@dataclass(slots=True)
 class Variable:
     name: str
 
 
-@dataclass
+@dataclass(slots=True)
 class ExternalOutput:
     name: str
 
 
-@dataclass
+@dataclass(slots=True)
 class Timer():
     name: str
     period: TimeUnit
@@ -40,7 +165,7 @@ class Timer():
     callback: str
 
 
-@dataclass
+@dataclass(slots=True)
 class Publisher():
     name: str
     qos_offered: QualityOfService
@@ -50,25 +175,25 @@ class Publisher():
                  name: str,
                  topic: Topic,
                  qos_offered: QualityOfService = DEFAULT_QOS):
-        self.name = name
-        self.topic = topic
-        self.qos_offered = qos_offered
+        self.name = intern(name)
+        self.topic = intern(topic)
+        self.qos_offered = QualityOfService(qos_offered)
 
 
-@dataclass
+@dataclass(slots=True)
 class Client():
     name: str
     service: str
     qos_profile: QualityOfService
 
 
-@dataclass
+@dataclass(slots=True)
 class Request():
     client: str
     timeout: TimeUnit
 
 
-@dataclass
+@dataclass(slots=True)
 class Callback():
     name: str
     wcet: TimeUnit
@@ -88,30 +213,17 @@ class Callback():
                  external_outputs=None,
                  publishers: list[str] = None,
                  requests: list[Request] = None):
-        if write_variables is None:
-            write_variables = []
-        if calls is None:
-            calls = []
-        if external_outputs is None:
-            external_outputs = []
-        if read_variables is None:
-            read_variables = []
-        if requests is None:
-            requests = []
-        if publishers is None:
-            publishers = []
-        self.read_variables = read_variables
-        self.name = name
+        self.name = intern(name)
         self.wcet = wcet
-        self.read_variables = read_variables
-        self.write_variables = write_variables
-        self.calls = calls
-        self.publishers = publishers
-        self.external_outputs = external_outputs
-        self.requests = requests
+        self.read_variables = compact(read_variables)
+        self.write_variables = compact(write_variables)
+        self.calls = compact(calls)
+        self.publishers = compact(publishers)
+        self.external_outputs = compact(external_outputs)
+        self.requests = compact(requests)
 
 
-@dataclass
+@dataclass(slots=True)
 class Subscription():
     topic: Topic
     qos_requested: QualityOfService
@@ -120,31 +232,31 @@ class Subscription():
     def __init__(self, topic: Topic,
                  callback: Callback,
                  qos_requested: QualityOfService = DEFAULT_QOS):
-        self.topic = topic
-        self.qos_requested = qos_requested
-        self.callback = callback.name
+        self.topic = intern(topic)
+        self.qos_requested = QualityOfService(qos_requested)
+        self.callback = intern(name_of(callback))
 
 
-@dataclass
+@dataclass(slots=True)
 class Service():
     name: str
     callback: Callback
     qos_requested: QualityOfService
 
 
-@dataclass
+@dataclass(slots=True)
 class Action():
     name: str
 
 
-@dataclass
+@dataclass(slots=True)
 class ExternalInput():
     name: str
     callback: Callback
 
 
-@dataclass
-class Node():
+@dataclass(slots=True)
+class Node(Indexed):
     name: str
     publishers: list[Publisher]
     callbacks: list[Callback]
@@ -157,14 +269,22 @@ class Node():
     external_outputs: list[ExternalOutput]
     clients: list[Client]
     default_qos: QualityOfService
+    registry: "Registry" = field(default=None, repr=False, compare=False)
+
+    def __post_init__(self):
+        self.name = intern(self.name)
+        for attribute in NODE_LISTS:
+            setattr(self, attribute, compact(getattr(self, attribute)))
 
-    def add_external_input(self, name: str = None) -> ExternalInput:
+    def add_external_input(self, name: str = None,
+                           callback: Callback = None) -> ExternalInput:
 
         if name is None:
             name = self.name + "_input" + str(len(self.external_inputs))
 
-        input = ExternalInput(name)
-        self.external_inputs.append(input)
+        input = ExternalInput(name=intern(name),
+                              callback=intern(name_of(callback)))
+        self._add("external_input", "external_inputs", input)
         return input
 
     def add_external_output(self, name: str = None) -> ExternalOutput:
@@ -172,8 +292,8 @@ class Node():
         if name is None:
             name = self.name + "_output" + str(len(self.external_outputs))
 
-        output = ExternalOutput(name)
-        self.external_outputs.append(output)
+        output = ExternalOutput(intern(name))
+        self._add("external_output", "external_outputs", output)
         return output
 
     def add_subscription(self,
@@ -183,44 +303,57 @@ class Node():
                          QualityOfService = None) -> Subscription:
         if qos_requested is None:
             qos_requested = self.default_qos
-        self.subscriptions.append(
-            Subscription(topic=topic,
-                         callback=callback,
-                         qos_requested=qos_requested))
+        subscription = Subscription(topic=topic,
+                                    callback=callback,
+                                    qos_requested=qos_requested)
+        self._add("subscription", "subscriptions", subscription)
+        return subscription
 
     def add_service(self,
                     wcet: TimeUnit,
                     name: str = None,
                     qos_profile: QualityOfService = None,
-                    calls: list[Callback] = None) -> Service:
+                    calls: list[Callback] = None,
+                    callback: Callback = None) -> Service:
+        """
+        Adds a service along with a callback answering it,
+        unless an existing callback is given.
+        """
         if qos_profile is None:
             qos_profile = self.default_qos
+        qos_profile = QualityOfService(qos_profile)
         if calls is None:
             calls = []
         if name is None:
             name = self.name + "service" + str(len(self.services))
-        callback = self.add_callback(
-            name=name + "_cb",
-            wcet=wcet,
-            publishers=[self.add_publisher(
-                name=name + "_publisher",
-                qos_offered=qos_profile,
-                topic=name
-            )]
-        )
-        service = Service(name=name,
-                          callback=callback,
+        if callback is None:
+            callback = self.add_callback(
+                name=name + "_cb",
+                wcet=wcet,
+                publishers=[self.add_publisher(
+                    name=name + "_publisher",
+                    qos_offered=qos_profile,
+                    topic=name
+                )]
+            )
+        service = Service(name=intern(name),
+                          callback=intern(name_of(callback)),
                           qos_requested=qos_profile)
-        self.services.append(service)
+        self._add("service", "services", service)
         return service
 
     def add_client(self,
                    service: str,
+                   name: str = None,
                    qos_profile: QualityOfService = None) -> Client:
         if qos_profile is None:
             qos_profile = self.default_qos
-        client = Client(service=service, qos_profile=qos_profile)
-        self.clients.append(client)
+        qos_profile = QualityOfService(qos_profile)
+        if name is None:
+            name = self.name + "client" + str(len(self.clients))
+        client = Client(name=intern(name), service=intern(service),
+                        qos_profile=qos_profile)
+        self._add("client", "clients", client)
         return client
 
     def add_callback(self,
@@ -232,26 +365,19 @@ class Node():
                      outputs: list[ExternalOutput] = None,
                      publishers: list[Publisher] = None,
                      requests: list[Request] = None) -> Callback:
-        if read_variables is None:
-            read_variables = []
-        if write_variables is None:
-            write_variables = []
-        if calls is None:
-            calls = []
-        if requests is None:
-            requests = []
         if name is None:
             name = self.name + "callback" + str(len(self.callbacks))
         if publishers is None:
-            pnames = []
+            pnames = EMPTY
         else:
-            pnames = [publisher.name for publisher in publishers]
+            pnames = [intern(name_of(publisher)) for publisher in publishers]
         callback = Callback(name=name, wcet=wcet,
                             read_variables=read_variables,
                             write_variables=write_variables,
                             calls=calls, publishers=pnames,
-                            external_outputs=outputs)
-        self.callbacks.append(callback)
+                            external_outputs=outputs,
+                            requests=requests)
+        self._add("callback", "callbacks", callback)
         return callback
 
     def add_publisher(self,
@@ -268,7 +394,7 @@ class Node():
                               qos_offered=qos_offered,
                               topic=topic,
                               )
-        self.publishers.append(publisher)
+        self._add("publisher", "publishers", publisher)
         return publisher
 
     def add_timer(self,
@@ -277,32 +403,43 @@ class Node():
                   offset: TimeUnit = 0,
                   callback: Callback = None) -> Timer:
         if callback is None:
-            callback = self.add_callback()
+            callback = self.add_callback(wcet=0)
         if name is None:
             name = self.name + "timer" + str(len(self.timers))
         timer = Timer(
-            callback=callback.name,
+            callback=intern(name_of(callback)),
             period=period,
             offset=offset,
-            name=name)
-        self.timers.append(timer)
+            name=intern(name))
+        self._add("timer", "timers", timer)
         return timer
 
     def add_variable(self, name: str = None):
         if name is None:
             name = self.name + "var" + str(len(self.variables))
-        var = Variable(name=name)
-        self.variables.append(var)
+        var = Variable(name=intern(name))
+        self._add("variable", "variables", var)
         return var
 
+    def _add(self, kind: str, attribute: str, element) -> None:
+        """Indexes element and appends it to the list named attribute."""
+        if self.registry is not None:
+            self.registry.add(kind, element, self)
+        elements = getattr(self, attribute)
+        if isinstance(elements, tuple):
+            elements = list(elements)
+            setattr(self, attribute, elements)
+        elements.append(element)
+
 
-@dataclass
-class Executor():
+@dataclass(slots=True)
+class Executor(Indexed):
     name: str
     ros_distribution: str
     implementation: str
     nodes: list[Node]
     default_qos: QualityOfService
+    registry: "Registry" = field(default=None, repr=False, compare=False)
 
     def add_node(self, name: str = None, subscriptions=None,
                  variables=None, timers=None, services=None,
@@ -310,31 +447,13 @@ class Executor():
                  callbacks=None, publishers=None,
                  clients=None,
                  external_outputs=None,
-                 default_qos=DEFAULT_QOS
+                 default_qos=None
                  ) -> Node:
 
         if name is None:
             name = self.name + "node" + str(len(self.nodes))
-        if subscriptions is None:
-            subscriptions = []
-        if variables is None:
-            variables = []
-        if timers is None:
-            timers = []
-        if services is None:
-            services = []
-        if actions is None:
-            actions = []
-        if external_inputs is None:
-            external_inputs = []
-        if callbacks is None:
-            callbacks = []
-        if publishers is None:
-            publishers = []
-        if clients is None:
-            clients = []
-        if external_outputs is None:
-            external_outputs = []
+        if default_qos is None:
+            default_qos = self.default_qos
 
         node = Node(name=name,
                     subscriptions=subscriptions,
@@ -347,9 +466,11 @@ class Executor():
                     publishers=publishers,
                     clients=clients,
                     external_outputs=external_outputs,
-                    default_qos=default_qos
+                    default_qos=QualityOfService(default_qos),
+                    registry=self.registry
                     )
-        node.name = name
+        if self.registry is not None:
+            self.registry.add_node(node, self)
         self.nodes.append(node)
         return node
 
@@ -357,27 +478,33 @@ class Executor():
         return [self.add_node(name=name) for name in nodenames]
 
 
-@dataclass
-class Host():
+@dataclass(slots=True)
+class Host(Indexed):
     name: str
     operating_system: str
     architecture: str
     executors: list[Executor]
     default_qos: QualityOfService
+    registry: "Registry" = field(default=None, repr=False, compare=False)
 
     def add_executor(self, name: str = None,
                      implementation: str = DEFAULT_EXECUTOR,
                      ros_distribution: str = DEFAULT_DISTRIBUTION,
-                     default_qos: dict = DEFAULT_QOS) -> Executor:
+                     default_qos: QualityOfService = None) -> Executor:
 
         if name is None:
             name = self.name + "_executor" + str(len(self.executors))
+        if default_qos is None:
+            default_qos = self.default_qos
         if (ros_distribution is None):
             raise ValueError("Please provide distribution")
 
-        executor = Executor(name=name, implementation=implementation, nodes=[],
+        executor = Executor(name=intern(name), implementation=implementation, nodes=[],
                             ros_distribution=ros_distribution,
-                            default_qos=default_qos)
+                            default_qos=QualityOfService(default_qos),
+                            registry=self.registry)
+        if self.registry is not None:
+            self.registry.add("executor", executor, self)
         self.executors.append(executor)
         return executor
 
@@ -386,12 +513,13 @@ class Host():
         return executor.add_node(name)
 
 
-@dataclass
+@dataclass(slots=True)
 class System():
     name: str
     dds_implementation: str
     hosts: list[Host]
     default_qos: QualityOfService
+    registry: "Registry" = field(repr=False, compare=False)
 
     def add_host(self,
                  name: str = None,
@@ -409,9 +537,11 @@ class System():
 
         host = Host(executors=[],
                     operating_system=operating_system,
-                    name=name,
+                    name=intern(name),
                     architecture=architecture,
-                    default_qos=default_qos)
+                    default_qos=QualityOfService(default_qos),
+                    registry=self.registry)
+        self.registry.add("host", host, self)
         self.hosts.append(host)
         return host
 
@@ -430,3 +560,290 @@ class System():
         self.hosts = []
         self.dds_implementation = dds_implementation
         self.default_qos = DEFAULT_QOS
+        self.registry = Registry()
+
+    def __getstate__(self):
+        return {field.name: getattr(self, field.name)
+                for field in fields(self) if field.name != "registry"}
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+        self.reindex()
+
+    def reindex(self) -> "Registry":
+        """
+        Rebuilds the registry from the hosts, for when the model was
+        changed without going through the add_* methods.
+        Names that are not unique are left for the validator to report.
+        """
+        self.registry = Registry()
+        self.registry.strict = False
+        for host in self.hosts:
+            self.registry.add_host(host, self)
+        self.registry.strict = True
+        return self.registry
+
+    def compile(self) -> "compiled.CompiledSystem":
+        """
+        Freezes the system into integer ids and NumPy columns for
+        vectorized checks and analyses, see compiled.py.
+        """
+        import compiled  # NumPy is only needed when compiling
+        return compiled.compile_system(self)
+
+    def mark_dirty(self, element) -> None:
+        """
+        Tells the watchers of the registry that element was edited in place,
+        e.g. a callback that got a new wcet.
+        """
+        self.registry.touch(element)
+
+
+KIND_TYPES = {
+    "host": Host,
+    "executor": Executor,
+    "node": Node,
+    "callback": Callback,
+    "publisher": Publisher,
+    "timer": Timer,
+    "service": Service,
+    "client": Client,
+    "variable": Variable,
+    "external_input": ExternalInput,
+    "external_output": ExternalOutput,
+    "action": Action
+}
+
+
+def node_elements(node: "Node") -> list[tuple[str, object]]:
+    """The (kind, element) pairs of everything node contains."""
+    contents = [("publisher", node.publishers),
+                ("callback", node.callbacks),
+                ("subscription", node.subscriptions),
+                ("variable", node.variables),
+                ("timer", node.timers),
+                ("service", node.services),
+                ("action", node.actions),
+                ("external_input", node.external_inputs),
+                ("external_output", node.external_outputs),
+                ("client", node.clients)]
+    return [(kind, element)
+            for kind, elements in contents for element in elements]
+
+
+def compact(elements: list) -> list:
+    """The shared EMPTY in place of an empty list."""
+    if not elements:
+        return EMPTY
+    return elements
+
+
+def intern(name: str) -> str:
+    """
+    Names are interned as elements are added, so that the many references
+    to a name, e.g. a topic, share one string.
+    Anything but a string, e.g. an element referred to by object, is kept.
+    """
+    if type(name) is str:
+        return sys.intern(name)
+    return name
+
+
+def name_of(element) -> str:
+    """
+    Elements refer to each other either by object or by name,
+    e.g. triggers to their callback and requests to their client.
+    """
+    if isinstance(element, str) or element is None:
+        return element
+    return element.name
+
+
+class Registry:
+    """
+    Name indexes over a System, kept up to date by the add_* methods.
+    Names must be unique per kind across the whole system, so a clashing
+    name is rejected when it is added rather than found by the validator.
+
+    objects:       kind -> name -> element
+    owners:        kind -> name -> the host, executor or node containing it
+    publishers:    topic -> publishers to it
+    subscriptions: topic -> subscriptions to it
+    triggers:      callback name -> timers, subscriptions, services and
+                   external inputs calling it
+
+    Watchers are called with every host, executor or node that an add_*
+    method added to, and with whatever is passed to System.mark_dirty.
+    fingerprints caches the fingerprints of the system, hosts, executors
+    and nodes by id, see fingerprint.py, and touching an element drops
+    those of its container and everything containing that.
+    """
+
+    def __init__(self):
+        self.objects: dict[str, dict[str, object]] = {
+            kind: {} for kind in ELEMENT_KINDS}
+        self.owners: dict[str, dict[str, object]] = {
+            kind: {} for kind in ELEMENT_KINDS}
+        self.publishers: dict[Topic, list[Publisher]] = {}
+        self.subscriptions: dict[Topic, list[Subscription]] = {}
+        self.triggers: dict[str, list] = {}
+        self.watchers: list = []
+        self.fingerprints: dict[int, tuple[object, bytes]] = {}
+        self.strict = True
+
+    def add(self, kind: str, element, owner) -> None:
+        self.add_all([(kind, element, owner)])
+
+    def add_all(self, elements: list[tuple[str, object, object]]) -> None:
+        """
+        Adds the (kind, element, owner) triples,
+        either all of them or, if any name clashes, none of them.
+        When the registry is not strict, the first of clashing names is kept.
+        """
+        seen = set()
+        for kind, element, _ in elements:
+            if not self.strict:
+                break
+            name = getattr(element, "name", None)
+            if name is None or name == "":
+                continue
+            if name in self.objects[kind] or (kind, name) in seen:
+                raise ValueError(f"{kind} '{name}' is not unique "
+                                 f"among {kind}s in system")
+            seen.add((kind, name))
+        for kind, element, owner in elements:
+            self.index(kind, element, owner)
+        touched = []
+        for _, _, owner in elements:
+            if not any(owner is other for other in touched):
+                touched.append(owner)
+                self.touch(owner)
+
+    def watch(self, watcher) -> None:
+        self.watchers.append(watcher)
+
+    def unwatch(self, watcher) -> None:
+        self.watchers.remove(watcher)
+
+    def touch(self, element) -> None:
+        if self.fingerprints:
+            self.forget(element)
+        for watcher in self.watchers:
+            watcher(element)
+
+    def forget(self, element) -> None:
+        """Drops the fingerprints of element and everything containing it."""
+        if not isinstance(element, System):
+            element = self.container(element)
+        while element is not None:
+            self.fingerprints.pop(id(element), None)
+            element = self.parent(element)
+
+    def parent(self, container):
+        """The executor, host or system containing a node, executor or host."""
+        for kind, typ in [("node", Node), ("executor", Executor),
+                          ("host", Host)]:
+            if isinstance(container, typ):
+                return self.owner(kind, container.name)
+        return None
+
+    def index(self, kind: str, element, owner) -> None:
+        if kind == "subscription":
+            self.subscriptions.setdefault(element.topic, []).append(element)
+        else:
+            name = element.name
+            if name is not None and name != "":
+                self.objects[kind].setdefault(name, element)
+                self.owners[kind].setdefault(name, owner)
+            if kind == "publisher":
+                self.publishers.setdefault(element.topic, []).append(element)
+        if kind in ["subscription", "timer", "service", "external_input"]:
+            callback = name_of(element.callback)
+            if callback is not None:
+                self.triggers.setdefault(callback, []).append(element)
+
+    def add_node(self, node: "Node", owner) -> None:
+        """Adds the node along with everything it already contains."""
+        self.add_all([("node", node, owner)] +
+                     [(kind, element, node)
+                      for kind, element in node_elements(node)])
+        node.registry = self
+
+    def remove(self, container) -> None:
+        """
+        Drops a host, executor or node and everything it contains from the
+        indexes, for when it was taken out of the system. Names that are
+        registered for other elements by now are left alone.
+        """
+        self.forget(container)
+        elements = []
+        pending = [container]
+        while pending:
+            element = pending.pop()
+            self.fingerprints.pop(id(element), None)
+            if isinstance(element, Node):
+                elements += [("node", element)] + node_elements(element)
+            elif isinstance(element, Executor):
+                elements.append(("executor", element))
+                pending += element.nodes
+            elif isinstance(element, Host):
+                elements.append(("host", element))
+                pending += element.executors
+        for kind, element in elements:
+            name = getattr(element, "name", None)
+            if kind in self.objects and \
+                    self.objects[kind].get(name) is element:
+                del self.objects[kind][name]
+                del self.owners[kind][name]
+        # Topics and callbacks may have changed in place since they were
+        # indexed, so look through all of them
+        removed = {id(element) for _, element in elements}
+        for index in [self.publishers, self.subscriptions, self.triggers]:
+            for key, indexed in list(index.items()):
+                kept = [element for element in indexed
+                        if id(element) not in removed]
+                if kept == []:
+                    del index[key]
+                elif len(kept) < len(indexed):
+                    index[key] = kept
+
+    def add_executor(self, executor: "Executor", owner) -> None:
+        self.add("executor", executor, owner)
+        executor.registry = self
+        for node in executor.nodes:
+            self.add_node(node, executor)
+
+    def add_host(self, host: "Host", owner) -> None:
+        self.add("host", host, owner)
+        host.registry = self
+        for executor in host.executors:
+            self.add_executor(executor, host)
+
+    def container(self, element):
+        """
+        Returns the host, executor or node that element is,
+        or the node containing it.
+        """
+        if isinstance(element, (Host, Executor, Node)):
+            return element
+        if isinstance(element, Subscription):
+            return self.owner("callback", element.callback)
+        for kind, typ in KIND_TYPES.items():
+            if isinstance(element, typ):
+                return self.owner(kind, element.name)
+
+    def lookup(self, kind: str, name: str):
+        return self.objects[kind].get(name)
+
+    def owner(self, kind: str, name: str):
+        return self.owners[kind].get(name)
+
+    def publishers_of(self, topic: Topic) -> list[Publisher]:
+        return self.publishers.get(topic, [])
+
+    def subscriptions_of(self, topic: Topic) -> list[Subscription]:
+        return self.subscriptions.get(topic, [])
+
+    def triggers_of(self, callback: str) -> list:
+        return self.triggers.get(callback, [])
@@ -0,0 +1,198 @@
+import pickle
+from math import lcm
+import responsetime as rt
+import ros2system as ros
+
+"""
+Slices a ros2 system model down to the nodes that can affect the reaction
+time from a monitored generator to an actuator, so the backeman model
+generated from it has fewer automata and clocks for the model checker.
+
+First a node is kept if
+- data flows from it to the actuator through topics, or it serves a
+  client of a node that is kept, so it feeds or delays the chain, or
+- it runs on the executor of a node that is kept. The executor is not
+  preemptive, and serves every ready callback in each round before it
+  takes new work, so a node of lower priority delays the chain as much
+  as one of higher priority.
+Everything else runs on other executors without feeding anything that
+is kept, and cannot change the reaction time as long as executors do not
+compete for processors, as responsetime assumes as well.
+
+Then, if a single executor is left, as the backeman model requires, and
+all its work is triggered by its own timers, nodes are dropped from it
+whose work never shares a busy window with the chain, i.e. a time the
+executor is busy without a break. Such nodes, e.g. those of a timer at
+another offset of the same period, only delay work that comes after the
+executor has been idle again, and so the chain only ever runs as if
+they were not there. Leaving them out can only shorten their own busy
+windows, which the chain is not part of.
+"""
+
+
+def feeders(system: ros.System) -> dict[str, set[str]]:
+    """For each node the nodes that publish to it or serve its clients."""
+    nodes = [node for host in system.hosts for executor in host.executors
+             for node in executor.nodes]
+    publishers = {}
+    servers = {}
+    for node in nodes:
+        for publisher in node.publishers:
+            publishers.setdefault(publisher.topic, set()).add(node.name)
+        for service in node.services:
+            servers.setdefault(service.name, set()).add(node.name)
+    fed = {}
+    for node in nodes:
+        sources = fed.setdefault(node.name, set())
+        for subscription in node.subscriptions:
+            sources |= publishers.get(subscription.topic, set())
+        for client in node.clients:
+            sources |= servers.get(client.service, set())
+    return fed
+
+
+def upstream(fed: dict[str, set[str]], names: list[str]) -> set[str]:
+    """The nodes named and those data flows from into any of them."""
+    found = set()
+    pending = list(names)
+    while pending:
+        name = pending.pop()
+        if name not in found:
+            found.add(name)
+            pending += fed[name] - found
+    return found
+
+
+# Releases simulated at most to find the busy windows of an executor
+MAX_RELEASES = 100000
+
+
+def executor_handles(system: ros.System, executor: ros.Executor) -> list:
+    """
+    The handles of executor, or None if callbacks form a cycle or some
+    handle is not triggered by timers of the executor alone.
+    """
+    executors = rt.make_handles(system)
+    handles = [handle for handles in executors.values()
+               for handle in handles]
+    try:
+        rt.connect(system, handles)
+    except ValueError:
+        return None
+    local = executors[id(executor)]
+    for handle in local:
+        if not handle.sources or any(predecessor.executor is not executor
+                                     for predecessor in handle.predecessors):
+            return None
+    return local
+
+
+def shared_windows(handles: list) -> list[set[int]]:
+    """
+    The timers released in each busy window of the executor of handles,
+    where every release brings the wcets of all work it triggers.
+    Busy windows only depend on when work arrives and how much, not on
+    the order it is served in, and repeat every hyperperiod after the
+    largest offset, so it suffices to go through two hyperperiods.
+    Returns None if the executor may be overloaded or that takes more
+    than MAX_RELEASES releases.
+    """
+    work = {}
+    for handle in handles:
+        for source, paths in handle.sources.items():
+            work[id(source)] = work.get(id(source), 0) + paths * handle.wcet
+    timers = [handle for handle in handles if handle.kind == "timer"]
+    if sum(work[id(timer)] / timer.period for timer in timers) > 1:
+        return None
+    end = (max(timer.trigger.offset for timer in timers) +
+           2 * lcm(*[timer.period for timer in timers]))
+    if sum(end // timer.period + 1 for timer in timers) > MAX_RELEASES:
+        return None
+    releases = sorted((time, id(timer)) for timer in timers
+                      for time in range(timer.trigger.offset, end,
+                                        timer.period))
+    windows = []
+    busy_until = None
+    for time, timer in releases:
+        if busy_until is None or time >= busy_until:
+            windows.append(set())
+            busy_until = time
+        windows[-1].add(timer)
+        busy_until += work[timer]
+    return windows
+
+
+def unaffecting_nodes(handles: list, chain: set[str]) -> set[str]:
+    """
+    The nodes of an executor whose work never shares a busy window with
+    that of the nodes in chain, see the module.
+    """
+    windows = shared_windows(handles)
+    if windows is None:
+        return set()
+    sources = {id(source) for handle in handles
+               if handle.node.name in chain for source in handle.sources}
+    together = set()
+    for window in windows:
+        if window & sources:
+            together |= window
+    nodes = {handle.node.name for handle in handles} - chain
+    for handle in handles:
+        if any(id(source) in together for source in handle.sources):
+            nodes.discard(handle.node.name)
+    return nodes
+
+
+def relevant_nodes(system: ros.System, generator: str,
+                   actuator: str) -> set[str]:
+    """The names of the nodes to keep, see the module."""
+    fed = feeders(system)
+    for name in [generator, actuator]:
+        if name not in fed:
+            raise ValueError(f"System has no node '{name}'")
+    chain = upstream(fed, [actuator])
+    if generator not in chain:
+        raise ValueError(f"Actuator '{actuator}' is not reached "
+                         f"from '{generator}'")
+    executors = [executor for host in system.hosts
+                 for executor in host.executors]
+    kept = chain
+    kept_executors = {}
+    while True:
+        added = [executor for executor in executors
+                 if id(executor) not in kept_executors and
+                 any(node.name in kept for node in executor.nodes)]
+        if not added:
+            break
+        for executor in added:
+            kept_executors[id(executor)] = executor
+            kept = upstream(fed, list(kept) +
+                            [node.name for node in executor.nodes])
+
+    if len(kept_executors) == 1:
+        [executor] = kept_executors.values()
+        handles = executor_handles(system, executor)
+        if handles is not None:
+            kept -= unaffecting_nodes(handles, chain)
+            kept = upstream(fed, list(kept))
+    return kept
+
+
+def slice_system(system: ros.System, generator: str,
+                 actuator: str) -> ros.System:
+    """
+    A copy of system with only the nodes that can affect the reaction
+    time from generator to actuator, and the executors and hosts that
+    still have nodes.
+    """
+    kept = relevant_nodes(system, generator, actuator)
+    sliced = pickle.loads(pickle.dumps(system))
+    for host in sliced.hosts:
+        for executor in host.executors:
+            executor.nodes = [node for node in executor.nodes
+                              if node.name in kept]
+        host.executors = [executor for executor in host.executors
+                          if executor.nodes]
+    sliced.hosts = [host for host in sliced.hosts if host.executors]
+    sliced.reindex()
+    return sliced
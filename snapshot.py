@@ -0,0 +1,398 @@
+import hashlib
+import os
+import struct
+import sys
+from array import array
+import ros2system as ros
+
+"""
+A compact binary snapshot of a ros2 system model, which reads back much
+faster than parsing its YAML, and a cache of snapshots keyed by the
+content of the file they were loaded from.
+
+A snapshot is
+    MAGIC, then the header (byte order, version, number of strings,
+    length of the text in bytes, number of fields),
+    the length in characters of every string as uint32,
+    the text of all strings one after another in UTF-8,
+    and the fields as int64.
+Each distinct string is stored once and referred to by its index,
+with -1 for None. The fields start with the table of QoS profiles,
+each stored once and referred to by index as well, followed by the
+system, hosts, executors and nodes in order, every list prefixed by
+its length.
+
+References between elements are stored by name, as yamlParser gives
+them, and the registry is rebuilt when the snapshot is read.
+Actions are stored by name only, as they have nothing else yet.
+"""
+
+MAGIC = b"ROS2SNAP"
+VERSION = 2  # Also bumped when yamlParser gives other systems than before
+HEADER = struct.Struct("<BIIQQ")
+
+# Tags of QoS policy values
+NONE, INTEGER, STRING, TRUE, FALSE, FLOAT = range(6)
+
+CACHE_VARIABLE = "ROS2MODELING_CACHE"
+
+
+class Writer:
+    def __init__(self):
+        self.strings: dict[str, int] = {}
+        self.profiles: dict[int, int] = {}  # by id of the profile
+        self.keys: dict[tuple, int] = {}  # by content of the profile
+        self.qos_fields = array('q')
+        self.fields = array('q')
+
+    def string(self, value: str) -> int:
+        if value is None:
+            return -1
+        if not isinstance(value, str):
+            raise ValueError(f"Expected a name, got {value!r}")
+        index = self.strings.get(value)
+        if index is None:
+            index = self.strings[value] = len(self.strings)
+        return index
+
+    def name(self, element) -> None:
+        self.fields.append(self.string(ros.name_of(element)))
+
+    def integer(self, value: int) -> None:
+        if not isinstance(value, int) or isinstance(value, bool):
+            raise ValueError(f"Expected an integer, got {value!r}")
+        self.fields.append(value)
+
+    def names(self, elements: list) -> None:
+        self.fields.append(len(elements))
+        self.fields.extend(self.string(ros.name_of(element))
+                           for element in elements)
+
+    def policy(self, value) -> tuple[int, int]:
+        if value is None:
+            return NONE, 0
+        if value is True:
+            return TRUE, 0
+        if value is False:
+            return FALSE, 0
+        if isinstance(value, int):
+            return INTEGER, value
+        if isinstance(value, float):
+            return FLOAT, self.string(repr(value))
+        if not isinstance(value, str):
+            raise ValueError(f"Cannot snapshot the QoS value {value!r}, "
+                             "only single values")
+        return STRING, self.string(value)
+
+    def qos(self, profile: ros.QualityOfService) -> None:
+        index = self.profiles.get(id(profile))
+        if index is None:
+            key = tuple((policy, type(value), value)
+                        for policy, value in profile.items())
+            index = self.keys.get(key)
+            if index is None:
+                index = self.keys[key] = len(self.keys)
+                self.qos_fields.append(len(profile))
+                for policy, value in profile.items():
+                    self.qos_fields.append(self.string(policy))
+                    self.qos_fields.extend(self.policy(value))
+            self.profiles[id(profile)] = index
+        self.fields.append(index)
+
+    def node(self, node: ros.Node) -> None:
+        self.name(node.name)
+        self.qos(node.default_qos)
+        self.fields.append(len(node.publishers))
+        for publisher in node.publishers:
+            self.name(publisher.name)
+            self.name(publisher.topic)
+            self.qos(publisher.qos_offered)
+        self.fields.append(len(node.callbacks))
+        for callback in node.callbacks:
+            self.name(callback.name)
+            self.integer(callback.wcet)
+            self.names(callback.read_variables)
+            self.names(callback.write_variables)
+            self.names(callback.calls)
+            self.names(callback.external_outputs)
+            self.names(callback.publishers)
+            self.fields.append(len(callback.requests))
+            for request in callback.requests:
+                self.name(request.client)
+                self.integer(request.timeout)
+        self.fields.append(len(node.subscriptions))
+        for subscription in node.subscriptions:
+            self.name(subscription.topic)
+            self.name(subscription.callback)
+            self.qos(subscription.qos_requested)
+        self.fields.append(len(node.timers))
+        for timer in node.timers:
+            self.name(timer.name)
+            self.integer(timer.period)
+            self.integer(timer.offset)
+            self.name(timer.callback)
+        self.fields.append(len(node.services))
+        for service in node.services:
+            self.name(service.name)
+            self.name(service.callback)
+            self.qos(service.qos_requested)
+        self.fields.append(len(node.clients))
+        for client in node.clients:
+            self.name(client.name)
+            self.name(client.service)
+            self.qos(client.qos_profile)
+        self.fields.append(len(node.external_inputs))
+        for input in node.external_inputs:
+            self.name(input.name)
+            self.name(input.callback)
+        self.names(node.variables)
+        self.names(node.external_outputs)
+        self.names(node.actions)
+
+    def system(self, system: ros.System) -> None:
+        self.name(system.name)
+        self.name(system.dds_implementation)
+        self.qos(system.default_qos)
+        self.fields.append(len(system.hosts))
+        for host in system.hosts:
+            self.name(host.name)
+            self.name(host.operating_system)
+            self.name(host.architecture)
+            self.qos(host.default_qos)
+            self.fields.append(len(host.executors))
+            for executor in host.executors:
+                self.name(executor.name)
+                self.name(executor.ros_distribution)
+                self.name(executor.implementation)
+                self.qos(executor.default_qos)
+                self.fields.append(len(executor.nodes))
+                for node in executor.nodes:
+                    self.node(node)
+
+    def dump(self, file) -> None:
+        fields = array('q', [len(self.keys)])
+        fields.extend(self.qos_fields)
+        fields.extend(self.fields)
+        text = "".join(self.strings).encode("utf-8")
+        lengths = array('I', [len(string) for string in self.strings])
+        file.write(MAGIC)
+        file.write(HEADER.pack(sys.byteorder == "little", VERSION,
+                               len(lengths), len(text), len(fields)))
+        file.write(lengths.tobytes())
+        file.write(text)
+        file.write(fields.tobytes())
+
+
+def dump(system: ros.System, file) -> None:
+    """
+    Writes a snapshot of system to the binary file.
+    Raises ValueError if the system has values that cannot be stored,
+    e.g. a wcet that is not an integer.
+    """
+    writer = Writer()
+    try:
+        writer.system(system)
+    except (OverflowError, TypeError) as error:
+        raise ValueError(f"Cannot store system in a snapshot: {error}")
+    writer.dump(file)
+
+
+def save(system: ros.System, path: str) -> None:
+    """Writes the snapshot to path at once, never leaving half a file."""
+    temporary = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(temporary, 'wb') as file:
+            dump(system, file)
+        os.replace(temporary, path)
+    finally:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+
+
+def read_array(data: memoryview, offset: int, typecode: str, count: int,
+               swap: bool) -> tuple[array, int]:
+    values = array(typecode)
+    end = offset + values.itemsize * count
+    if end > len(data):
+        raise ValueError("Snapshot is truncated")
+    values.frombytes(data[offset:end])
+    if swap:
+        values.byteswap()
+    return values, end
+
+
+def read_strings(lengths: array, text: str) -> list[str]:
+    strings = []
+    start = 0
+    for length in lengths:
+        strings.append(sys.intern(text[start:start + length]))
+        start += length
+    strings.append(None)  # index -1
+    return strings
+
+
+def read_policy(tag: int, value: int, strings: list[str]):
+    if tag == INTEGER:
+        return value
+    if tag == STRING:
+        return strings[value]
+    if tag == FLOAT:
+        return float(strings[value])
+    return {NONE: None, TRUE: True, FALSE: False}[tag]
+
+
+def read_node(take, strings: list[str],
+              profiles: list[ros.QualityOfService]) -> ros.Node:
+    def names() -> list[str]:
+        return [strings[take()] for _ in range(take())]
+
+    name = strings[take()]
+    default_qos = profiles[take()]
+    publishers = [ros.Publisher(name=strings[take()], topic=strings[take()],
+                                qos_offered=profiles[take()])
+                  for _ in range(take())]
+    callbacks = []
+    for _ in range(take()):
+        callback = ros.Callback(
+            name=strings[take()],
+            wcet=take(),
+            read_variables=[ros.Variable(name) for name in names()],
+            write_variables=[ros.Variable(name) for name in names()],
+            calls=names(),
+            external_outputs=[ros.ExternalOutput(name) for name in names()],
+            publishers=names(),
+            requests=[ros.Request(client=strings[take()], timeout=take())
+                      for _ in range(take())])
+        callbacks.append(callback)
+    subscriptions = [ros.Subscription(topic=strings[take()],
+                                      callback=strings[take()],
+                                      qos_requested=profiles[take()])
+                     for _ in range(take())]
+    timers = [ros.Timer(name=strings[take()], period=take(), offset=take(),
+                        callback=strings[take()])
+              for _ in range(take())]
+    services = [ros.Service(name=strings[take()], callback=strings[take()],
+                            qos_requested=profiles[take()])
+                for _ in range(take())]
+    clients = [ros.Client(name=strings[take()], service=strings[take()],
+                          qos_profile=profiles[take()])
+               for _ in range(take())]
+    external_inputs = [ros.ExternalInput(name=strings[take()],
+                                         callback=strings[take()])
+                       for _ in range(take())]
+    variables = [ros.Variable(name) for name in names()]
+    external_outputs = [ros.ExternalOutput(name) for name in names()]
+    actions = [ros.Action(name) for name in names()]
+    return ros.Node(name=name,
+                    publishers=publishers,
+                    callbacks=callbacks,
+                    subscriptions=subscriptions,
+                    variables=variables,
+                    timers=timers,
+                    services=services,
+                    actions=actions,
+                    external_inputs=external_inputs,
+                    external_outputs=external_outputs,
+                    clients=clients,
+                    default_qos=default_qos)
+
+
+def loads(data: bytes) -> ros.System:
+    """
+    Reads a system from a snapshot.
+    Raises ValueError if data is not a snapshot of this version.
+    """
+    data = memoryview(data)
+    if bytes(data[:len(MAGIC)]) != MAGIC:
+        raise ValueError("Not a snapshot")
+    offset = len(MAGIC) + HEADER.size
+    if offset > len(data):
+        raise ValueError("Snapshot is truncated")
+    little, version, count, size, width = HEADER.unpack_from(data,
+                                                             len(MAGIC))
+    if version != VERSION:
+        raise ValueError(f"Snapshot has version {version}, not {VERSION}")
+    swap = bool(little) != (sys.byteorder == "little")
+    lengths, offset = read_array(data, offset, 'I', count, swap)
+    text = bytes(data[offset:offset + size]).decode("utf-8")
+    strings = read_strings(lengths, text)
+    fields, offset = read_array(data, offset + size, 'q', width, swap)
+    take = iter(fields).__next__
+
+    try:
+        profiles = []
+        for _ in range(take()):
+            profiles.append(ros.QualityOfService(
+                {strings[take()]: read_policy(take(), take(), strings)
+                 for _ in range(take())}))
+        system = ros.System(name=strings[take()],
+                            dds_implementation=strings[take()])
+        system.default_qos = profiles[take()]
+        for _ in range(take()):
+            host = ros.Host(name=strings[take()],
+                            operating_system=strings[take()],
+                            architecture=strings[take()],
+                            default_qos=profiles[take()],
+                            executors=[])
+            for _ in range(take()):
+                executor = ros.Executor(name=strings[take()],
+                                        ros_distribution=strings[take()],
+                                        implementation=strings[take()],
+                                        default_qos=profiles[take()],
+                                        nodes=[])
+                executor.nodes = [read_node(take, strings, profiles)
+                                  for _ in range(take())]
+                host.executors.append(executor)
+            system.hosts.append(host)
+    except (StopIteration, IndexError, KeyError):
+        raise ValueError("Snapshot is corrupt")
+    system.reindex()
+    return system
+
+
+def load(path: str) -> ros.System:
+    with open(path, 'rb') as file:
+        return loads(file.read())
+
+
+def cache_directory() -> str:
+    """
+    Where snapshots are cached, set by the environment variable
+    ROS2MODELING_CACHE, by default ~/.cache/ros2modeling.
+    """
+    directory = os.environ.get(CACHE_VARIABLE)
+    if directory is None:
+        directory = os.path.join(os.path.expanduser("~"), ".cache",
+                                 "ros2modeling")
+    return directory
+
+
+def content_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def cached(path: str, load_source) -> ros.System:
+    """
+    Loads the system of the file at path from its cached snapshot,
+    or else by load_source(), caching a snapshot of the result.
+    The cache is keyed by the content of the file, so a changed file
+    is loaded again. If the cache cannot be read or written, the file
+    is simply loaded.
+    """
+    digest = content_hash(path)
+    snapshot = os.path.join(cache_directory(), f"{digest}.v{VERSION}.snap")
+    try:
+        return load(snapshot)
+    except (OSError, ValueError):
+        pass
+    system = load_source()
+    try:
+        os.makedirs(os.path.dirname(snapshot), exist_ok=True)
+        save(system, snapshot)
+    except (OSError, ValueError):
+        pass
+    return system
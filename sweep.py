@@ -0,0 +1,195 @@
+import itertools
+import os
+import pickle
+import signal
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+import ros2system as ros
+import transformer_backeman as tb
+import verifycache
+
+"""
+Sweeps the design space around a ros2 system model: every combination of
+values in a parameter grid is applied to a copy of a base system, which
+is then transformed and analysed, in a pool of processes.
+
+A grid maps parameters to the values to try, where a parameter is
+(kind, name, attribute), e.g.
+    ("callback", "filter1callback0", "wcet"): [10, 20, 30],
+    ("timer", "sensor1timer0", "period"): [180, 360],
+    ("timer", "sensor1timer0", "offset"): [0, 50],
+    ("executor", "executor0", "nodes"): [["sensor1", "filter1"], ...],
+the last being orderings of the nodes of an executor by name. Nodes left
+out of an ordering keep their relative order after the given ones.
+
+Variants are generated as the pool asks for them, with only a few more
+jobs submitted than there are processes, so a grid may be far larger than
+would fit in memory. Every job has a timeout, enforced in the worker by
+SIGALRM, so this needs a Unix platform for timeouts. A job that fails or
+times out only leaves its error in the results. When a worker dies, the
+jobs running in its pool fail and the rest go to a new pool.
+"""
+
+# Jobs submitted per worker process ahead of the results
+JOBS_PER_WORKER = 2
+
+
+@dataclass
+class ReactionTime:
+    """
+    An analysis for sweep: transforms the system and returns the maximum
+    reaction time from generator to actuator found by model checking.
+    It has no default, as a ros2 system model does not say which chain
+    to monitor.
+    """
+    generator: str
+    actuator: str
+
+    def __call__(self, system: ros.System) -> int:
+        errors, warnings, bksystem = tb.transform_system(system)
+        if errors or bksystem is None:
+            raise ValueError("; ".join(map(str, errors)))
+        tb.monitor(bksystem, self.generator, self.actuator)
+        reaction_time, _, _ = verifycache.max_reaction_time(bksystem)
+        return reaction_time
+
+
+@dataclass
+class SweepResult:
+    """
+    One column per parameter, holding the value of each variant in the
+    order of the grid, besides the result of the analysis, the error of
+    variants that failed, and the seconds each job took.
+    """
+    parameters: list[tuple[str, str, str]]
+    columns: dict[tuple[str, str, str], list] = field(default_factory=dict)
+    results: list = field(default_factory=list)
+    errors: list[str] = field(default_factory=list)
+    seconds: list[float] = field(default_factory=list)
+
+    def __len__(self) -> int:
+        return len(self.results)
+
+    def failed(self) -> list[int]:
+        return [index for index, error in enumerate(self.errors)
+                if error is not None]
+
+
+def variants(grid: dict):
+    """Yields each combination of values in grid as a dict."""
+    parameters = list(grid)
+    for values in itertools.product(*(grid[parameter]
+                                      for parameter in parameters)):
+        yield dict(zip(parameters, values))
+
+
+def order_nodes(executor: ros.Executor, names: list[str]) -> None:
+    by_name = {node.name: node for node in executor.nodes}
+    unknown = [name for name in names if name not in by_name]
+    if unknown:
+        raise ValueError(f"Executor '{executor.name}' has no nodes {unknown}")
+    first = [by_name[name] for name in names]
+    executor.nodes = first + [node for node in executor.nodes
+                              if node.name not in names]
+
+
+def apply(system: ros.System, variant: dict) -> None:
+    """Sets the values of variant in system."""
+    for (kind, name, attribute), value in variant.items():
+        element = system.registry.lookup(kind, name)
+        if element is None:
+            raise ValueError(f"System has no {kind} '{name}'")
+        if kind == "executor" and attribute == "nodes":
+            order_nodes(element, value)
+        else:
+            setattr(element, attribute, value)
+            system.mark_dirty(element)
+
+
+# The base system and analysis of the worker process
+worker_base = None
+worker_analysis = None
+
+
+def start_worker(base: bytes, analysis) -> None:
+    global worker_base, worker_analysis
+    worker_base = base
+    worker_analysis = analysis
+
+
+def timed_out(signum, frame):
+    raise TimeoutError("Timed out")
+
+
+def run_job(variant: dict, timeout: float) -> tuple:
+    """Returns the result, error and seconds of analysing variant."""
+    started = time.perf_counter()
+    previous = signal.signal(signal.SIGALRM, timed_out)
+    try:
+        if timeout is not None:
+            signal.setitimer(signal.ITIMER_REAL, timeout)
+        system = pickle.loads(worker_base)
+        apply(system, variant)
+        result, error = worker_analysis(system), None
+    except Exception as exception:
+        result, error = None, f"{type(exception).__name__}: {exception}"
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+    return result, error, time.perf_counter() - started
+
+
+def run_pool(base: bytes, analysis, jobs, outcomes: dict, workers: int,
+             timeout: float) -> bool:
+    """
+    Runs jobs in a new pool, storing their outcomes by index.
+    Returns False if a worker died, failing the jobs that were running.
+    """
+    pool = ProcessPoolExecutor(workers, initializer=start_worker,
+                               initargs=(base, analysis))
+    running = {}
+    try:
+        while True:
+            for index, variant in itertools.islice(
+                    jobs, workers * JOBS_PER_WORKER - len(running)):
+                running[pool.submit(run_job, variant, timeout)] = index
+            if not running:
+                return True
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                outcomes[running[future]] = future.result()
+                del running[future]
+    except BrokenProcessPool as broken:
+        for index in running.values():
+            outcomes[index] = (None, f"Worker died: {broken}", 0.0)
+        return False
+    finally:
+        pool.shutdown(cancel_futures=True)
+
+
+def sweep(system: ros.System, grid: dict, analysis, timeout: float = None,
+          workers: int = None) -> SweepResult:
+    """
+    Runs analysis, a picklable callable taking a system, on every variant
+    of system in grid, see the module. There is no default analysis; pass
+    e.g. ReactionTime(generator, actuator).
+    Uses all cores unless told the number of workers.
+    """
+    workers = workers or os.cpu_count() or 1
+    base = pickle.dumps(system)
+    outcomes = {}  # Index of the variant -> result, error, seconds
+    jobs = enumerate(variants(grid))
+    while not run_pool(base, analysis, jobs, outcomes, workers, timeout):
+        pass
+
+    table = SweepResult(list(grid))
+    for index, variant in enumerate(variants(grid)):
+        for parameter in table.parameters:
+            table.columns.setdefault(parameter, []).append(variant[parameter])
+        result, error, seconds = outcomes[index]
+        table.results.append(result)
+        table.errors.append(error)
+        table.seconds.append(seconds)
+    return table
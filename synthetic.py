@@ -0,0 +1,89 @@
+import ros2system as ros
+
+"""
+Generates ros2 system models of any size for benchmarks, built like the
+system of demo.py.
+
+A system is made of pipelines, each of fan_in timer-driven sensors, every
+one followed by a chain of filters, all feeding into a fusion node, which
+feeds an actuator. The fusion node is triggered by its first input, while
+the others write to a variable it reads, so with one host and executor the
+system can be transformed for backeman, whose executor and buffer size
+it uses. Pipelines are dealt out to the executors of the hosts in turn,
+and nodes left over once no pipeline fits anymore become lone sensors.
+"""
+
+
+def pipeline_size(chain_length: int, fan_in: int) -> int:
+    return fan_in * (1 + chain_length) + 2
+
+
+def add_stage(executor: ros.Executor, name: str, topic: str, wcet: int,
+              period: int = None) -> ros.Node:
+    """A node publishing to its own name, triggered by a timer or topic."""
+    node = executor.add_node(name=name)
+    publisher = node.add_publisher(topic=name)
+    callback = node.add_callback(wcet=wcet, publishers=[publisher])
+    if period is None:
+        node.add_subscription(topic=topic, callback=callback)
+    else:
+        node.add_timer(period=period, callback=callback)
+    return node
+
+
+def add_fusion(executor: ros.Executor, name: str, topics: list[str],
+               wcet: int) -> ros.Node:
+    node = executor.add_node(name=name)
+    publisher = node.add_publisher(topic=name)
+    read_variables = []
+    if len(topics) > 1:
+        variable = node.add_variable()
+        read_variables = [variable]
+        for topic in topics[1:]:
+            callback = node.add_callback(wcet=wcet,
+                                         write_variables=[variable])
+            node.add_subscription(topic=topic, callback=callback)
+    callback = node.add_callback(wcet=wcet, publishers=[publisher],
+                                 read_variables=read_variables)
+    node.add_subscription(topic=topics[0], callback=callback)
+    return node
+
+
+def add_pipeline(executor: ros.Executor, prefix: str, chain_length: int,
+                 fan_in: int, period: int, wcet: int) -> None:
+    inputs = []
+    for i in range(fan_in):
+        topic = add_stage(executor, f"{prefix}sensor{i}", None, wcet,
+                          period).name
+        for j in range(chain_length):
+            topic = add_stage(executor, f"{prefix}filter{i}_{j}", topic,
+                              wcet).name
+        inputs.append(topic)
+    fusion = add_fusion(executor, f"{prefix}fusion", inputs, wcet)
+    add_stage(executor, f"{prefix}actuator", fusion.name, wcet)
+
+
+def generate(nodes: int, hosts: int = 1, executors: int = 1,
+             chain_length: int = 2, fan_in: int = 2, period: int = 1000,
+             wcet: int = 1) -> ros.System:
+    """A system of the given number of nodes, see the module."""
+    if hosts < 1 or executors < 1 or fan_in < 1 or chain_length < 0:
+        raise ValueError("Need at least one host, executor and input "
+                         "and a chain length of at least 0")
+    system = ros.System(f"synthetic{nodes}", dds_implementation="Generic")
+    # The buffer size of the backeman model
+    system.default_qos = system.default_qos.replace(depth=20)
+    pool = [host.add_executor(implementation="SingleThreadedExecutor",
+                              ros_distribution="Humble")
+            for host in [system.add_host(operating_system="Generic")
+                         for _ in range(hosts)]
+            for _ in range(executors)]
+    size = pipeline_size(chain_length, fan_in)
+    pipelines = nodes // size
+    for p in range(pipelines):
+        add_pipeline(pool[p % len(pool)], f"p{p}_", chain_length, fan_in,
+                     period, wcet)
+    for i in range(nodes - pipelines * size):
+        add_stage(pool[(pipelines + i) % len(pool)], f"sensor{i}", None,
+                  wcet, period)
+    return system
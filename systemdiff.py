@@ -0,0 +1,206 @@
+from dataclasses import dataclass, field, fields
+import fingerprint
+import ros2system as ros
+
+"""
+The differences between two versions of a ros2 system model, e.g. to
+review a change to a large specification or to decide which analyses to
+run again.
+
+Hosts, executors, nodes and the elements of nodes are matched by name,
+and subscriptions by their callback. Subtrees with the same fingerprint
+are skipped at once, so with cached fingerprints the time taken grows
+with the size of the change rather than of the system.
+An element in only one of the versions is reported as added or removed
+as a whole, and an element in both with the fields that differ, e.g.
+wcet 30 -> 45. A node moved to another executor is removed from one and
+added to the other.
+"""
+
+
+@dataclass(frozen=True, slots=True)
+class Change:
+    action: str  # "added", "removed" or "modified"
+    kind: str
+    path: tuple[str, ...]  # Names from the host down to the element
+    fields: dict[str, tuple] = field(default_factory=dict)  # old, new
+
+    def __str__(self) -> str:
+        text = f"{self.action} {self.kind} {'/'.join(self.path)}"
+        if self.fields:
+            text += ": " + ", ".join(f"{name} {old} -> {new}"
+                                     for name, (old, new)
+                                     in self.fields.items())
+        return text
+
+
+# The kinds of the lists of a node, in the order of NODE_LISTS
+LIST_KINDS = {
+    "publishers": "publisher",
+    "callbacks": "callback",
+    "subscriptions": "subscription",
+    "variables": "variable",
+    "timers": "timer",
+    "services": "service",
+    "actions": "action",
+    "external_inputs": "external_input",
+    "external_outputs": "external_output",
+    "clients": "client",
+}
+
+
+def key(element) -> str:
+    if isinstance(element, ros.Subscription):
+        return ros.name_of(element.callback)
+    return element.name
+
+
+def keyed(elements: list) -> dict:
+    """Elements by key, numbering those whose key is taken."""
+    by_key = {}
+    for element in elements:
+        name = key(element)
+        unique = name
+        number = 1
+        while unique in by_key:
+            number += 1
+            unique = f"{name}#{number}"
+        by_key[unique] = element
+    return by_key
+
+
+def value(element, name: str):
+    """A field of a leaf, references by name and lists of names."""
+    data = getattr(element, name)
+    if name == "requests":
+        return [(ros.name_of(request.client), request.timeout)
+                for request in data]
+    if isinstance(data, (list, tuple)):
+        return fingerprint.names(data)
+    if name == "callback":
+        return ros.name_of(data)
+    return data
+
+
+def changed_fields(old, new, names: list[str]) -> dict[str, tuple]:
+    changed = {}
+    for name in names:
+        before = value(old, name)
+        after = value(new, name)
+        if before != after:
+            changed[name] = (before, after)
+    return changed
+
+
+def reordered(old: list, new: list) -> tuple:
+    """
+    The keys of the elements in both lists in old and new order,
+    or None if their order is the same.
+    """
+    before = list(keyed(old))
+    after = list(keyed(new))
+    common = set(before) & set(after)
+    before = [name for name in before if name in common]
+    after = [name for name in after if name in common]
+    if before == after:
+        return None
+    return before, after
+
+
+def diff_lists(kind: str, path: tuple, old: list, new: list, compare):
+    """
+    Yields the changes between lists of elements of kind, where
+    compare(old, new, path) yields those between matching elements.
+    """
+    old_keys = keyed(old)
+    new_keys = keyed(new)
+    for name, element in old_keys.items():
+        if name not in new_keys:
+            yield Change("removed", kind, path + (name,))
+    for name, element in new_keys.items():
+        previous = old_keys.get(name)
+        if previous is None:
+            yield Change("added", kind, path + (name,))
+        elif fingerprint.digest(previous) != fingerprint.digest(element):
+            yield from compare(previous, element, path + (name,))
+
+
+def leaf_changes(kind: str):
+    def compare(old, new, path: tuple):
+        names = [field.name for field in fields(old)]
+        changed = changed_fields(old, new, names)
+        if changed:
+            yield Change("modified", kind, path, changed)
+    return compare
+
+
+def diff_nodes(old: ros.Node, new: ros.Node, path: tuple):
+    changed = changed_fields(old, new, ["default_qos"])
+    for attribute in fingerprint.ORDERED_NODE_LISTS:
+        orders = reordered(getattr(old, attribute), getattr(new, attribute))
+        if orders is not None:
+            changed[f"{attribute} order"] = orders
+    if changed:
+        yield Change("modified", "node", path, changed)
+    for attribute, kind in LIST_KINDS.items():
+        yield from diff_lists(kind, path, getattr(old, attribute),
+                              getattr(new, attribute), leaf_changes(kind))
+
+
+def diff_executors(old: ros.Executor, new: ros.Executor, path: tuple):
+    changed = changed_fields(old, new, ["ros_distribution", "implementation",
+                                        "default_qos"])
+    orders = reordered(old.nodes, new.nodes)
+    if orders is not None:
+        changed["node order"] = orders
+    if changed:
+        yield Change("modified", "executor", path, changed)
+    yield from diff_lists("node", path, old.nodes, new.nodes, diff_nodes)
+
+
+def diff_hosts(old: ros.Host, new: ros.Host, path: tuple):
+    changed = changed_fields(old, new, ["operating_system", "architecture",
+                                        "default_qos"])
+    if changed:
+        yield Change("modified", "host", path, changed)
+    yield from diff_lists("executor", path, old.executors, new.executors,
+                          diff_executors)
+
+
+def diff(old: ros.System, new: ros.System) -> list[Change]:
+    """The changes from old to new, see the module."""
+    if fingerprint.digest(old) == fingerprint.digest(new):
+        return []
+    changes = []
+    changed = changed_fields(old, new, ["name", "dds_implementation",
+                                        "default_qos"])
+    if changed:
+        changes.append(Change("modified", "system", (), changed))
+    changes += diff_lists("host", (), old.hosts, new.hosts, diff_hosts)
+    return changes
+
+
+def reprioritized(path: tuple, before: list[str],
+                  after: list[str]) -> set[tuple[str, ...]]:
+    """
+    The paths of the nodes of the executor at path that other nodes are
+    served before after a change of node order, i.e. whose priority in
+    the executor changed.
+    """
+    ahead = {name: set(before[:index]) for index, name in enumerate(before)}
+    return {path + (name,) for index, name in enumerate(after)
+            if set(after[:index]) != ahead[name]}
+
+
+def changed_nodes(changes: list[Change]) -> set[tuple[str, ...]]:
+    """
+    The paths of the nodes that changes added, removed or changed
+    something in, or whose priority a new node order changed,
+    i.e. whose analyses have to be run again.
+    """
+    nodes = {change.path[:3] for change in changes if len(change.path) >= 3}
+    for change in changes:
+        if change.kind == "executor" and "node order" in change.fields:
+            nodes |= reprioritized(change.path,
+                                   *change.fields["node order"])
+    return nodes
@@ -1,3 +1,10 @@
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from functools import lru_cache
+from itertools import repeat
+from types import SimpleNamespace
+import diagnostics
+from diagnostics import Diagnostic, error
 import ros2system as ros
 
 """
@@ -8,7 +15,6 @@ ExternalOutputs
 
 TODO: Make dicts to map executors to distributions (check for age)
       and operating systems to architectures
-TODO: Check if QOS policies are compatible between offer and request
 TODO: Add operating system versions
 TODO: Consider adding uniqueness checks to all lists
       (that they are essentially sets)
@@ -99,72 +105,219 @@ VALID_VALUES = {
 }
 
 
-def is_valid_value(typ: str, val: str) -> list[str]:
+# Interfaces used by some element that must be provided by another
+SUBSETS = [
+    ("services requested", "services offered"),
+    ("topics subscribed to", "topics published to"),
+]
+
+
+def new_objects() -> dict[str, dict[str, str]]:
+    return {
+        "callback": {},
+        "external_input": {},
+        "external_output": {},
+        "executor": {},
+        "node": {},
+        "host": {},
+        "timer": {},
+        "service": {},
+        "client": {},
+        "variable": {},
+        "publisher": {},
+        "action": {}
+    }
+
+
+class Interfaces(dict):
+    """
+    Containers per interface type and name, along with the endpoints the
+    validation visited on each topic, for the qos checks.
+    endpoints: "publishers" or "subscriptions" -> topic -> (name, profile),
+    by the name of the publisher or of the callback of the subscription.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.endpoints: dict[str, dict[str, list[tuple[str, ros.QualityOfService]]]] = {
+            "publishers": {}, "subscriptions": {}}
+
+
+def new_interfaces() -> Interfaces:
+    return Interfaces({
+        "services requested": {},
+        "services offered": {},
+        "topics subscribed to": {},
+        "topics published to": {},
+    })
+
+
+def is_valid_value(typ: str, val: str) -> list[Diagnostic]:
 
     if val not in VALID_VALUES[typ]:
-        return [f"{typ} '{val}' not among {VALID_VALUES[typ]}"]
+        return [error("invalid-value", typ, val, VALID_VALUES[typ])]
     else:
         return []
 
 
 def register(object_name, object_type: str,
-             parent_name: str, objects) -> list[str]:
+             parent_name: str, objects) -> list[Diagnostic]:
     if (object_name is None) or (object_name == ""):
-        return [f"{object_type} owned by {parent_name} is missing name. "
-                "Skipping validation of branch."]
+        return [error("missing-name", object_type, object_name, parent_name)]
     elif object_name in objects[object_type]:
-        return [f"{object_type} '{object_name}' has multiple owners, "
-                f"or name is not unique among {object_type}s. "
-                "Skipping validation of branch."]
+        return [error("not-unique", object_type, object_name)]
     else:
         objects[object_type][object_name] = parent_name
         return []
 
 
 def verify_registration(object_name: str, object_type: str,
-                        parent_name: str, expector: str, objects) -> list[str]:
+                        parent_name: str, expector: str,
+                        objects) -> list[Diagnostic]:
     if object_name not in objects[object_type]:
-        return [f"Even though {expector} expected so, {object_type} "
-                f"'{object_name}' is not registered to any parent."]
+        return [error("unregistered", object_type, object_name, expector)]
     elif parent_name != objects[object_type][object_name]:
-        return [f"Even though {expector} expected so, {object_type} "
-                f"'{object_name}' is not contained within the parent "
-                f"'{parent_name}'"]
+        return [error("wrong-parent", object_type, object_name, expector,
+                      parent_name)]
     else:
         return []
 
 
-def subset_check(key1: str, key2: str, sets) -> list[str]:
+def subset_check(key1: str, key2: str, sets) -> list[Diagnostic]:
     keyset1 = sets[key1].keys()
     keyset2 = sets[key2].keys()
     if keyset1 <= keyset2:
         return []
     else:
-        return [f"Mismatched: Some {key1} are not among {key2}"]
+        return [error("mismatched", "interface", key1, key2)]
 
 
-def validate_qos(qos: ros.QualityOfService, parent: str) -> list[str]:
-    feedback = []
+# Distinct profiles, or pairs of them, whose findings are cached. Bounded,
+# so that profiles no longer in use can be freed.
+QOS_CACHE_SIZE = 1024
+
+
+@lru_cache(maxsize=QOS_CACHE_SIZE)
+def invalid_policies(qos: ros.QualityOfService) -> tuple[str, ...]:
+    """
+    The policies of qos with invalid values.
+    Profiles are interned, so this runs once per distinct profile
+    rather than once per endpoint.
+    """
+    invalid = []
     if qos["history"] not in QOS["history"]:
-        feedback += [f"{parent} has invalid qos history policy"]
+        invalid += ["history"]
     if qos["depth"] < 0:
-        feedback += [f"{parent} has invalid qos depth policy"]
+        invalid += ["depth"]
     if qos["reliability"] not in QOS["reliability"]:
-        feedback += [f"{parent} has invalid qos reliability policy"]
+        invalid += ["reliability"]
     if qos["durability"] not in QOS["durability"]:
-        feedback += [f"{parent} has invalid qos durability policy"]
+        invalid += ["durability"]
     if qos["deadline"] < 0:
-        feedback += [f"{parent} has invalid qos deadline policy"]
+        invalid += ["deadline"]
     if qos["lifespan"] < 0:
-        feedback += [f"{parent} has invalid qos lifespan policy"]
+        invalid += ["lifespan"]
     if qos["liveliness"] not in QOS["liveliness"]:
-        feedback += [f"{parent} has invalid qos liveliness policy"]
+        invalid += ["liveliness"]
     if qos["liveliness_lease_duration"] < 0:
-        feedback += [
-            f"{parent} has invalid qos liveliness_lease_duration policy"]
+        invalid += ["liveliness_lease_duration"]
+    return tuple(invalid)
+
+
+def validate_qos(qos: ros.QualityOfService, parent: str,
+                 kind: str) -> list[Diagnostic]:
+    """Findings about qos of the element of kind named parent."""
+    return [error("invalid-qos", kind, parent, policy)
+            for policy in invalid_policies(ros.QualityOfService(qos))]
+
+
+# Kinds of reliability, durability and liveliness from weakest to strongest.
+# An offer is compatible with a request of the same or a weaker kind.
+# system_default and best_available are decided by the middleware, so
+# offers and requests of those are not judged.
+QOS_STRENGTH = {
+    "reliability": ["best_effort", "reliable"],
+    "durability": ["volatile", "transient_local"],
+    "liveliness": ["automatic", "manual_by_topic"],
+}
+
+# Durations that an offer must not exceed, where 0 is infinite
+QOS_DURATIONS = ["deadline", "liveliness_lease_duration"]
+
+
+@lru_cache(maxsize=QOS_CACHE_SIZE)
+def incompatible_policies(offered: ros.QualityOfService,
+                          requested: ros.QualityOfService
+                          ) -> tuple[str, ...]:
+    """
+    The policies by which a publisher offering offered cannot serve a
+    subscription requesting requested, following the rules of
+    rmw_qos_profile_check_compatible.
+    """
+    incompatible = []
+    for policy, kinds in QOS_STRENGTH.items():
+        offer = offered.get(policy)
+        request = requested.get(policy)
+        if offer in kinds and request in kinds and \
+                kinds.index(offer) < kinds.index(request):
+            incompatible += [policy]
+    for policy in QOS_DURATIONS:
+        offer = offered.get(policy)
+        request = requested.get(policy)
+        if not (isinstance(offer, int) and isinstance(request, int)):
+            continue
+        if request > 0 and (offer == 0 or offer > request):
+            incompatible += [policy]
+    return tuple(incompatible)
+
+
+def group_by_qos(endpoints: list[tuple[str, ros.QualityOfService]]
+                 ) -> dict[ros.QualityOfService, list[str]]:
+    groups = {}
+    for name, profile in endpoints:
+        groups.setdefault(profile, []).append(name)
+    return groups
+
+
+def check_qos_compatibility(interfaces: Interfaces) -> list[Diagnostic]:
+    """
+    Compares the qos offered by every publisher to each topic subscribed
+    to with the qos requested by every subscription to it, among the
+    endpoints the validation visited.
+    Each distinct pair of profiles is only compared once, and every
+    incompatible pair of endpoints is reported.
+    """
+    feedback = []
+    publishers = interfaces.endpoints["publishers"]
+    subscriptions = interfaces.endpoints["subscriptions"]
+    for topic in interfaces["topics subscribed to"]:
+        if topic not in interfaces["topics published to"]:
+            continue
+        offers = group_by_qos(publishers.get(topic, []))
+        requests = group_by_qos(subscriptions.get(topic, []))
+        for requested, callbacks in requests.items():
+            for offered, names in offers.items():
+                policies = incompatible_policies(offered, requested)
+                if policies == ():
+                    continue
+                joined = ", ".join(policies)
+                feedback += [
+                    error("incompatible-qos", "publisher", publisher,
+                          callback, topic, joined)
+                    for callback in callbacks
+                    for publisher in names]
     return feedback
 
 
+def add_endpoint(topic: str, name: str, profile, kind: str,
+                 interfaces: Interfaces) -> None:
+    """Records a publisher or subscription to topic for the qos checks."""
+    if (topic is None) or (topic == ""):
+        return
+    endpoints = interfaces.endpoints[kind].setdefault(topic, [])
+    endpoints.append((name, ros.QualityOfService(profile)))
+
+
 def add_interface(name: str, container_name: str,
                   typ: str, interface_type: str, interfaces):
     """
@@ -176,7 +329,7 @@ def add_interface(name: str, container_name: str,
     writes to.
     """
     if (name is None) or (name == ""):
-        return [f"{typ} inside '{container_name}' is missing name."]
+        return [error("missing-interface-name", typ, container_name)]
     else:
         interfaces[interface_type].setdefault(name, [])
         interfaces[interface_type][name].append(container_name)
@@ -184,7 +337,7 @@ def add_interface(name: str, container_name: str,
 
 
 def validate_client(client: ros.Client, parent: ros.Node,
-                    objects, interfaces) -> list[str]:
+                    objects, interfaces) -> list[Diagnostic]:
     """
     A client is well formed if:
     - It has a name
@@ -194,10 +347,9 @@ def validate_client(client: ros.Client, parent: ros.Node,
     """
     feedback = register(client.name, "client", parent.name, objects)
     if feedback != []:
-        print(feedback)
         return feedback
 
-    feedback += validate_qos(client.qos_profile, client.name)
+    feedback += validate_qos(client.qos_profile, client.name, "client")
     feedback += add_interface(client.service, client.name,
                               "Service", "services requested", interfaces)
 
@@ -205,7 +357,7 @@ def validate_client(client: ros.Client, parent: ros.Node,
 
 
 def validate_publisher(publisher: ros.Publisher, parent: ros.Node,
-                       objects, interfaces) -> list[str]:
+                       objects, interfaces) -> list[Diagnostic]:
     """
     A publisher is well formed if:
     - It has a name
@@ -218,15 +370,18 @@ def validate_publisher(publisher: ros.Publisher, parent: ros.Node,
     if feedback != []:
         return feedback
 
-    feedback += validate_qos(publisher.qos_offered, publisher.name)
+    feedback += validate_qos(publisher.qos_offered, publisher.name,
+                             "publisher")
     feedback += add_interface(publisher.topic, publisher.name,
                               "topic", "topics published to", interfaces)
+    add_endpoint(publisher.topic, publisher.name, publisher.qos_offered,
+                 "publishers", interfaces)
 
     return feedback
 
 
 def validate_callback(callback: ros.Callback, parent: ros.Node,
-                      objects, interfaces) -> list[str]:
+                      objects, interfaces) -> list[Diagnostic]:
     """
     A callback is well formed if:
     - It has a name
@@ -257,18 +412,17 @@ def validate_callback(callback: ros.Callback, parent: ros.Node,
             output.name, "external_output", pname, name, objects)
     for request in callback.requests:
         feedback += verify_registration(
-            request.client.name, "client", pname, name, objects)
+            ros.name_of(request.client), "client", pname, name, objects)
         if request.timeout < 0:
-            feedback += [
-                f"A request of callback '{name}' has a negative timeout."]
+            feedback += [error("negative-timeout", "callback", name)]
     if callback.wcet < 0:
-        feedback += [f"Callback '{name}' has a negative wcet"]
+        feedback += [error("negative-wcet", "callback", name)]
 
     return feedback
 
 
 def validate_input(input: ros.ExternalInput, parent: ros.Node,
-                   objects, interfaces) -> list[str]:
+                   objects, interfaces) -> list[Diagnostic]:
     """
     An external input is well formed if:
     - It has a name
@@ -279,11 +433,11 @@ def validate_input(input: ros.ExternalInput, parent: ros.Node,
     if feedback != []:
         return feedback
 
-    feedback += verify_registration(input.callback, "callback", parent.name, input.name, objects)
+    feedback += verify_registration(ros.name_of(input.callback), "callback", parent.name, input.name, objects)
 
     return feedback
 
-def validate_subscription(subscription: ros.Subscription, parent: ros.Node, objects, interfaces) -> list[str]:
+def validate_subscription(subscription: ros.Subscription, parent: ros.Node, objects, interfaces) -> list[Diagnostic]:
     """
     A subscription is well formed if:
     - It has a valid quality of service profile
@@ -292,13 +446,15 @@ def validate_subscription(subscription: ros.Subscription, parent: ros.Node, obje
     """
     pname = parent.name
     feedback = []
-    feedback += validate_qos(subscription.qos_requested, pname)
+    feedback += validate_qos(subscription.qos_requested, pname, "node")
     feedback += add_interface(subscription.topic, pname, "Topic", "topics subscribed to", interfaces)
+    add_endpoint(subscription.topic, ros.name_of(subscription.callback),
+                 subscription.qos_requested, "subscriptions", interfaces)
     feedback += verify_registration(subscription.callback, "callback", pname, pname, objects)
 
     return feedback
 
-def validate_timer(timer: ros.Timer, parent: ros.Node, objects, interfaces) -> list[str]:
+def validate_timer(timer: ros.Timer, parent: ros.Node, objects, interfaces) -> list[Diagnostic]:
     """
     A subscription is well formed if:
     - It has a name
@@ -311,13 +467,13 @@ def validate_timer(timer: ros.Timer, parent: ros.Node, objects, interfaces) -> l
         return feedback
 
     if timer.period < 0:
-        feedback += [f"Timer '{timer.name}' must not have a negative period"]
+        feedback += [error("negative-period", "timer", timer.name)]
 
     feedback += verify_registration(timer.callback, "callback", parent.name, timer.name, objects)
 
     return feedback
 
-def validate_service(service: ros.Service, parent: ros.node, objects, interfaces) -> list[str]:
+def validate_service(service: ros.Service, parent: ros.Node, objects, interfaces) -> list[Diagnostic]:
     """
     A service is well formed if:
     - It has a name
@@ -330,21 +486,22 @@ def validate_service(service: ros.Service, parent: ros.node, objects, interfaces
     if feedback != []:
         return feedback
 
-    feedback += validate_qos(service.qos_requested, service.name)
-    feedback += add_interface(service.name, node.name, "service", "services offered", interfaces)
+    feedback += validate_qos(service.qos_requested, service.name, "service")
+    feedback += add_interface(service.name, parent.name, "service", "services offered", interfaces)
 
-    feedback += verify_registration(service.callback, "callback", parent.name, service.name, objects)
+    feedback += verify_registration(ros.name_of(service.callback), "callback", parent.name, service.name, objects)
     return feedback
 
 
-def validate_action(action: ros.Action, parent: ros.Node) -> list[str]:
+def validate_action(action: ros.Action, parent: ros.Node) -> list[Diagnostic]:
     """
     TODO
     """
     return []
 
 
-def validate_node(node: ros.Node, parent: ros.Executor, objects, interfaces) -> list[str]:
+def iter_node(node: ros.Node, parent: ros.Executor, objects, interfaces,
+              visit=None):
     """
     A node is well formed if:
     - It has a name
@@ -369,59 +526,71 @@ def validate_node(node: ros.Node, parent: ros.Executor, objects, interfaces) ->
 
     - All callbacks only call callbacks that are also owned by this node
     - All publishers are used by at least one callback
+
+    Yields the findings as they are made.
     """
     feedback = register(node.name, "node", parent.name, objects)
     if feedback != []:
-        return feedback
+        yield from feedback
+        return
 
     # outputs
     for client in node.clients:
-        feedback += validate_client(client, node, objects, interfaces)
+        yield from validate_client(client, node, objects, interfaces)
     for publisher in node.publishers:
-        feedback += validate_publisher(publisher, node, objects, interfaces)
+        yield from validate_publisher(publisher, node, objects, interfaces)
 
     # internal
     for variable in node.variables:
-        feedback += register(variable.name, "variable", node.name, objects)
+        yield from register(variable.name, "variable", node.name, objects)
     for output in node.external_outputs:
-        feedback += register(output.name, "external_output", node.name, objects)
+        yield from register(output.name, "external_output", node.name, objects)
     if len(node.callbacks) < 1:
-        feedback += f"Node '{node.name}' must have at least one callback"
+        yield error("no-callback", "node", node.name)
     for callback in node.callbacks:
-        feedback += validate_callback(callback, node, objects, interfaces)
+        yield from validate_callback(callback, node, objects, interfaces)
 
     total_triggers = 0
     for input in node.external_inputs:
-        feedback += validate_input(input, node, objects, interfaces)
+        yield from validate_input(input, node, objects, interfaces)
         total_triggers += 1
     for subscription in node.subscriptions:
-        feedback += validate_subscription(subscription, node, objects, interfaces)
+        yield from validate_subscription(subscription, node, objects, interfaces)
         total_triggers += 1
     for timer in node.timers:
-        feedback += validate_timer(timer, node, objects, interfaces)
+        yield from validate_timer(timer, node, objects, interfaces)
         total_triggers += 1
     for service in node.services:
-        feedback += validate_service(service, node, objects, interfaces)
+        yield from validate_service(service, node, objects, interfaces)
         total_triggers += 1
     for action in node.actions:
         validate_action(action, node)  # TODO: Add support for actions
         total_triggers += 1
     if total_triggers < 1:
-        feedback += f"Node '{node.name}' must have at least one trigger"
+        yield error("no-trigger", "node", node.name)
 
     for callback in node.callbacks:
         for called_name in callback.calls:
-            feedback += verify_registration(called_name, "callback", node.name, callback.name, objects)
+            yield from verify_registration(called_name, "callback", node.name, callback.name, objects)
 
-    used_publishers = [publisher for publisher in
-                       callback.publishers for callback in node.callbacks]
+    used_publishers = {ros.name_of(publisher) for callback in node.callbacks
+                       for publisher in callback.publishers}
     for publisher in node.publishers:
         if publisher.name not in used_publishers:
-            feedback += [f"Publisher '{publisher.name}' inside node '{node.name}' is unused"]
-    return feedback
+            yield error("unused-publisher", "publisher", publisher.name,
+                        node.name)
+
+    if visit is not None:
+        visit(node, parent)
+
 
+def validate_node(node: ros.Node, parent: ros.Executor, objects,
+                  interfaces) -> list[Diagnostic]:
+    return list(iter_node(node, parent, objects, interfaces))
 
-def validate_executor(executor: ros.Executor, parent: ros.Host, objects, interfaces) -> list[str]:
+
+def iter_executor(executor: ros.Executor, parent: ros.Host, objects,
+                  interfaces, visit=None):
     """
     An executor is well formed if:
     - It has a name
@@ -433,20 +602,47 @@ def validate_executor(executor: ros.Executor, parent: ros.Host, objects, interfa
     """
     feedback = register(executor.name, "executor", parent.name, objects)
     if feedback != []:
-        return feedback
+        yield from feedback
+        return
 
-    feedback += is_valid_value("distribution", executor.ros_distribution)
-    feedback += is_valid_value("executor", executor.implementation)
+    yield from executor_properties(executor)
+    for node in executor.nodes:
+        yield from iter_node(node, executor, objects, interfaces, visit)
 
+
+def validate_executor(executor: ros.Executor, parent: ros.Host, objects,
+                      interfaces) -> list[Diagnostic]:
+    return list(iter_executor(executor, parent, objects, interfaces))
+
+
+def executor_properties(executor: ros.Executor) -> list[Diagnostic]:
+    feedback = is_valid_value("distribution", executor.ros_distribution)
+    feedback += is_valid_value("executor", executor.implementation)
     if len(executor.nodes) < 1:
-        feedback += [f"Executor '{executor.name}' must have at least one node"]
+        feedback += [error("no-node", "executor", executor.name)]
+    return feedback
 
-    for node in executor.nodes:
-        feedback += validate_node(node, executor, objects, interfaces)
+
+def host_properties(host: ros.Host) -> list[Diagnostic]:
+    feedback = is_valid_value("os", host.operating_system)
+    feedback += is_valid_value("architecture", host.architecture)
+    if len(host.executors) < 1:
+        feedback += [error("no-executor", "host", host.name)]
     return feedback
 
 
-def validate_host(host: ros.Host, parent: ros.System, objects, interfaces) -> list[str]:
+def system_properties(system: ros.System) -> list[Diagnostic]:
+    feedback = []
+    if (system.name is None) or (system.name == ""):
+        feedback += [error("no-system-name", "system", system.name)]
+    feedback += is_valid_value("dds", system.dds_implementation)
+    if len(system.hosts) < 1:
+        feedback += [error("no-host", "system", system.name)]
+    return feedback
+
+
+def iter_host(host: ros.Host, parent: ros.System, objects, interfaces,
+              visit=None):
     """
     A host is well formed if:
     - It has a name
@@ -457,21 +653,20 @@ def validate_host(host: ros.Host, parent: ros.System, objects, interfaces) -> li
     """
     feedback = register(host.name, "host", parent.name, objects)
     if feedback != []:
-        return feedback
+        yield from feedback
+        return
 
-    feedback += is_valid_value("os", host.operating_system)
-    feedback += is_valid_value("architecture", host.architecture)
+    yield from host_properties(host)
+    for executor in host.executors:
+        yield from iter_executor(executor, host, objects, interfaces, visit)
 
-    executors = host.executors
-    if len(executors) < 1:
-        feedback += [f"Host '{host.name}' must have at least one executor"]
 
-    for executor in executors:
-        feedback += validate_executor(executor, host, objects, interfaces)
-    return feedback
+def validate_host(host: ros.Host, parent: ros.System, objects,
+                  interfaces) -> list[Diagnostic]:
+    return list(iter_host(host, parent, objects, interfaces))
 
 
-def validate_system(system: ros.System) -> tuple[list[str], dict[str, dict[str, str], dict[str, dict[str, list[str]]]]]:
+def iter_system(system: ros.System, objects, interfaces, visit=None):
     """
     A system is well formed if:
     - It has a name
@@ -480,45 +675,527 @@ def validate_system(system: ros.System) -> tuple[list[str], dict[str, dict[str,
     - All hosts are well formed
     - There is a server offering each service that a client requests
     - There is a publisher to each topic that a subscriber subscribes to
+    - The qos of each such publisher is compatible with the subscriber
+
+    Yields the findings as they are made, host by host, registering
+    objects and interfaces in the given dicts, see new_objects and
+    new_interfaces. Those are only complete once the generator is
+    exhausted, and the checks across hosts come last.
+    visit, if given, is called with every registered node and its executor
+    once the node is checked, so other checks can share the walk.
     """
-    feedback = []
+    yield from system_properties(system)
+    for host in system.hosts:
+        yield from iter_host(host, system, objects, interfaces, visit)
+    for key1, key2 in SUBSETS:
+        yield from subset_check(key1, key2, interfaces)
+    yield from check_qos_compatibility(interfaces)
 
-    interfaces: dict[str, dict[str, list[str]]] = {
-        "services requested": {},
-        "services offered": {},
-        "topics subscribed to": {},
-        "topics published to": {},
-    }
 
-    objects: dict[str, dict[str, str]] = {
-        "callback": {},
-        "external_input": {},
-        "external_output": {},
-        "executor": {},
-        "node": {},
-        "host": {},
-        "timer": {},
-        "service": {},
-        "client": {},
-        "variable": {},
-        "publisher": {},
-        "action": {}
-    }
+def validate_system(system: ros.System, max_errors: int = None
+                    ) -> tuple[list[Diagnostic], dict[str, dict[str, str]],
+                               dict[str, dict[str, list[str]]]]:
+    """
+    Validates system, see iter_system.
+    With max_errors, validation stops at that many errors, and objects
+    and interfaces then only hold what was registered until then.
+    Raises ValueError if max_errors is less than 1.
+    """
+    interfaces = new_interfaces()
+    objects = new_objects()
+    feedback = iter_system(system, objects, interfaces)
+    if max_errors is not None:
+        feedback = diagnostics.until_errors(feedback, max_errors)
+    return (list(feedback), objects, interfaces)
 
-    if (system.name is None) or (system.name == ""):
-        feedback += ["System must have a name"]
 
-    feedback += is_valid_value("dds", system.dds_implementation)
+def validate_executor_properties(executor: ros.Executor, parent: ros.Host,
+                                 objects, interfaces) -> list[Diagnostic]:
+    feedback = register(executor.name, "executor", parent.name, objects)
+    if feedback != []:
+        return feedback
+    return executor_properties(executor)
 
-    hosts = system.hosts
-    if len(hosts) < 1:
-        feedback += ["System must have at least one host"]
-    for host in hosts:
-        feedback += validate_host(host, system, objects, interfaces)
-    feedback += subset_check("services requested", "services offered", interfaces)
-    feedback += subset_check("topics subscribed to", "topics published to", interfaces)
 
-    if feedback == []:
-        return (["System is well formed"], objects, interfaces)
-    else:
-        return (feedback, objects, interfaces)
+def validate_host_properties(host: ros.Host, parent: ros.System,
+                             objects, interfaces) -> list[Diagnostic]:
+    feedback = register(host.name, "host", parent.name, objects)
+    if feedback != []:
+        return feedback
+    return host_properties(host)
+
+
+class TrackedObjects(dict):
+    """
+    Objects of one type, remembering the names that were looked up
+    without ever being registered, i.e. references out of the subtree.
+    """
+    typ: str
+    missing: set
+
+    def __contains__(self, name):
+        found = super().__contains__(name)
+        if not found:
+            self.missing.add((self.typ, name))
+        return found
+
+    def __setitem__(self, name, parent):
+        self.missing.discard((self.typ, name))
+        super().__setitem__(name, parent)
+
+
+class TrackedRegistry(dict):
+    """Objects per type, creating the tracked registry of a type on use."""
+
+    def __init__(self):
+        super().__init__()
+        self.missing = set()
+
+    def __missing__(self, typ):
+        objects = self[typ] = TrackedObjects()
+        objects.typ = typ
+        objects.missing = self.missing
+        return objects
+
+
+@dataclass
+class Subtree:
+    """
+    The validation result of a node, or of a host or executor by itself.
+    registrations are (object type, name, parent) and
+    interfaces are (interface type, name, container) and
+    endpoints are ("publishers" or "subscriptions", topic, name, profile).
+    missing are the (object type, name) it looked up without registering,
+    and resolved those of them the feedback was computed as registered,
+    as (object type, name, parent).
+    assembled is the feedback of the whole subtree, in traversal order.
+    """
+    element: object
+    parent: object
+    name: str
+    feedback: list[Diagnostic]
+    registrations: list[tuple[str, str, str]]
+    interfaces: list[tuple[str, str, str]]
+    isolated: bool
+    endpoints: list[tuple[str, str, str, ros.QualityOfService]] = \
+        field(default_factory=list)
+    missing: set[tuple[str, str]] = field(default_factory=set)
+    resolved: set[tuple[str, str, str]] = field(default_factory=set)
+    children: list = field(default_factory=list)
+    assembled: list[Diagnostic] = field(default_factory=list)
+
+
+def validate_subtree(validate, element, parent) -> Subtree:
+    """
+    Runs validate against registries of its own, so the result only
+    depends on the subtree as long as it is isolated, that is,
+    it registered its own name and all its references resolved inside it.
+    """
+    objects = TrackedRegistry()
+    interfaces = new_interfaces()
+    feedback = validate(element, parent, objects, interfaces)
+    registrations = [(typ, name, owner)
+                     for typ, names in objects.items()
+                     for name, owner in names.items()]
+    entries = [(typ, name, container)
+               for typ, names in interfaces.items()
+               for name, containers in names.items()
+               for container in containers]
+    endpoints = [(kind, topic, name, profile)
+                 for kind, topics in interfaces.endpoints.items()
+                 for topic, visited in topics.items()
+                 for name, profile in visited]
+    isolated = registrations != [] and not objects.missing
+    return Subtree(element=element, parent=parent, name=element.name,
+                   feedback=feedback, registrations=registrations,
+                   interfaces=entries, isolated=isolated,
+                   endpoints=endpoints, missing=set(objects.missing))
+
+
+class IncrementalValidator:
+    """
+    Validates a system like validate_system, but keeps the result of each
+    host, executor and node, so that validating again after an edit only
+    redoes the subtrees touched through the add_* methods or
+    System.mark_dirty, and updates objects, interfaces and the subset
+    checks by the difference.
+
+    Each subtree is validated against registries of its own.
+    A node referring to names it does not contain is validated again
+    whenever what those names resolve to in a full run changes, i.e. which
+    of them are registered before it in traversal order, and by whom.
+    Whenever merging could still disagree with a full run, i.e. a name is
+    registered by more than one subtree or a host, executor or node lacks
+    a name, validate() falls back to validate_system. The entries of
+    objects and interfaces are then the same as in a full run, though not
+    necessarily in the same order.
+    Call close when done with it, so the system no longer notifies it.
+    """
+
+    def __init__(self, system: ros.System):
+        self.system = system
+        self.system_name = None
+        self.hosts: list[ros.Host] = []
+        self.subtrees: dict[int, Subtree] = {}
+        self.dirty: dict[int, object] = {}
+        self.pending: dict[int, Subtree] = {}
+        self.stale = True
+        # Object type -> name -> (parent, id of the element of the subtree)
+        # of each registration
+        self.claims: dict[str, dict[str, list[tuple[str, int]]]] = \
+            new_objects()
+        self.objects = new_objects()
+        self.interfaces = new_interfaces()
+        self.unmatched = {pair: set() for pair in SUBSETS}
+        self.conflicts = 0
+        self.entangled = 0
+        self.dangling: dict[int, Subtree] = {}
+        self.collected = False  # Whether interfaces.endpoints are current
+        system.registry.watch(self.mark_dirty)
+
+    def close(self) -> None:
+        self.system.registry.unwatch(self.mark_dirty)
+
+    def mark_dirty(self, element) -> None:
+        if isinstance(element, ros.System):
+            self.stale = True
+            return
+        container = self.system.registry.container(element)
+        if container is not None:
+            self.dirty[id(container)] = container
+
+    def validate(self) -> tuple[list[Diagnostic], dict[str, dict[str, str]],
+                                dict[str, dict[str, list[str]]]]:
+        if self.stale:
+            self.refresh_system()
+        while self.dirty:
+            _, element = self.dirty.popitem()
+            subtree = self.subtrees.get(id(element))
+            if subtree is not None:
+                self.refresh(subtree)
+        fallback = self.conflicts > 0 or self.entangled > 0
+        if not fallback:
+            self.resolve()
+        if self.pending:
+            self.collected = False
+        self.assemble()
+
+        if fallback:
+            return validate_system(self.system)
+
+        feedback = system_properties(self.system)
+        for host in self.hosts:
+            feedback += self.subtrees[id(host)].assembled
+        for key1, key2 in SUBSETS:
+            if self.unmatched[(key1, key2)]:
+                feedback += [error("mismatched", "interface", key1, key2)]
+        if not self.collected:
+            self.collect_endpoints()
+        feedback += check_qos_compatibility(self.interfaces)
+
+        return (feedback, self.objects, self.interfaces)
+
+    def refresh_system(self) -> None:
+        self.stale = False
+        if self.system.name != self.system_name:
+            for host in self.hosts:
+                self.retract(self.subtrees[id(host)])
+            self.hosts = []
+            self.system_name = self.system.name
+        self.hosts = self.sync(self.hosts, self.system.hosts, self.system)
+
+    def refresh(self, subtree: Subtree) -> None:
+        element = subtree.element
+        parent = subtree.parent
+        if isinstance(element, ros.Node):
+            self.retract(subtree)
+            self.build(element, parent)
+            return
+
+        children = subtree.children
+        if element.name != subtree.name:
+            for child in children:
+                self.retract(self.subtrees[id(child)])
+            children = []
+        subtree.children = []
+        self.retract(subtree)
+        fresh = self.build(element, parent, recurse=False)
+        current = element.nodes if isinstance(element, ros.Executor) \
+            else element.executors
+        fresh.children = self.sync(children, current, element)
+
+    def sync(self, old: list, new: list, parent) -> list:
+        """
+        Forgets the children in old that are no longer in new, unless they
+        moved to another parent that was synced first, and builds those
+        that are new, including those that moved here.
+        """
+        kept = {id(child) for child in new}
+        for child in old:
+            subtree = self.subtrees.get(id(child))
+            if id(child) not in kept and subtree is not None and \
+                    subtree.parent is parent:
+                self.forget(child)
+        for child in new:
+            subtree = self.subtrees.get(id(child))
+            if subtree is not None and subtree.parent is not parent:
+                self.retract(subtree)
+                subtree = None
+            if subtree is None:
+                self.index(child, parent)
+                self.build(child, parent)
+            self.mark_pending(self.subtrees[id(child)])
+        return list(new)
+
+    def index(self, element, parent) -> None:
+        """
+        Adds a host, executor or node that came into the system without an
+        add_* method, or moved, to the registry, which reports names that
+        are not unique to the validation instead of raising.
+        """
+        registry = self.system.registry
+        kind = {ros.Host: "host", ros.Executor: "executor",
+                ros.Node: "node"}[type(element)]
+        if registry.lookup(kind, element.name) is element and \
+                registry.owner(kind, element.name) is parent:
+            return
+        registry.remove(element)
+        strict = registry.strict
+        registry.strict = False
+        try:
+            getattr(registry, "add_" + kind)(element, parent)
+        finally:
+            registry.strict = strict
+
+    def build(self, element, parent, recurse: bool = True) -> Subtree:
+        if isinstance(element, ros.Node):
+            subtree = validate_subtree(validate_node, element, parent)
+        elif isinstance(element, ros.Executor):
+            subtree = validate_subtree(validate_executor_properties,
+                                       element, parent)
+        else:
+            subtree = validate_subtree(validate_host_properties,
+                                       element, parent)
+        self.apply(subtree)
+        if recurse and not isinstance(element, ros.Node):
+            children = element.nodes if isinstance(element, ros.Executor) \
+                else element.executors
+            for child in children:
+                self.build(child, element)
+            subtree.children = list(children)
+        self.mark_pending(subtree)
+        return subtree
+
+    def forget(self, element) -> None:
+        """
+        Retracts element, which left the system, and drops it and
+        everything in it from the dirty elements and the registry, so its
+        names are free again.
+        """
+        removed = list(self.walk(element))
+        self.retract(removed[0])
+        for subtree in removed:
+            self.dirty.pop(id(subtree.element), None)
+        self.system.registry.remove(element)
+
+    def walk(self, element):
+        """The subtrees of element and everything in it, in traversal order."""
+        subtree = self.subtrees[id(element)]
+        yield subtree
+        for child in subtree.children:
+            yield from self.walk(child)
+
+    def resolve(self) -> None:
+        """
+        Validates the nodes referring to names they do not contain again
+        against what those resolve to in a full run, if that changed.
+        """
+        if not self.dangling:
+            return
+        position = {}
+        for host in self.hosts:
+            for subtree in self.walk(host):
+                position[id(subtree.element)] = len(position)
+        for key, subtree in self.dangling.items():
+            resolved = set()
+            for typ, name in subtree.missing:
+                claims = self.claims.get(typ, {}).get(name)
+                if claims and position[claims[0][1]] < position[key]:
+                    resolved.add((typ, name, claims[0][0]))
+            if resolved == subtree.resolved:
+                continue
+            objects = new_objects()
+            for typ, name, parent in resolved:
+                objects[typ][name] = parent
+            subtree.feedback = validate_node(subtree.element, subtree.parent,
+                                             objects, new_interfaces())
+            subtree.resolved = resolved
+            self.mark_pending(subtree)
+
+    def collect_endpoints(self) -> None:
+        """The endpoints of every node, in the order of a full run."""
+        endpoints = {"publishers": {}, "subscriptions": {}}
+        for host in self.hosts:
+            for subtree in self.walk(host):
+                for kind, topic, name, profile in subtree.endpoints:
+                    endpoints[kind].setdefault(topic, []).append(
+                        (name, profile))
+        self.interfaces.endpoints = endpoints
+        self.collected = True
+
+    def mark_pending(self, subtree: Subtree) -> None:
+        while subtree is not None:
+            if self.pending.get(id(subtree.element)) is subtree:
+                return
+            self.pending[id(subtree.element)] = subtree
+            subtree = self.subtrees.get(id(subtree.parent))
+
+    def assemble(self) -> None:
+        depth = {ros.Node: 0, ros.Executor: 1, ros.Host: 2}
+        pending = sorted(self.pending.values(),
+                         key=lambda subtree: depth[type(subtree.element)])
+        self.pending = {}
+        for subtree in pending:
+            if self.subtrees.get(id(subtree.element)) is not subtree:
+                continue
+            assembled = list(subtree.feedback)
+            for child in subtree.children:
+                assembled += self.subtrees[id(child)].assembled
+            subtree.assembled = assembled
+
+    def apply(self, subtree: Subtree) -> None:
+        key = id(subtree.element)
+        self.subtrees[key] = subtree
+        if subtree.registrations == []:
+            self.entangled += 1
+        elif subtree.missing:
+            self.dangling[key] = subtree
+        for typ, name, parent in subtree.registrations:
+            claims = self.claims[typ].setdefault(name, [])
+            claims.append((parent, key))
+            if len(claims) == 1:
+                self.objects[typ][name] = parent
+            elif len(claims) == 2:
+                self.conflicts += 1
+        for typ, name, container in subtree.interfaces:
+            containers = self.interfaces[typ].setdefault(name, [])
+            containers.append(container)
+            if len(containers) > 1:
+                continue
+            for key1, key2 in SUBSETS:
+                if typ == key1 and name not in self.interfaces[key2]:
+                    self.unmatched[(key1, key2)].add(name)
+                if typ == key2:
+                    self.unmatched[(key1, key2)].discard(name)
+
+    def retract(self, subtree: Subtree) -> None:
+        for child in subtree.children:
+            self.retract(self.subtrees[id(child)])
+        key = id(subtree.element)
+        del self.subtrees[key]
+        if subtree.registrations == []:
+            self.entangled -= 1
+        self.dangling.pop(key, None)
+        for typ, name, parent in subtree.registrations:
+            claims = self.claims[typ][name]
+            claims.remove((parent, key))
+            if len(claims) == 0:
+                del self.claims[typ][name]
+                del self.objects[typ][name]
+            else:
+                self.objects[typ][name] = claims[0][0]
+                if len(claims) == 1:
+                    self.conflicts -= 1
+        for typ, name, container in subtree.interfaces:
+            containers = self.interfaces[typ][name]
+            containers.remove(container)
+            if containers != []:
+                continue
+            del self.interfaces[typ][name]
+            for key1, key2 in SUBSETS:
+                if typ == key1:
+                    self.unmatched[(key1, key2)].discard(name)
+                if typ == key2 and name in self.interfaces[key1]:
+                    self.unmatched[(key1, key2)].add(name)
+
+
+def validate_detached(validate, element, parent_name: str) -> Subtree:
+    """
+    Validates a subtree in a worker process. Only the findings are sent
+    back, not the element.
+    """
+    subtree = validate_subtree(validate, element,
+                               SimpleNamespace(name=parent_name))
+    subtree.element = None
+    subtree.parent = None
+    return subtree
+
+
+def merge_subtree(subtree: Subtree, validate, element, parent,
+                  objects, interfaces) -> list[Diagnostic]:
+    """
+    Adds the registrations and interfaces of a subtree validated on its own.
+    If the subtree is not isolated, or registers a name that is already
+    taken, validate is run again against the merged registries instead,
+    since only then does it give the same result as in a serial run.
+    """
+    if not subtree.isolated or any(name in objects[typ] for typ, name, _
+                                   in subtree.registrations):
+        return validate(element, parent, objects, interfaces)
+    for typ, name, owner in subtree.registrations:
+        objects[typ][name] = owner
+    for typ, name, container in subtree.interfaces:
+        interfaces[typ].setdefault(name, [])
+        interfaces[typ][name].append(container)
+    for kind, topic, name, profile in subtree.endpoints:
+        interfaces.endpoints[kind].setdefault(topic, []).append(
+            (name, profile))
+    return subtree.feedback
+
+
+def validate_parallel(system: ros.System, workers: int = None,
+                      by: str = "host") -> tuple[list[Diagnostic], dict[str, dict[str, str]], dict[str, dict[str, list[str]]]]:
+    """
+    Validates like validate_system, but each host, or each executor when
+    by is "executor", is validated in a pool of worker processes.
+    The results are merged in traversal order, so feedback, objects and
+    interfaces are identical to those of validate_system.
+    """
+    if by not in ["host", "executor"]:
+        raise ValueError(f"Cannot validate by '{by}', "
+                         "only by 'host' or 'executor'")
+    interfaces = new_interfaces()
+    objects = new_objects()
+
+    feedback = system_properties(system)
+    with ProcessPoolExecutor(workers) as pool:
+        if by == "host":
+            hosts = system.hosts
+            subtrees = pool.map(validate_detached, repeat(validate_host),
+                                hosts, repeat(system.name))
+            for host, subtree in zip(hosts, subtrees):
+                feedback += merge_subtree(subtree, validate_host, host,
+                                          system, objects, interfaces)
+        else:
+            executors = [executor for host in system.hosts
+                         for executor in host.executors]
+            subtrees = pool.map(validate_detached,
+                                repeat(validate_executor), executors,
+                                [host.name for host in system.hosts
+                                 for executor in host.executors])
+            for host in system.hosts:
+                skipped = register(host.name, "host", system.name, objects)
+                feedback += skipped
+                if skipped == []:
+                    feedback += host_properties(host)
+                for executor in host.executors:
+                    subtree = next(subtrees)
+                    if skipped == []:
+                        feedback += merge_subtree(
+                            subtree, validate_executor, executor, host,
+                            objects, interfaces)
+    for key1, key2 in SUBSETS:
+        feedback += subset_check(key1, key2, interfaces)
+    feedback += check_qos_compatibility(interfaces)
+
+    return (feedback, objects, interfaces)
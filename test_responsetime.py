@@ -0,0 +1,51 @@
+import pytest
+import responsetime as rt
+import slicing
+from fixtures import add_chain, add_timer_node, make_system
+
+
+# A chain alone on its executor completes within its period, so the
+# reaction time is the sum of its wcets, also above 50% utilization
+@pytest.mark.parametrize("wcet", [10, 16, 17, 20, 30, 33])
+def test_chain_alone(wcet):
+    system, [executor] = make_system()
+    add_chain([executor] * 3, wcet)
+    assert rt.reaction_time_bound(system, "sensor", "actuator") == 3 * wcet
+
+
+def test_chain_overloaded():
+    system, [executor] = make_system()
+    add_chain([executor] * 3, 40)
+    assert rt.reaction_time_bound(system, "sensor", "actuator") is None
+
+
+# An independent timer of wcet 50 may just have started when the sensor
+# is released, or be served first in the same round: 50 + 3 * 10
+@pytest.mark.parametrize("period", [100, 200])
+def test_chain_with_interference(period):
+    system, [executor] = make_system()
+    add_timer_node(executor, "other", 50, period)
+    add_chain([executor] * 3, 10)
+    assert rt.reaction_time_bound(system, "sensor", "actuator") == 80
+
+
+# The sensor completes on its own executor after 10, then the filter and
+# actuator may wait for a timer of wcet 30 on theirs: 10 + 30 + 2 * 10
+def test_chain_across_executors():
+    system, [first, second] = make_system(2)
+    add_timer_node(second, "other", 30, 100)
+    add_chain([first, second, second], 10)
+    assert rt.reaction_time_bound(system, "sensor", "actuator") == 60
+
+
+# A timer released halfway through the period of the chain only runs once
+# the chain is through, so slicing drops it and the bound is the chain's
+def test_chain_without_nodes_of_other_busy_windows():
+    system, [executor] = make_system()
+    add_chain([executor] * 3, 10)
+    add_timer_node(executor, "apart", 40, 100, offset=50)
+    sliced = slicing.slice_system(system, "sensor", "actuator")
+    assert [node.name for node in sliced.hosts[0].executors[0].nodes] == [
+        "sensor", "filter", "actuator"]
+    assert rt.reaction_time_bound(sliced, "sensor", "actuator") == 30
+    assert rt.reaction_time_bound(system, "sensor", "actuator") > 30
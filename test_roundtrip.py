@@ -0,0 +1,30 @@
+import ros2system as ros
+import snapshot
+import yamlParser
+import yamlPrinter
+from fixtures import make_system
+
+
+def served_system() -> ros.System:
+    system, [executor] = make_system(name="served")
+    node = executor.add_node("server")
+    node.add_service(wcet=2)
+    node.add_service(wcet=0, name="shared",
+                     callback=node.add_callback(wcet=3))
+    node.add_external_input(name="button",
+                            callback=node.add_callback(wcet=1))
+    return system
+
+
+def test_services_and_inputs_survive_yaml(tmp_path):
+    system = served_system()
+    path = str(tmp_path / "served.yaml")
+    yamlPrinter.save(system, path)
+    assert yamlParser.load(path, cache=False) == system
+
+
+def test_services_and_inputs_survive_snapshots(tmp_path):
+    system = served_system()
+    path = str(tmp_path / "served.snapshot")
+    snapshot.save(system, path)
+    assert snapshot.load(path) == system
@@ -0,0 +1,120 @@
+import contextlib
+import io
+import runpy
+from math import lcm
+import pytest
+import ros2system as ros
+import responsetime as rt
+import slicing
+import synthetic
+from fixtures import (add_chain, add_subscriber_node, add_timer_node,
+                      make_system)
+
+
+def simulated_reaction_time(system: ros.System, generator: str,
+                            actuator: str) -> int:
+    """
+    The longest reaction time of a single executor run in rounds with
+    every callback taking its wcet, over two hyperperiods after the
+    largest offset.
+    """
+    [handles] = rt.make_handles(system).values()
+    rt.connect(system, handles)
+    timers = [handle for handle in handles if handle.kind == "timer"]
+    end = (max(timer.trigger.offset for timer in timers) +
+           3 * lcm(*[timer.period for timer in timers]))
+    releases = sorted((time, index) for index, timer in enumerate(timers)
+                      for time in range(timer.trigger.offset, end,
+                                        timer.period))
+    pending = {id(handle): [] for handle in handles}  # Tags of messages
+    longest = 0
+    time = 0
+    while releases or any(pending.values()):
+        while releases and releases[0][0] <= time:
+            released, index = releases.pop(0)
+            timer = timers[index]
+            tag = released if timer.node.name == generator else None
+            pending[id(timer)] = [tag]
+        ready = [handle for handle in handles if pending[id(handle)]]
+        if not ready:
+            time = releases[0][0]
+            continue
+        for handle in ready:
+            tag = pending[id(handle)].pop(0)
+            time += handle.wcet
+            if tag is not None and handle.node.name == actuator:
+                longest = max(longest, time - tag)
+            for successor in handle.topic_successors:
+                pending[id(successor)].append(tag)
+    return longest
+
+
+def phased_system() -> ros.System:
+    system, [executor] = make_system()
+    add_chain([executor] * 3, 10)
+    add_timer_node(executor, "together", 10, 100)
+    add_timer_node(executor, "close", 10, 100, 30)
+    add_timer_node(executor, "apart", 10, 100, 50)
+    add_subscriber_node(executor, "apartsink", "apart", 5)
+    add_timer_node(executor, "slow", 10, 200, 150)
+    return system
+
+
+def test_phased_nodes_are_dropped():
+    system = phased_system()
+    sliced = slicing.slice_system(system, "sensor", "actuator")
+    names = [node.name for node in sliced.hosts[0].executors[0].nodes]
+    assert names == ["sensor", "filter", "actuator", "together", "close"]
+    assert (simulated_reaction_time(sliced, "sensor", "actuator") ==
+            simulated_reaction_time(system, "sensor", "actuator") == 50)
+
+
+def test_nodes_feeding_kept_nodes_stay():
+    system = phased_system()
+    together = system.registry.lookup("node", "together")
+    together.add_subscription(topic="apart",
+                              callback=together.add_callback(wcet=5))
+    kept = slicing.relevant_nodes(system, "sensor", "actuator")
+    assert {"together", "apart"} <= kept
+    assert "apartsink" not in kept
+
+
+def test_nodes_in_busy_windows_of_the_chain_stay():
+    system, [executor] = make_system()
+    add_chain([executor] * 3, 10)
+    add_timer_node(executor, "after", 10, 100, 20)
+    add_subscriber_node(executor, "aftersink", "after", 40)
+    assert slicing.relevant_nodes(system, "sensor", "actuator") == {
+        "sensor", "filter", "actuator", "after", "aftersink"}
+
+
+def test_other_executors_are_dropped():
+    system = synthetic.generate(200, hosts=4)
+    sliced = slicing.slice_system(system, "p0_sensor0", "p0_actuator")
+    assert [len(executor.nodes) for host in sliced.hosts
+            for executor in host.executors] == [56]
+    assert (rt.reaction_time_bound(sliced, "p0_sensor0", "p0_actuator") ==
+            rt.reaction_time_bound(system, "p0_sensor0", "p0_actuator"))
+
+
+def test_unknown_nodes():
+    system = phased_system()
+    with pytest.raises(ValueError):
+        slicing.slice_system(system, "nope", "actuator")
+    with pytest.raises(ValueError):
+        slicing.slice_system(system, "apart", "actuator")
+
+
+def test_demo_reaction_time_is_unchanged():
+    pytest.importorskip("backeman.system")
+    import transformer_backeman as tb
+    with contextlib.redirect_stdout(io.StringIO()):
+        system = runpy.run_path("demo.py")["system"]
+    results = []
+    for version in [system, slicing.slice_system(system, "sensor1",
+                                                 "actuator1")]:
+        errors, _, bksystem = tb.transform_system(version)
+        assert errors == []
+        tb.monitor(bksystem, "sensor1", "actuator1")
+        results.append(bksystem.max_reaction_time()[0])
+    assert results[0] == results[1]
@@ -0,0 +1,36 @@
+import pickle
+import systemdiff
+from fixtures import add_timer_node, make_system
+
+
+def nodes_system(names: list[str]):
+    system, [executor] = make_system()
+    for name in names:
+        add_timer_node(executor, name, 10, 100)
+    return system
+
+
+def reordered(system, names: list[str]):
+    changed = pickle.loads(pickle.dumps(system))
+    executor = changed.hosts[0].executors[0]
+    by_name = {node.name: node for node in executor.nodes}
+    executor.nodes = [by_name[name] for name in names]
+    changed.reindex()
+    return changed
+
+
+def test_reordered_nodes_are_changed():
+    system = nodes_system(["a", "b", "c", "d"])
+    changed = reordered(system, ["c", "b", "a", "d"])
+    changes = systemdiff.diff(system, changed)
+    host = system.hosts[0].name
+    executor = system.hosts[0].executors[0].name
+    # b keeps its index, but is now served after c instead of a
+    assert systemdiff.changed_nodes(changes) == {
+        (host, executor, name) for name in ["a", "b", "c"]}
+
+
+def test_same_order_changes_no_nodes():
+    system = nodes_system(["a", "b"])
+    assert systemdiff.changed_nodes(
+        systemdiff.diff(system, reordered(system, ["a", "b"]))) == set()
@@ -0,0 +1,126 @@
+import pytest
+import ros2system as ros
+import systemvalidator
+from fixtures import make_system
+
+
+def add_talker(executor: ros.Executor, name: str, topic: str,
+               reliability: str) -> None:
+    node = executor.add_node(name)
+    publisher = node.add_publisher(topic=topic, qos_offered=ros.DEFAULT_QOS
+                                   .replace(reliability=reliability))
+    node.add_timer(period=100, callback=node.add_callback(
+        wcet=1, publishers=[publisher]))
+
+
+def add_listener(node: ros.Node, topic: str, reliability: str) -> None:
+    node.add_subscription(topic=topic, callback=node.add_callback(wcet=1),
+                          qos_requested=ros.DEFAULT_QOS.replace(
+                              reliability=reliability))
+
+
+def incompatible(feedback: list) -> list[tuple]:
+    return [(diagnostic.name,) + diagnostic.args for diagnostic in feedback
+            if diagnostic.code == "incompatible-qos"]
+
+
+def test_qos_follows_topic_changed_in_place():
+    system, [executor] = make_system(name="qos")
+    add_talker(executor, "talker", "fast", "best_effort")
+    add_talker(executor, "other", "slow", "reliable")
+    listener = executor.add_node("listener")
+    add_listener(listener, "slow", "reliable")
+    incremental = systemvalidator.IncrementalValidator(system)
+    assert incompatible(incremental.validate()[0]) == []
+
+    listener.subscriptions[0].topic = "fast"
+    system.mark_dirty(listener.subscriptions[0])
+    expected = [("talkerpublisher0", "listenercallback0", "fast",
+                 "reliability")]
+    assert incompatible(systemvalidator.validate_system(system)[0]) == \
+        expected
+    assert incompatible(incremental.validate()[0]) == expected
+
+
+def test_qos_of_nodes_added_without_builders():
+    system, [executor] = make_system(name="qos")
+    add_talker(executor, "talker", "fast", "best_effort")
+    _, [elsewhere] = make_system()
+    listener = elsewhere.add_node("listener")
+    add_listener(listener, "fast", "reliable")
+    executor.nodes.append(listener)
+    feedback, _, _ = systemvalidator.validate_system(system)
+    assert incompatible(feedback) == [
+        ("talkerpublisher0", "listenercallback0", "fast", "reliability")]
+
+
+def broken_system() -> ros.System:
+    system, [executor] = make_system(name="qos")
+    for name in ["first", "second", "third"]:
+        executor.add_node(name).add_callback(wcet=-1)
+    return system
+
+
+def test_max_errors_stops_validation():
+    system = broken_system()
+    feedback, _, _ = systemvalidator.validate_system(system)
+    assert len([diagnostic for diagnostic in feedback
+                if diagnostic.severity == "error"]) > 2
+    feedback, _, _ = systemvalidator.validate_system(system, max_errors=2)
+    assert [diagnostic.severity for diagnostic in feedback].count(
+        "error") == 2
+
+
+@pytest.mark.parametrize("max_errors", [0, -1])
+def test_max_errors_below_one(max_errors):
+    with pytest.raises(ValueError):
+        systemvalidator.validate_system(broken_system(), max_errors)
+
+
+def same_result(first, second) -> bool:
+    sort = lambda registries: {
+        typ: {name: sorted(value) if isinstance(value, list) else value
+              for name, value in names.items()}
+        for typ, names in registries.items()}
+    return (first[0] == second[0] and sort(first[1]) == sort(second[1]) and
+            sort(first[2]) == sort(second[2]))
+
+
+def test_removed_nodes_leave_the_registry():
+    system, [executor] = make_system(name="qos")
+    add_talker(executor, "talker", "fast", "best_effort")
+    add_talker(executor, "spare", "fast", "best_effort")
+    incremental = systemvalidator.IncrementalValidator(system)
+    incremental.validate()
+    spare = executor.nodes.pop()
+    system.mark_dirty(executor)
+    incremental.validate()
+    registry = system.registry
+    assert registry.lookup("node", "spare") is None
+    assert registry.lookup("publisher", "sparepublisher0") is None
+    assert registry.publishers_of("fast") == executor.nodes[0].publishers
+
+    add_talker(executor, "spare", "fast", "reliable")
+    assert registry.lookup("node", "spare") is not spare
+    assert same_result(incremental.validate(),
+                       systemvalidator.validate_system(system))
+
+
+# Either executor may be validated again first
+@pytest.mark.parametrize("first", [0, 1])
+def test_moved_nodes_stay_in_the_registry(first):
+    system, [executor] = make_system(name="qos")
+    other = system.hosts[0].add_executor(ros_distribution="Humble")
+    add_talker(executor, "talker", "fast", "best_effort")
+    add_talker(other, "mover", "fast", "best_effort")
+    add_talker(other, "stayer", "slow", "best_effort")
+    incremental = systemvalidator.IncrementalValidator(system)
+    incremental.validate()
+    mover = other.nodes.pop(0)
+    executor.nodes.append(mover)
+    for touched in [[executor, other], [other, executor]][first]:
+        system.mark_dirty(touched)
+    assert same_result(incremental.validate(),
+                       systemvalidator.validate_system(system))
+    assert system.registry.lookup("node", "mover") is mover
+    assert system.registry.owner("node", "mover") is executor
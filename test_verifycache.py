@@ -0,0 +1,38 @@
+import pickle
+import pytest
+
+verifycache = pytest.importorskip("verifycache")
+
+
+class Model:
+    def gen_declaration(self) -> str:
+        return "clock x;"
+
+    def gen_system(self) -> str:
+        return "system s;"
+
+
+# A truncated pickle, a class from a module that does not exist, a value
+# that only fails on load, and no pickle at all
+CORRUPT = [
+    pickle.dumps((42, [], []))[:-3],
+    b"\x80\x04\x95\x10\x00\x00\x00\x00\x00\x00\x00\x8c\x07nothere"
+    b"\x94\x8c\x01X\x94\x93\x94.",
+    b"cbuiltins\nint\n(S'x'\ntR.",
+    b"garbage",
+]
+
+
+@pytest.mark.parametrize("data", CORRUPT)
+def test_corrupt_entries_are_misses(tmp_path, monkeypatch, data):
+    monkeypatch.setenv("ROS2MODELING_CACHE", str(tmp_path))
+    model = Model()
+    path = tmp_path / "verification" / (
+        verifycache.model_key(model, "query") + verifycache.SUFFIX)
+    path.parent.mkdir()
+    path.write_bytes(data)
+    calls = []
+    verify = lambda: calls.append(1) or (42, [], [])
+    assert verifycache.verified(model, "query", verify) == (42, [], [])
+    assert verifycache.verified(model, "query", verify) == (42, [], [])
+    assert calls == [1]
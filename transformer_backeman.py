@@ -1,4 +1,7 @@
+import math
 import backeman.system as bk
+from diagnostics import Diagnostic, error, note, warning
+import profiling
 import ros2system as ros
 import systemvalidator as validator
 """
@@ -88,65 +91,118 @@ LIMITED_ELEMENTS = {
 # ======================= VALIDATION ======================
 
 
-def check_buffers(executor: ros.Executor) -> list[str]:
+def node_buffers(node: ros.Node) -> list[Diagnostic]:
     feedback = []
-    for node in executor.nodes:
-        for publisher in node.publishers:
-            buffer = publisher.qos_offered["depth"]
-            if buffer != 20:
-                feedback += [
-                    f"'{publisher.name}' has buffersize {str(buffer)}"]
-        for subscriber in node.subscriptions:
-            buffer = subscriber.qos_requested["depth"]
-            if buffer != 20:
-                feedback += [f"A subscription of '{node.name}' "
-                             f"has buffersize {str(buffer)}"]
+    for publisher in node.publishers:
+        buffer = publisher.qos_offered["depth"]
+        if buffer != 20:
+            feedback += [warning("publisher-buffer-size", "publisher",
+                                 publisher.name, buffer)]
+    for subscriber in node.subscriptions:
+        buffer = subscriber.qos_requested["depth"]
+        if buffer != 20:
+            feedback += [warning("subscription-buffer-size", "node",
+                                 node.name, buffer)]
+    return feedback
+
+
+def buffer_note(executor: ros.Executor,
+                feedback: list[Diagnostic]) -> list[Diagnostic]:
     if feedback != []:
-        feedback += ["Note that the Backeman model assumes buffers are large "
-                     "enough to avoid overflow. In the concrete Uppaal model, "
-                     "a buffersize of 20 is used."]
+        return feedback + [note("buffer-assumption", "executor",
+                                executor.name)]
     return feedback
 
 
+def check_buffers(executor: ros.Executor) -> list[Diagnostic]:
+    feedback = []
+    for node in executor.nodes:
+        feedback += node_buffers(node)
+    return buffer_note(executor, feedback)
+
+
 def check_for_cycles(system: ros.System,
                      objects: dict[str, dict[str, str]],
-                     interfaces: dict[str, dict[str, list[str]]]) -> bool:
+                     interfaces: dict[str, dict[str, list[str]]]
+                     ) -> list[list[str]]:
+    """
+    Returns the cycles among nodes, each as the list of nodes along it,
+    such that [a, b] means that a feeds b and b feeds a.
+    A node depends on another if it subscribes to a topic the other
+    publishes to.
+    The dependency graph is built once, after which the strongly connected
+    components are found with an iterative version of
+    https://en.wikipedia.org/wiki/Tarjan%27s_strongly_connected_components_algorithm
+    so the check is linear in nodes and edges and does not recurse.
+    """
+    subscribers = interfaces["topics subscribed to"]
+    dependents: dict[str, list[str]] = {node: [] for node in objects["node"]}
+    for topic, publishers in interfaces["topics published to"].items():
+        for publisher in publishers:
+            owner = objects["publisher"].get(publisher)
+            if owner in dependents:
+                dependents[owner] += [dep for dep in subscribers.get(topic, [])
+                                      if dep in dependents]
+
+    index: dict[str, int] = {}
+    lowlink: dict[str, int] = {}
+    stack: list[str] = []
+    on_stack: set[str] = set()
+    cycles = []
+
+    for root in dependents:
+        if root in index:
+            continue
+        work = [(root, 0)]
+        while work:
+            node, edge = work.pop()
+            if edge == 0:
+                index[node] = lowlink[node] = len(index)
+                stack.append(node)
+                on_stack.add(node)
+            deps = dependents[node]
+            while edge < len(deps):
+                dep = deps[edge]
+                edge += 1
+                if dep not in index:
+                    work.append((node, edge))
+                    work.append((dep, 0))
+                    break
+                if dep in on_stack:
+                    lowlink[node] = min(lowlink[node], index[dep])
+            else:
+                if lowlink[node] == index[node]:
+                    component = set()
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.add(member)
+                        if member == node:
+                            break
+                    if len(component) > 1 or node in deps:
+                        cycles.append(trace_cycle(node, component,
+                                                  dependents))
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node])
+
+    return cycles
+
+
+def trace_cycle(start: str, component: set[str],
+                dependents: dict[str, list[str]]) -> list[str]:
     """
-    validate_system() establishes that there is exactly one publisher per topic
-    validate_node() establishes that there is exactly one publisher per node
-    using https://en.wikipedia.org/wiki/Topological_sorting
+    Follows dependencies inside a strongly connected component from start
+    until a node repeats, which yields one concrete cycle of the component.
     """
-    nodes = list(objects["node"].keys())
-    subscribers = interfaces["topics subscribed to"].copy()
-    publishers = interfaces["topics published to"].copy()
-    visited = []
-    # settled = []
-
-    def visit(node: str):
-        # print(f"Visiting node {node}")
-        if node not in nodes:
-            # print(f"Node {node} already settled")
-            return False
-        if node in visited:
-            return True
-        visited.append(node)
-        # print(f"Node {node} worth visiting")
-        dependents = []
-        for topic in publishers:
-            if node == objects["publisher"][publishers[topic][0]]:
-                dependents = subscribers.get(topic, [])
-        # print(f"{dependents} depend on {node}")
-        for dep in dependents:
-            if visit(dep):
-                return True
-        # print(f"settled {node}")
-        nodes.remove(node)
-
-    while len(nodes) > 0:
-        if visit(nodes[0]):
-            return True
-
-    return False
+    path = []
+    seen = {}
+    node = start
+    while node not in seen:
+        seen[node] = len(path)
+        path.append(node)
+        node = next(dep for dep in dependents[node] if dep in component)
+    return path[seen[node]:]
 
 
 def is_valid_data_generator(node: ros.Node) -> bool:
@@ -190,7 +246,7 @@ def is_valid_timer(node: ros.Node) -> bool:
         len(node.timers) == 1 and
         len(node.subscriptions) > 0 and
         len(node.variables) == 1 and
-        len(node.callbacks > 1)
+        len(node.callbacks) > 1
     ):
         return True
     else:
@@ -220,7 +276,7 @@ def is_valid_subscriber(node: ros.Node) -> bool:
         return False
 
 
-def validate_node(node: ros.Node) -> tuple[list[str], list[str]]:
+def validate_node(node: ros.Node) -> tuple[list[Diagnostic], list[Diagnostic], dict]:
     """
     A bk node is a ros node with one primary trigger, publisher and callback,
     along with a list of secondary triggers, and callbacks.
@@ -233,9 +289,9 @@ def validate_node(node: ros.Node) -> tuple[list[str], list[str]]:
     warnings = []
 
     if len(node.publishers) > 1:
-        errors += [f"Node '{node.name}' publishes to more than one topic"]
+        errors += [error("multiple-publishers", "node", node.name)]
     if len(node.publishers) < 1:
-        errors += [f"Node '{node.name}' does not have a publisher"]
+        errors += [error("no-publisher", "node", node.name)]
 
     nodespec = {
         "sub_tasks": [],
@@ -257,32 +313,29 @@ def validate_node(node: ros.Node) -> tuple[list[str], list[str]]:
             main_tasks += 1
             nodespec["main_task"] = callback
             if len(callback.write_variables) != 0:
-                errors += [f"Main task '{callback.name}' writes to "
-                           "internal variables"]
+                errors += [error("main-task-writes", "callback",
+                                 callback.name)]
         else:
             nodespec["sub_tasks"].append(callback)
             if len(callback.read_variables) != 0:
-                errors += [f"Subtask '{callback.name}' reads variables"]
+                errors += [error("subtask-reads", "callback", callback.name)]
 
         if reads > 1:
-            errors += [f"Callback '{callback.name}' reads from more than "
-                       "one variable"]
+            errors += [error("multiple-reads", "callback", callback.name)]
         if writes > 1:
-            errors += [f"Callback '{callback.name}' writes to more than "
-                       "one variable"]
+            errors += [error("multiple-writes", "callback", callback.name)]
         if calls > 0:
-            errors += [f"Callback '{callback.name}' calls more than "
-                       "one callback"]
+            errors += [error("calls", "callback", callback.name)]
     if main_tasks > 1:
-        errors += [f"Node '{node.name}' has more than one main task"]
+        errors += [error("multiple-main-tasks", "node", node.name)]
     elif main_tasks == 0:
-        errors += [f"Node '{node.name}' does not have a main task"]
+        errors += [error("no-main-task", "node", node.name)]
 
     elif len(nodespec["sub_tasks"]) > 0:
         main_task = nodespec["main_task"]
         if len(main_task.read_variables) != 1:
-            errors += [f"Main task '{main_task.name}' has subtasks, "
-                       "but does not read from any of them"]
+            errors += [error("main-task-reads-nothing", "callback",
+                             main_task.name)]
         else:
             nodespec["read variable"] = main_task.read_variables[0]
 
@@ -294,59 +347,88 @@ def validate_node(node: ros.Node) -> tuple[list[str], list[str]]:
     elif is_valid_subscriber(node):
         nodespec["type"] = "subscriber"
     else:
-        errors += [f"Node '{node.name}' is neither a data generator, "
-                   "timer or subscriber"]
-        errors += ["Full contents of node:",
-                   f"    Timers:        {len(node.timers)}",
-                   f"    Subscriptions: {len(node.subscriptions)}",
-                   f"    Callbacks:     {len(node.callbacks)}",
-                   f"    Variables:     {len(node.variables)}"]
+        errors += [error("unsupported-node", "node", node.name,
+                         len(node.timers), len(node.subscriptions),
+                         len(node.callbacks), len(node.variables))]
     return errors, warnings, nodespec
 
 
-def validate_system(system: ros.System,
-                    objects, interfaces) -> tuple[list[str], list[str]]:
-    errors = ["Errors:"]
-    warnings = ["Warnings:"]
+def check_limits(executor: ros.Executor, objects,
+                 interfaces) -> list[Diagnostic]:
+    """The checks of validate_system on the registries and the executor."""
+    errors = []
     for elem in LIMITED_ELEMENTS:
         num = len(objects[elem])
         exp = LIMITED_ELEMENTS[elem]
         if num != exp:
-            errors += [f"System has {num} {elem}s, but target metamodel "
-                       f"supports at most {exp}"]
+            errors += [error("too-many", elem, None, num, exp)]
 
     for interface in INVALID_INTERFACES:
         if interfaces[interface] != {}:
-            errors += [f"System has {interface}, which are not supported by "
-                       "target metamodel"]
+            errors += [error("unsupported-interface", "interface",
+                             interface)]
     for topic in interfaces["topics published to"]:
         publishers = interfaces["topics published to"][topic]
         if len(publishers) != 1:
-            errors += [f"Topic '{topic}' has more than one publishing node: "
-                       f"{publishers}"]
+            errors += [error("multiple-publishing-nodes", "topic", topic,
+                             publishers)]
 
-    executor = system.hosts[0].executors[0]
     impl = executor.implementation
     if impl in INVALID_EXECUTORS:
-        errors += [f"Host uses an unsupported executor {impl}"]
+        errors += [error("unsupported-executor", "executor", executor.name,
+                         impl)]
     ros = executor.ros_distribution
     if ros in INVALID_ROS_DISTRIBUTIONS:
-        errors += [f"Host uses an unsupported ros distribution {ros}"]
+        errors += [error("unsupported-distribution", "executor",
+                         executor.name, ros)]
+    return errors
 
-    nodemap = {}
 
-    for node in executor.nodes:
-        errs, warns, nodespec = validate_node(node)
-        errors += errs
-        warnings += warns
-        nodemap[node.name] = nodespec
-
-    if check_for_cycles(executor, objects, interfaces):
-        errors += ["Cycles are not supported. There is a cycle among nodes"]
-    warnings += check_buffers(executor)
+class NodeChecks:
+    """
+    The checks of validate_system per node, collected as the nodes of the
+    executor to transform are visited, e.g. by systemvalidator.iter_system.
+    """
 
-    return errors, warnings, nodemap
+    def __init__(self, executor: ros.Executor):
+        self.executor = executor
+        self.errors: list[Diagnostic] = []
+        self.warnings: list[Diagnostic] = []
+        self.buffers: list[Diagnostic] = []
+        self.nodemap = {}
 
+    def __call__(self, node: ros.Node, executor: ros.Executor) -> None:
+        if executor is not self.executor:
+            return
+        errs, warns, nodespec = validate_node(node)
+        self.errors += errs
+        self.warnings += warns
+        self.buffers += node_buffers(node)
+        self.nodemap[node.name] = nodespec
+
+    def finish(self, system: ros.System, objects, interfaces,
+               profiler=profiling.DISABLED
+               ) -> tuple[list[Diagnostic], list[Diagnostic], dict]:
+        """The result of validate_system once every node is visited."""
+        errors = check_limits(self.executor, objects, interfaces)
+        errors += self.errors
+        with profiler.phase("check_for_cycles"):
+            cycles = check_for_cycles(system, objects, interfaces)
+        for cycle in cycles:
+            errors += [error("cycle", "node", cycle[0],
+                             " -> ".join(cycle + cycle[:1]))]
+        warnings = self.warnings + buffer_note(self.executor, self.buffers)
+        return errors, warnings, self.nodemap
+
+
+def validate_system(system: ros.System, objects, interfaces,
+                    profiler=profiling.DISABLED
+                    ) -> tuple[list[Diagnostic], list[Diagnostic], dict]:
+    executor = system.hosts[0].executors[0]
+    checks = NodeChecks(executor)
+    for node in executor.nodes:
+        checks(node, executor)
+    return checks.finish(system, objects, interfaces, profiler)
 
 
 # ============================== MAPPING ===============================
@@ -359,46 +441,89 @@ def map_node(node: ros.Node) -> bk.Node:
     pass
 
 
-def resolve_subscription_topic(subscriptions: [ros.Subscription],
+def resolve_subscription_topic(registry: ros.Registry,
                                callback: ros.Callback) -> str:
-    # print("Resolving subscription topic")
-    # print(subscriptions)
-    # print(callback)
-    for subscription in subscriptions:
-        subscription: ros.Subscription
-        if subscription.callback == callback.name:
-            # print("Success!")
-            # print(subscription.topic)
-            return subscription.topic
-    # print("Failure")
+    for trigger in registry.triggers_of(callback.name):
+        if isinstance(trigger, ros.Subscription):
+            return trigger.topic
 
 
 def map_subtasks(sub_tasks: list[ros.Callback],
                  read_variable: str,
-                 subscriptions: list[ros.Subscription]) -> tuple[list[str], list[int], str]:
+                 registry: ros.Registry,
+                 quantum: int = 1) -> tuple[list[str], list[int], str]:
     subscribers = []
     wcets = []
     data_source = None
 
     for sub in sub_tasks:
-        subtopic = resolve_subscription_topic(subscriptions, sub)
+        subtopic = resolve_subscription_topic(registry, sub)
         subscribers.append(subtopic.upper())
-        wcets.append(sub.wcet)
+        wcets.append(scale_wcet(sub.wcet, quantum))
         if sub.write_variables[0] == read_variable:
             data_source = subtopic
 
-    # print(subscribers)
-    # print(wcets)
-    # print(sub_tasks)
-    # print(read_variable)
-    # print(subscriptions)
     assert data_source is not None
 
     return subscribers, wcets, data_source
 
 
+def time_constants(system: ros.System) -> list[int]:
+    """The wcets, periods and offsets of the executor that is mapped."""
+    constants = []
+    for node in system.hosts[0].executors[0].nodes:
+        constants += [callback.wcet for callback in node.callbacks]
+        for timer in node.timers:
+            constants += [timer.period, timer.offset]
+    return constants
+
+
+def time_quantum(system: ros.System) -> int:
+    """
+    The greatest common divisor of the time constants of system,
+    the largest quantum map_system can scale them by exactly.
+    """
+    return math.gcd(*time_constants(system)) or 1
+
+
+# Time constants in quanta. Wcets are rounded up, so the wcets of the
+# model cover those of the system. Periods and offsets decide when and how
+# often data is sampled and sent, which no rounding keeps conservative,
+# so they must be multiples of the quantum, as they are of time_quantum.
+
+
+def scale_wcet(wcet: int, quantum: int) -> int:
+    return -(-wcet // quantum)
+
+
+def scale_exactly(value: int, quantum: int, what: str) -> int:
+    if value % quantum != 0:
+        raise ValueError(f"{what} {value} is not a multiple of the "
+                         f"time quantum {quantum}")
+    return value // quantum
+
+
+def scale_period(period: int, quantum: int) -> int:
+    return scale_exactly(period, quantum, "Period")
+
+
+def scale_offset(offset: int, quantum: int) -> int:
+    return scale_exactly(offset, quantum, "Offset")
+
+
 def map_system(system: ros.System,
-               nodemap: dict[str, list[ros.Node]]) -> bk.System:
+               nodemap: dict[str, list[ros.Node]],
+               quantum: int = 1) -> bk.System:
+    """
+    Maps system to a bk system, with its time constants in units of
+    quantum, see time_quantum and scale_wcet.
+    The quantum is kept as time_quantum of the bk system.
+    Results of the bk system itself, e.g. of max_reaction_time(), are in
+    quanta, while verifycache.max_reaction_time scales them back.
+    """
+    if not (isinstance(quantum, int) and quantum > 0):
+        raise ValueError(f"Time quantum must be a positive integer, "
+                         f"not {quantum!r}")
     name = system.name
     deterministic = True  # TODO: Support this
     monitored_actuator = None  # TODO
@@ -406,6 +531,7 @@ def map_system(system: ros.System,
 
     out = bk.System(name.upper())
     out.deterministic_hosts(deterministic)
+    out.time_quantum = quantum
 
     max_priority = len(system.hosts[0].executors[0].nodes)
 
@@ -419,22 +545,22 @@ def map_system(system: ros.System,
         node_type = spec["type"]
 
         name = node.name
-        wcet = main_task.wcet
+        wcet = scale_wcet(main_task.wcet, quantum)
 
         if node_type == "data generator":
-            period = node.timers[0].period
-            delay = node.timers[0].offset
+            period = scale_period(node.timers[0].period, quantum)
+            delay = scale_offset(node.timers[0].offset, quantum)
             out.add_datagenerator(name=name.upper(), period=period,
                                   wcet=wcet, delay=delay,
                                   prio=max_priority
                                   )
             max_priority -= 1
         elif node_type == "timer":
-            period = node.timers[0].period
-            delay = node.timers[0].offset
+            period = scale_period(node.timers[0].period, quantum)
+            delay = scale_offset(node.timers[0].offset, quantum)
             read_variable = spec["read variable"]
             subscribers, wcets, data_source = map_subtasks(
-                sub_tasks, read_variable, node.subscriptions)
+                sub_tasks, read_variable, system.registry, quantum)
             data_source = name.upper() + "x" + data_source.upper() + "_data"
 
             out.add_timer(name=name.upper(), period=period,
@@ -446,12 +572,12 @@ def map_system(system: ros.System,
                           )
             max_priority -= 1
         elif node_type == "subscriber":
-            topic = resolve_subscription_topic(node.subscriptions, main_task)
+            topic = resolve_subscription_topic(system.registry, main_task)
 
             read_variable = spec.get("read variable")
             if read_variable is not None:
                 subscribers, wcets, data_source = map_subtasks(
-                    sub_tasks, read_variable, node.subscriptions)
+                    sub_tasks, read_variable, system.registry, quantum)
                 data_source = name.upper() + "x" + data_source.upper() + "_data"
             else:
                 subscribers = []
@@ -471,23 +597,95 @@ def map_system(system: ros.System,
 # ===================== TRANSFORMATION ===========================
 
 
-def transform_system(
-        system: ros.System) -> tuple[list[str], list[str], bk.System]:
+def count_validation(profiler, feedback: list[Diagnostic], objects: dict,
+                     interfaces: dict) -> None:
+    profiler.count("diagnostics", len(feedback))
+    for kind, names in objects.items():
+        profiler.count(f"{kind}s", len(names))
+    for interface, entries in interfaces.items():
+        profiler.count(interface, len(entries))
+
+
+def first_executor(system: ros.System) -> ros.Executor:
+    """The executor that is transformed, if the system has any."""
+    for host in system.hosts[:1]:
+        for executor in host.executors[:1]:
+            return executor
+    return None
 
-    feedback, objects, interfaces = validator.validate_system(system)
-    if feedback != ["System is well formed"]:
-        return ([["System is not well formed, cannot start transformation. "
-                  "Validation feedback:"] + feedback],
-                None)
 
-    errors, warnings, nodemap = validate_system(system, objects, interfaces)
+class Pipeline:
+    """
+    Validates a system and maps it to a bk system in one walk over it.
+    The checks of validate_system for each node run as
+    systemvalidator.iter_system reaches the node, and the remaining
+    ones use the objects and interfaces it registered.
+
+    validation is the result (feedback, objects, interfaces) of an earlier
+    systemvalidator.validate_system of the unchanged system. It is used
+    instead of validating again, and then only the nodes of the executor
+    to transform are visited.
+    A profiling.Profiler, if given, records the time of every phase and
+    the counts of registered objects, interfaces and diagnostics.
+    quantum is the unit of time of the bk system, see map_system.
+    """
+
+    def __init__(self, system: ros.System, validation: tuple = None,
+                 profiler=None, quantum: int = 1):
+        self.system = system
+        self.validation = validation
+        self.profiler = profiling.DISABLED if profiler is None else profiler
+        self.quantum = quantum
+
+    def run(self) -> tuple[list[Diagnostic], list[Diagnostic], bk.System]:
+        system = self.system
+        profiler = self.profiler
+        with profiler.phase("transform_system"):
+            checks = NodeChecks(first_executor(system))
+            with profiler.phase("systemvalidator.validate_system"):
+                if self.validation is None:
+                    objects = validator.new_objects()
+                    interfaces = validator.new_interfaces()
+                    feedback = list(validator.iter_system(
+                        system, objects, interfaces, checks))
+                else:
+                    feedback, objects, interfaces = self.validation
+            if profiler is not profiling.DISABLED:
+                count_validation(profiler, feedback, objects, interfaces)
+            if feedback:
+                return ([error("not-well-formed", "system", system.name)] +
+                        feedback, [], None)
+
+            with profiler.phase("validate_system"):
+                if self.validation is not None:
+                    for node in checks.executor.nodes:
+                        checks(node, checks.executor)
+                errors, warnings, nodemap = checks.finish(
+                    system, objects, interfaces, profiler)
+            profiler.count("errors", len(errors))
+            profiler.count("warnings", len(warnings))
+
+            if errors:
+                return errors, warnings, None
+
+            with profiler.phase("map_system"):
+                bksystem = map_system(system, nodemap, self.quantum)
+            profiler.count("bk nodes", len(nodemap))
+            return [], [], bksystem
 
-    if errors != ["Errors:"]:
-        return errors, warnings, None
-    if warnings == ["Warnings:"]:
-        warnings = []
 
-    return [], [], map_system(system, nodemap)
+def transform_system(
+        system: ros.System,
+        profiler=None, validation: tuple = None, quantum: int = 1
+        ) -> tuple[list[Diagnostic], list[Diagnostic], bk.System]:
+    """
+    Validates system and maps it to a bk system, see Pipeline.
+    With a quantum other than 1, the time constants of the bk system are
+    in quanta, and so are the results of bk.System.max_reaction_time().
+    Use verifycache.max_reaction_time, which scales them back to the
+    units of system.
+    """
+    return Pipeline(system, validation, profiler, quantum).run()
 
 # ========================== MONITORING ==========================
 
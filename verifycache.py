@@ -0,0 +1,101 @@
+import hashlib
+import os
+import pickle
+import backeman
+import backeman.system as bk
+import snapshot
+
+"""
+A persistent cache of verification results, so that a model the verifier
+has already checked is not checked again, e.g. at sweep points or CI
+runs that generate the same UPPAAL model.
+
+Results are keyed by the SHA-256 of the generated model text, i.e.
+gen_declaration() and gen_system(), the query and the version of
+backeman, and stored as pickles in the verification directory of the
+snapshot cache, see snapshot.cache_directory().
+Every hit touches its file, an entry that cannot be unpickled is a miss
+and gets overwritten, and whenever a result is stored the least
+recently used results are removed until the cache fits its size.
+A cache that cannot be read or written is simply not used.
+"""
+
+SUFFIX = ".result"
+MAX_BYTES = 64 << 20
+
+
+def cache_directory() -> str:
+    return os.path.join(snapshot.cache_directory(), "verification")
+
+
+def model_key(system: bk.System, query: str) -> str:
+    digest = hashlib.sha256()
+    for part in [getattr(backeman, "__version__", ""), query,
+                 system.gen_declaration(), system.gen_system()]:
+        data = part.encode()
+        digest.update(len(data).to_bytes(8, "little"))
+        digest.update(data)
+    return digest.hexdigest()
+
+
+def evict(directory: str, max_bytes: int) -> None:
+    """Removes the least recently used results beyond max_bytes."""
+    entries = []
+    for entry in os.scandir(directory):
+        if entry.name.endswith(SUFFIX):
+            status = entry.stat()
+            entries.append((status.st_mtime, status.st_size, entry.path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        total -= size
+
+
+def verified(system: bk.System, query: str, verify,
+             max_bytes: int = MAX_BYTES):
+    """
+    The result of verify() for query on system, from the cache if the same
+    model was verified before.
+    """
+    directory = cache_directory()
+    path = os.path.join(directory, model_key(system, query) + SUFFIX)
+    try:
+        with open(path, 'rb') as file:
+            result = pickle.load(file)
+        os.utime(path)
+        return result
+    except Exception:
+        pass  # A missing or corrupt result is verified and stored again
+    result = verify()
+    temporary = f"{path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(directory, exist_ok=True)
+        with open(temporary, 'wb') as file:
+            pickle.dump(result, file)
+        os.replace(temporary, path)
+        evict(directory, max_bytes)
+    except (OSError, pickle.PicklingError, TypeError, AttributeError):
+        pass  # Also results that cannot be pickled
+    finally:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+    return result
+
+
+def max_reaction_time(system: bk.System, max_bytes: int = MAX_BYTES):
+    """
+    system.max_reaction_time(), cached, with the reaction time scaled
+    back from the time quantum of the system to the units of the ros
+    system, see transformer_backeman.map_system.
+    """
+    result = verified(system, "max_reaction_time", system.max_reaction_time,
+                      max_bytes)
+    quantum = getattr(system, "time_quantum", 1)
+    if quantum == 1 or result[0] is None:
+        return result
+    return (result[0] * quantum,) + tuple(result[1:])
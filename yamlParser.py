@@ -1,26 +1,614 @@
+import json
+import re
 import ros2system as ros
-##old version (handles order of dict improperly and overwrites in case of duplicates)
-#import yaml #external library for parsing yaml into object (defacto standard, it seems)
+import snapshot
 from ruamel.yaml import YAML
+from ruamel.yaml.main import CParser
 from pprint import pprint
+try:
+    import yaml as pyyaml
+except ImportError:
+    pyyaml = None
 
+"""
+Loads a ros2 system model from a YAML file like example.yaml,
+or from the same schema written as JSON or as JSON lines.
 
-#load the yaml-file
-with open('example_simpler.yaml','r') as file:
-    #yaml_object = yaml.safe_load(file)
-    yaml=YAML(typ='safe')   # default, if not specfied, is 'rt' (round-trip)
-    yaml_object = yaml.load(file)
-    ##debug ex
-    #print(yaml_object['System']['hosts'][0]['executors'][0]['implementation'])
-    if(len(yaml_object)!=1 or not ('System' in yaml_object)):
-        raise SyntaxError("file must have single outer-key 'System'")
-    pprint(yaml_object, sort_dicts=False)
-    # try:
-    #     ros_sys = ros.System(name=yaml_object['system'],
-    #                          dds_implementation=yaml_object['dds_implementation'],
-    #                          default=)
-    # except:
-
-
-#TODO: check that argument order is preserved
-    #check that using C-version of ruamel is okay(see website)
\ No newline at end of file
+The file is read as a stream of parser events and the model is built
+through the add_* methods of ros2system as the events arrive, so the
+document never exists as a whole in memory, only the model does.
+YAML is parsed by the fastest backend available, see YAML_BACKENDS,
+which all produce the same events.
+JSON is decoded by the json module and replayed as events, so all
+formats produce identical models. A .json file is decoded as a whole,
+whereas a .jsonl file holds one element per line: first
+{"System": {...}}, then host, executor and node mappings without their
+lists of hosts, executors or nodes, each added to the last one above it.
+
+Every element is a mapping that names the element under the key of its
+kind, e.g. "- node: sensor1", followed by its properties and then its
+lists of contained elements. Properties must come before the lists,
+since the element is added to its parent at the first list.
+Keys that are not part of the schema are skipped.
+Errors are raised as SyntaxError with the line and column of the problem,
+where JSON only has the line of the element in a .jsonl file.
+
+TODO: Support anchors and aliases
+"""
+
+NULLS = ["", "~", "null", "Null", "NULL", "None"]
+PLAIN = [None, ""]  # Styles of unquoted scalars, in the python and C parsers
+
+INTEGER_QOS = ["depth", "deadline", "lifespan", "liveliness_lease_duration"]
+INTEGER = re.compile(r"[-+]?[0-9]+")
+
+
+def kind(event) -> str:
+    return type(event).__name__
+
+
+class Mark:
+    def __init__(self, line: int = None, column: int = None):
+        self.line = line
+        self.column = column
+
+
+class Replayed:
+    """An event replayed from a decoded JSON value, named like its kind."""
+
+    def __init__(self, value: str = None, style: str = None,
+                 line: int = None):
+        self.value = value
+        self.style = style
+        self.start_mark = Mark(line)
+
+
+REPLAYED = {name: type(name, (Replayed,), {}) for name in [
+    "StreamStartEvent", "StreamEndEvent",
+    "DocumentStartEvent", "DocumentEndEvent",
+    "MappingStartEvent", "MappingEndEvent",
+    "SequenceStartEvent", "SequenceEndEvent",
+    "ScalarEvent"
+]}
+
+
+def replay(value, line: int = None):
+    """Yields the events a YAML parser would produce for value."""
+    if isinstance(value, dict):
+        yield REPLAYED["MappingStartEvent"](line=line)
+        for key, item in value.items():
+            yield REPLAYED["ScalarEvent"](key, '"', line)
+            yield from replay(item, line)
+        yield REPLAYED["MappingEndEvent"](line=line)
+    elif isinstance(value, list):
+        yield REPLAYED["SequenceStartEvent"](line=line)
+        for item in value:
+            yield from replay(item, line)
+        yield REPLAYED["SequenceEndEvent"](line=line)
+    elif value is None:
+        yield REPLAYED["ScalarEvent"]("null", None, line)
+    elif isinstance(value, bool):
+        yield REPLAYED["ScalarEvent"](str(value).lower(), None, line)
+    elif isinstance(value, str):
+        yield REPLAYED["ScalarEvent"](value, '"', line)
+    else:
+        yield REPLAYED["ScalarEvent"](str(value), None, line)
+
+
+def replay_document(value):
+    yield REPLAYED["StreamStartEvent"]()
+    yield REPLAYED["DocumentStartEvent"]()
+    yield from replay(value)
+    yield REPLAYED["DocumentEndEvent"]()
+    yield REPLAYED["StreamEndEvent"]()
+
+
+class Events:
+    """The events of a YAML stream, with one event of lookahead."""
+
+    def __init__(self, events, filename: str = None):
+        self.events = iter(events)
+        self.filename = filename
+        self.current = next(self.events)
+
+    def peek(self):
+        return self.current
+
+    def next(self):
+        event = self.current
+        self.current = next(self.events, None)
+        return event
+
+    def error(self, message: str, event=None) -> SyntaxError:
+        if event is None:
+            event = self.current
+        mark = event.start_mark
+        line = None if mark.line is None else mark.line + 1
+        column = None if mark.column is None else mark.column + 1
+        if column is not None:
+            message += f" at column {column}"
+        return SyntaxError(message, (self.filename, line, column, None))
+
+    def expect(self, typ: str, what: str):
+        event = self.peek()
+        if kind(event) == "AliasEvent":
+            raise self.error("Aliases are not supported")
+        if kind(event) != typ:
+            raise self.error(f"Expected {what}")
+        return self.next()
+
+    def mapping(self):
+        """
+        Yields the key events of a mapping.
+        The caller must consume the value of each key before the next.
+        """
+        self.expect("MappingStartEvent", "a mapping")
+        while kind(self.peek()) != "MappingEndEvent":
+            yield self.expect("ScalarEvent", "a key")
+        self.next()
+
+    def sequence(self):
+        """
+        Yields once for every item of a sequence.
+        The caller must consume the item before the next.
+        """
+        self.expect("SequenceStartEvent", "a list")
+        while kind(self.peek()) != "SequenceEndEvent":
+            yield self.peek()
+        self.next()
+
+    def scalar(self, what: str = "a value") -> str:
+        event = self.expect("ScalarEvent", what)
+        if event.style in PLAIN and event.value in NULLS:
+            return None
+        return event.value
+
+    def skip(self) -> None:
+        event = self.next()
+        if kind(event) in ["MappingStartEvent", "SequenceStartEvent"]:
+            depth = 1
+            while depth > 0:
+                event = kind(self.next())
+                if event in ["MappingStartEvent", "SequenceStartEvent"]:
+                    depth += 1
+                elif event in ["MappingEndEvent", "SequenceEndEvent"]:
+                    depth -= 1
+
+    def record(self) -> dict:
+        """
+        Reads a mapping describing a single element, e.g. a callback,
+        into a dict from key to the key event and the value.
+        """
+        fields = {}
+        for key in self.mapping():
+            fields[key.value] = (key, self.value())
+        return fields
+
+    def value(self):
+        event = kind(self.peek())
+        if event == "ScalarEvent":
+            return self.scalar()
+        if event == "SequenceStartEvent":
+            return [self.value() for _ in self.sequence()]
+        if event == "MappingStartEvent":
+            return {key.value: self.value() for key in self.mapping()}
+        raise self.error("Aliases are not supported")
+
+
+class Record:
+    """The fields of a single element, converted on request."""
+
+    def __init__(self, events: Events, kind: str):
+        self.events = events
+        self.kind = kind
+        self.start = events.peek()
+        self.fields = events.record()
+
+    def error(self, message: str, key: str = None) -> SyntaxError:
+        event = self.fields[key][0] if key in self.fields else self.start
+        return self.events.error(message, event)
+
+    def get(self, key: str, default=None):
+        if key not in self.fields or self.fields[key][1] is None:
+            return default
+        return self.fields[key][1]
+
+    def name(self) -> str:
+        name = self.get(self.kind)
+        if not isinstance(name, (str, type(None))):
+            raise self.error(f"Expected name of {self.kind}", self.kind)
+        return name
+
+    def text(self, key: str) -> str:
+        value = self.get(key)
+        if not isinstance(value, (str, type(None))):
+            raise self.error(f"Expected '{key}' to be a single value", key)
+        return value
+
+    def integer(self, key: str, default: int = 0) -> int:
+        value = self.get(key, default)
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            raise self.error(f"Expected '{key}' to be an integer", key)
+
+    def names(self, key: str) -> list[str]:
+        value = self.get(key, [])
+        if isinstance(value, str):
+            return [value]
+        if not (isinstance(value, list) and
+                all(isinstance(name, (str, type(None))) for name in value)):
+            raise self.error(f"Expected '{key}' to be a list of names", key)
+        return [name for name in value if name is not None]
+
+    def qos(self, key: str, default: ros.QualityOfService):
+        value = self.get(key)
+        if value is None:
+            return default
+        if not isinstance(value, dict):
+            raise self.error(f"Expected '{key}' to be a mapping", key)
+        return make_qos(value, default,
+                        lambda message: self.error(message, key))
+
+
+def make_qos(policies: dict, default: ros.QualityOfService,
+             error) -> ros.QualityOfService:
+    qos = dict(default)
+    for policy, value in policies.items():
+        if policy in INTEGER_QOS:
+            try:
+                value = int(value)
+            except (TypeError, ValueError):
+                raise error(f"Expected qos policy '{policy}' "
+                            "to be an integer")
+        elif isinstance(value, (list, dict)):
+            raise error(f"Expected qos policy '{policy}' "
+                        "to be a single value")
+        elif isinstance(value, str) and INTEGER.fullmatch(value):
+            value = int(value)  # Other policies are kept as YAML reads them
+        qos[policy] = value
+    return ros.QualityOfService(qos)
+
+
+def load_qos(events: Events,
+             default: ros.QualityOfService) -> ros.QualityOfService:
+    start = events.peek()
+    policies = events.value()
+    if not isinstance(policies, dict):
+        raise events.error("Expected a mapping of qos policies", start)
+    return make_qos(policies, default,
+                    lambda message: events.error(message, start))
+
+
+def load_publisher(events: Events, node: ros.Node) -> None:
+    item = Record(events, "publisher")
+    node.add_publisher(name=item.name(),
+                       topic=item.text("topic"),
+                       qos_offered=item.qos("qos", node.default_qos))
+
+
+def load_callback(events: Events, node: ros.Node) -> None:
+    item = Record(events, "callback")
+    requests = []
+    if item.get("client") is not None:
+        requests += [ros.Request(client=item.text("client"),
+                                 timeout=item.integer("timeout"))]
+    for request in item.get("requests", []):
+        if not isinstance(request, dict):
+            raise item.error("Expected requests to be mappings", "requests")
+        try:
+            requests += [ros.Request(client=request.get("client"),
+                                     timeout=int(request.get("timeout", 0)))]
+        except (TypeError, ValueError):
+            raise item.error("Expected timeout to be an integer", "requests")
+    node.add_callback(
+        name=item.name(),
+        wcet=item.integer("wcet"),
+        read_variables=[ros.Variable(name)
+                        for name in item.names("read_variables")],
+        write_variables=[ros.Variable(name)
+                         for name in item.names("write_variables")],
+        calls=item.names("calls"),
+        outputs=[ros.ExternalOutput(name)
+                 for name in item.names("external_outputs")],
+        publishers=item.names("publisher") + item.names("publishers"),
+        requests=requests)
+
+
+def load_subscription(events: Events, node: ros.Node) -> None:
+    item = Record(events, "subscription")
+    node.add_subscription(topic=item.text("topic"),
+                          callback=item.text("callback"),
+                          qos_requested=item.qos("qos", node.default_qos))
+
+
+def load_timer(events: Events, node: ros.Node) -> None:
+    item = Record(events, "timer")
+    node.add_timer(name=item.name(),
+                   period=item.integer("period"),
+                   offset=item.integer("offset"),
+                   callback=item.text("callback"))
+
+
+def load_service(events: Events, node: ros.Node) -> None:
+    item = Record(events, "service")
+    node.add_service(wcet=0,
+                     name=item.name(),
+                     qos_profile=item.qos("qos", node.default_qos),
+                     callback=item.text("callback"))
+
+
+def load_client(events: Events, node: ros.Node) -> None:
+    item = Record(events, "client")
+    node.add_client(name=item.name(),
+                    service=item.text("service"),
+                    qos_profile=item.qos("qos", node.default_qos))
+
+
+def load_external_input(events: Events, node: ros.Node) -> None:
+    item = Record(events, "external_input")
+    node.add_external_input(name=item.name(),
+                            callback=item.text("callback"))
+
+
+def load_variable(events: Events, node: ros.Node) -> None:
+    node.add_variable(name=events.scalar("name of variable"))
+
+
+def load_external_output(events: Events, node: ros.Node) -> None:
+    node.add_external_output(name=events.scalar("name of external output"))
+
+
+NODE_LISTS = {
+    "publishers": load_publisher,
+    "callbacks": load_callback,
+    "subscriptions": load_subscription,
+    "timers": load_timer,
+    "services": load_service,
+    "clients": load_client,
+    "external_inputs": load_external_input,
+    "variables": load_variable,
+    "external_outputs": load_external_output,
+}
+
+
+class Element:
+    """
+    Collects the properties of an element until its first list,
+    at which point the element is added to its parent.
+    """
+
+    def __init__(self, events: Events, kind: str, add):
+        self.events = events
+        self.kind = kind
+        self.add = add
+        self.properties = {}
+        self.element = None
+
+    def set(self, key, property: str, value) -> None:
+        if self.element is not None:
+            raise self.events.error(f"'{key.value}' of {self.kind} must "
+                                    "come before its lists", key)
+        self.properties[property] = value
+
+    def get(self):
+        if self.element is None:
+            try:
+                self.element = self.add(**self.properties)
+            except ValueError as error:
+                raise self.events.error(str(error), self.start)
+        return self.element
+
+    def __enter__(self):
+        self.start = self.events.peek()
+        return self
+
+    def __exit__(self, *exc):
+        if exc[0] is None:
+            self.get()
+
+
+def load_node(events: Events, executor: ros.Executor) -> ros.Node:
+    with Element(events, "node", executor.add_node) as node:
+        node.properties["default_qos"] = executor.default_qos
+        for key in events.mapping():
+            if key.value == "node":
+                node.set(key, "name", events.scalar("name of node"))
+            elif key.value == "default_qos_profile":
+                node.set(key, "default_qos",
+                         load_qos(events, executor.default_qos))
+            elif key.value in NODE_LISTS:
+                load = NODE_LISTS[key.value]
+                for item in events.sequence():
+                    try:
+                        load(events, node.get())
+                    except ValueError as error:
+                        raise events.error(str(error), item)
+            else:
+                events.skip()
+    return node.get()
+
+
+def load_executor(events: Events, host: ros.Host) -> ros.Executor:
+    with Element(events, "executor", host.add_executor) as executor:
+        executor.properties["default_qos"] = host.default_qos
+        for key in events.mapping():
+            if key.value == "executor":
+                executor.set(key, "name", events.scalar("name of executor"))
+            elif key.value == "implementation":
+                executor.set(key, "implementation",
+                             events.scalar("executor implementation"))
+            elif key.value == "ros_distribution":
+                executor.set(key, "ros_distribution",
+                             events.scalar("ros distribution"))
+            elif key.value == "default_qos_profile":
+                executor.set(key, "default_qos",
+                             load_qos(events, host.default_qos))
+            elif key.value == "nodes":
+                for _ in events.sequence():
+                    load_node(events, executor.get())
+            else:
+                events.skip()
+    return executor.get()
+
+
+def load_host(events: Events, system: ros.System) -> ros.Host:
+    with Element(events, "host", system.add_host) as host:
+        for key in events.mapping():
+            if key.value == "host":
+                host.set(key, "name", events.scalar("name of host"))
+            elif key.value == "operating_system":
+                host.set(key, "operating_system",
+                         events.scalar("operating system"))
+            elif key.value == "architecture":
+                host.set(key, "architecture", events.scalar("architecture"))
+            elif key.value == "default_qos_profile":
+                host.set(key, "default_qos",
+                         load_qos(events, system.default_qos))
+            elif key.value == "executors":
+                for _ in events.sequence():
+                    load_executor(events, host.get())
+            else:
+                events.skip()
+    return host.get()
+
+
+def make_system(name: str = None, dds_implementation: str = None,
+                default_qos: ros.QualityOfService = None) -> ros.System:
+    system = ros.System(name=name, dds_implementation=dds_implementation)
+    if default_qos is not None:
+        system.default_qos = default_qos
+    return system
+
+
+def load_system(events: Events) -> ros.System:
+    with Element(events, "system", make_system) as system:
+        for key in events.mapping():
+            if key.value == "system":
+                system.set(key, "name", events.scalar("name of system"))
+            elif key.value == "dds_implementation":
+                system.set(key, "dds_implementation",
+                           events.scalar("dds implementation"))
+            elif key.value == "default_qos_profile":
+                system.set(key, "default_qos",
+                           load_qos(events, ros.DEFAULT_QOS))
+            elif key.value == "hosts":
+                for _ in events.sequence():
+                    load_host(events, system.get())
+            else:
+                events.skip()
+    return system.get()
+
+
+def load_events(events: Events) -> ros.System:
+    events.next()  # stream start
+    events.next()  # document start
+    return load_root(events, "file")
+
+
+def load_root(events: Events, where: str) -> ros.System:
+    keys = events.mapping()
+    key = next(keys, None)
+    if key is None or key.value != "System":
+        raise events.error(f"{where} must have single outer-key 'System'",
+                           key)
+    system = load_system(events)
+    if next(keys, None) is not None:
+        raise events.error(f"{where} must have single outer-key 'System'")
+    return system
+
+
+# For each element of a JSON lines file, how to load it and its children
+JSON_LINES = {
+    "host": (load_host, "executor"),
+    "executor": (load_executor, "node"),
+    "node": (load_node, None),
+}
+
+
+def load_json_lines(file, path: str = None) -> ros.System:
+    system = None
+    parents = {}
+    for number, line in enumerate(file):
+        if line.strip() == "":
+            continue
+        value = decode(line, path, number)
+        events = Events(replay(value, number), path)
+        if system is None:
+            system = load_root(events, "first line")
+            parents["host"] = system
+            continue
+        element = next((key for key in JSON_LINES
+                        if isinstance(value, dict) and key in value), None)
+        if element is None:
+            raise events.error("Expected a host, executor or node mapping")
+        if element not in parents:
+            raise events.error(f"{element} must come after its parent")
+        load, child = JSON_LINES[element]
+        loaded = load(events, parents[element])
+        if child is not None:
+            parents[child] = loaded
+    if system is None:
+        raise SyntaxError("file is empty", (path, None, None, None))
+    return system
+
+
+def decode(text: str, path: str = None, line: int = 0):
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError as error:
+        raise SyntaxError(f"{error.msg} at column {error.colno}",
+                          (path, line + error.lineno, error.colno, None))
+
+
+def ruamel_events(file, pure: bool):
+    return YAML(typ='safe', pure=pure).parse(file)
+
+
+def pyyaml_events(file, loader):
+    return pyyaml.parse(file, Loader=loader)
+
+
+# In order of preference, each with whether it is available
+YAML_BACKENDS = {
+    "ruamel-c": (CParser is not None,
+                 lambda file: ruamel_events(file, pure=False)),
+    "pyyaml-c": (pyyaml is not None and pyyaml.__with_libyaml__,
+                 lambda file: pyyaml_events(file, pyyaml.CSafeLoader)),
+    "ruamel": (True,
+               lambda file: ruamel_events(file, pure=True)),
+    "pyyaml": (pyyaml is not None,
+               lambda file: pyyaml_events(file, pyyaml.SafeLoader)),
+}
+
+
+def yaml_backends() -> list[str]:
+    return [name for name, (available, _) in YAML_BACKENDS.items()
+            if available]
+
+
+def load(path: str, backend: str = None, cache: bool = True) -> ros.System:
+    """
+    Loads the file according to its extension, .json, .jsonl or YAML.
+    YAML is parsed with the given backend, or else the fastest available.
+    Unless cache is False, a file loaded before with the same content is
+    read from its snapshot instead, see snapshot.cached.
+    """
+    if cache:
+        return snapshot.cached(path, lambda: load(path, backend, cache=False))
+    with open(path, 'r') as file:
+        if path.endswith(".jsonl"):
+            return load_json_lines(file, path)
+        if path.endswith(".json"):
+            document = decode(file.read(), path)
+            return load_events(Events(replay_document(document), path))
+        if backend is None:
+            backend = yaml_backends()[0]
+        available, parse = YAML_BACKENDS[backend]
+        if not available:
+            raise ValueError(f"YAML backend '{backend}' is not available")
+        return load_events(Events(parse(file), path))
+
+
+if __name__ == "__main__":
+    pprint(load('example_simpler.yaml'), width=120, compact=False)
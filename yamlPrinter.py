@@ -0,0 +1,236 @@
+import json
+import re
+import sys
+from collections.abc import Mapping
+import ros2system as ros
+import yamlParser
+
+"""
+Writes a ros2 system model as YAML in the schema read by yamlParser,
+i.e. like example.yaml.
+
+The lines are generated while walking hosts, executors and nodes and are
+written to the file as they come, so nothing but the model itself is
+held in memory, however large the system.
+Properties come before the lists of every element, as the parser needs,
+and a QoS profile is only written where it differs from the default
+it would otherwise get from the element above it.
+
+Actions are not part of the schema yet and are left out.
+"""
+
+INDENT = "  "
+
+# Scalars that read back as the same string without quotes,
+# both as block values and inside flow mappings
+PLAIN_SCALAR = re.compile(r"[A-Za-z0-9_./]([A-Za-z0-9_./ -]*[A-Za-z0-9_./-])?")
+
+
+def scalar(value) -> str:
+    if value is None:
+        return "null"
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (int, float)):
+        return str(value)
+    value = str(value)
+    if PLAIN_SCALAR.fullmatch(value) and value not in yamlParser.NULLS:
+        return value
+    # A JSON string is also a valid double-quoted YAML scalar
+    return json.dumps(value, ensure_ascii=False)
+
+
+def flow_mapping(mapping: dict) -> str:
+    return "{" + ", ".join(f"{scalar(key)}: {scalar(value)}"
+                           for key, value in mapping.items()) + "}"
+
+
+def item(indent: str, properties: list, lists: list = ()):
+    """Yields the lines of a list item at indent, see fields."""
+    return fields(indent + "- ", indent + INDENT, properties, lists)
+
+
+def fields(prefix: str, indent: str, properties: list, lists: list = ()):
+    """
+    Yields the lines of a mapping, its first line starting with prefix
+    and the rest with indent.
+    properties are (key, value) pairs where the value is a scalar,
+    a list of scalars or a mapping, and a value of None is left out.
+    lists are (key, elements, emit) where emit(element, indent) yields
+    the lines of each element.
+    """
+    written = False
+    for key, value in properties:
+        if value is None:
+            continue
+        if isinstance(value, Mapping):
+            yield f"{prefix}{key}: {flow_mapping(value)}\n"
+        elif isinstance(value, list):
+            if len(value) == 0:
+                continue
+            yield f"{prefix}{key}:\n"
+            for element in value:
+                yield f"{indent}- {scalar(element)}\n"
+        else:
+            yield f"{prefix}{key}: {scalar(value)}\n"
+        prefix = indent
+        written = True
+    for key, elements, emit in lists:
+        if len(elements) == 0:
+            continue
+        yield f"{prefix}{key}:\n"
+        for element in elements:
+            yield from emit(element, indent)
+        prefix = indent
+        written = True
+    if not written:
+        yield f"{prefix}{{}}\n"
+
+
+def qos(profile: ros.QualityOfService,
+        default: ros.QualityOfService) -> ros.QualityOfService:
+    """The profile to write, or None when it is the default anyway."""
+    if profile == default:
+        return None
+    return profile
+
+
+def emit_publisher(publisher: ros.Publisher, indent: str, node: ros.Node):
+    return item(indent, [("publisher", publisher.name),
+                         ("topic", publisher.topic),
+                         ("qos", qos(publisher.qos_offered,
+                                     node.default_qos))])
+
+
+def emit_request(request: ros.Request) -> dict:
+    return {"client": ros.name_of(request.client),
+            "timeout": request.timeout}
+
+
+def emit_callback(callback: ros.Callback, indent: str, node: ros.Node):
+    properties = [
+        ("callback", callback.name),
+        ("wcet", callback.wcet),
+        ("read_variables", [ros.name_of(variable)
+                            for variable in callback.read_variables]),
+        ("write_variables", [ros.name_of(variable)
+                             for variable in callback.write_variables]),
+        ("calls", [ros.name_of(call) for call in callback.calls]),
+        ("external_outputs", [ros.name_of(output)
+                              for output in callback.external_outputs]),
+        ("publishers", [ros.name_of(publisher)
+                        for publisher in callback.publishers]),
+    ]
+    lists = [("requests", callback.requests,
+              lambda request, indent: item(
+                  indent, list(emit_request(request).items())))]
+    return item(indent, properties, lists)
+
+
+def emit_subscription(subscription: ros.Subscription, indent: str,
+                      node: ros.Node):
+    return item(indent, [("topic", subscription.topic),
+                         ("callback", ros.name_of(subscription.callback)),
+                         ("qos", qos(subscription.qos_requested,
+                                     node.default_qos))])
+
+
+def emit_timer(timer: ros.Timer, indent: str, node: ros.Node):
+    return item(indent, [("timer", timer.name),
+                         ("period", timer.period),
+                         ("offset", timer.offset),
+                         ("callback", ros.name_of(timer.callback))])
+
+
+def emit_service(service: ros.Service, indent: str, node: ros.Node):
+    return item(indent, [("service", service.name),
+                         ("callback", ros.name_of(service.callback)),
+                         ("qos", qos(service.qos_requested,
+                                     node.default_qos))])
+
+
+def emit_client(client: ros.Client, indent: str, node: ros.Node):
+    return item(indent, [("client", client.name),
+                         ("service", client.service),
+                         ("qos", qos(client.qos_profile, node.default_qos))])
+
+
+def emit_external_input(input: ros.ExternalInput, indent: str,
+                        node: ros.Node):
+    return item(indent, [("external_input", input.name),
+                         ("callback", ros.name_of(input.callback))])
+
+
+def emit_name(element, indent: str, node: ros.Node):
+    yield f"{indent}- {scalar(ros.name_of(element))}\n"
+
+
+# The lists of a node in the order they are written, as in yamlParser
+NODE_LISTS = {
+    "publishers": emit_publisher,
+    "callbacks": emit_callback,
+    "subscriptions": emit_subscription,
+    "timers": emit_timer,
+    "services": emit_service,
+    "clients": emit_client,
+    "external_inputs": emit_external_input,
+    "variables": emit_name,
+    "external_outputs": emit_name,
+}
+
+
+def emit_node(node: ros.Node, indent: str, executor: ros.Executor):
+    lists = [(key, getattr(node, key),
+              lambda element, indent, emit=emit: emit(element, indent, node))
+             for key, emit in NODE_LISTS.items()]
+    return item(indent, [("node", node.name),
+                         ("default_qos_profile",
+                          qos(node.default_qos, executor.default_qos))],
+                lists)
+
+
+def emit_executor(executor: ros.Executor, indent: str, host: ros.Host):
+    return item(indent, [("executor", executor.name),
+                         ("implementation", executor.implementation),
+                         ("ros_distribution", executor.ros_distribution),
+                         ("default_qos_profile",
+                          qos(executor.default_qos, host.default_qos))],
+                [("nodes", executor.nodes,
+                  lambda node, indent: emit_node(node, indent, executor))])
+
+
+def emit_host(host: ros.Host, indent: str, system: ros.System):
+    return item(indent, [("host", host.name),
+                         ("operating_system", host.operating_system),
+                         ("architecture", host.architecture),
+                         ("default_qos_profile",
+                          qos(host.default_qos, system.default_qos))],
+                [("executors", host.executors,
+                  lambda executor, indent: emit_executor(executor, indent,
+                                                         host))])
+
+
+def emit_system(system: ros.System):
+    """Yields the lines of the YAML document for system."""
+    yield "System:\n"
+    yield from fields(INDENT, INDENT,
+                      [("system", system.name),
+                       ("dds_implementation", system.dds_implementation),
+                       ("default_qos_profile",
+                        qos(system.default_qos, ros.DEFAULT_QOS))],
+                      [("hosts", system.hosts,
+                        lambda host, indent: emit_host(host, indent,
+                                                       system))])
+
+
+def dump(system: ros.System, file) -> None:
+    file.writelines(emit_system(system))
+
+
+def save(system: ros.System, path: str) -> None:
+    with open(path, 'w') as file:
+        dump(system, file)
+
+
+if __name__ == "__main__":
+    dump(yamlParser.load("example_simpler.yaml"), sys.stdout)